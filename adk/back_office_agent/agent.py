@@ -1,73 +1,309 @@
+import asyncio
+import importlib
 import logging
-import traceback
 import os
-from toolbox_core import ToolboxSyncClient
+import shlex
+import time
+from typing import Optional
 from google.adk.agents.base_agent import BaseAgent
-from google.adk.tools.mcp_tool.mcp_toolset import StdioServerParameters
+from google.adk.agents.run_config import StreamingMode
+from google.adk.events import Event, EventActions
+from google.genai.types import Content, Part
 from pydantic import PrivateAttr
-from .classifier_agent import ClassifierAgent
-from .parking_agent import ParkingAgent
-from .common_agent import CommonAgent
-from .tone_polish_agent import TonePolishAgent
-from .utils import RequestType
+from .tone_style import INLINE_TONE_POLISH, TONE_POLISH_MODE, passes_style_check
+from .utils import (
+    PENDING_REQUEST,
+    RequestType,
+    event_prompt_token_count,
+    event_token_count,
+    get_user_text,
+)
 from .auth_agent import AuthAgent
-from .custom_adk_patches import CustomMCPToolset
+from .es_search import ES_SEARCH_BACKEND, ElasticsearchClient, ElasticsearchSearchTool
+from .fast_classifier import FAST_CLASSIFIER_THRESHOLD, FastRequestClassifier
+from .metrics import TurnStats, metrics
+from .resilience import end_turn_budget, start_turn_budget
+from .schema import get_schema_refresher
+from .semantic_cache import SEMANTIC_CACHE, SemanticCache, has_tool_errors
+from .speculative import SPECULATIVE_EXECUTION, SpeculativeBranch
+from .station_index import STATION_INDEX, get_station_index
+from .streaming import stream_polished
+from .tool_cache import ToolResultCache
+from .toolbox_tools import ToolboxToolset
+from .tracing import configure_tracing, set_attributes, span, traced_events
+
+DEFAULT_ES_MCP_COMMAND = "npx -y @elastic/mcp-server-elasticsearch@0.1.1"
+
+LLM_AGENT_MODULES = (
+    ".custom_adk_patches",
+    ".classifier_agent",
+    ".parking_agent",
+    ".common_agent",
+    ".tone_polish_agent",
+)
 
 
 class BackOfficeRootAgent(BaseAgent):
-    _parking_agent: ParkingAgent = PrivateAttr()
-    _common_agent: CommonAgent = PrivateAttr()
-    _classifier_agent: ClassifierAgent = PrivateAttr()
-    _tone_polish_agent: TonePolishAgent = PrivateAttr()
-    _auth_agent: AuthAgent = PrivateAttr()
+    # Sub-agents and toolsets are built on first use (or by `warm_up`). The
+    # LlmAgent modules are imported there too: they load litellm, which is
+    # most of the import cost of this package.
+    _init_ctx: object = PrivateAttr(default=None)
+    _parking_tool: Optional[object] = PrivateAttr(default=None)
+    _dummy_tools: Optional[ToolboxToolset] = PrivateAttr(default=None)
+    _parking_agent: Optional[BaseAgent] = PrivateAttr(default=None)
+    _common_agent: Optional[BaseAgent] = PrivateAttr(default=None)
+    _classifier_agent: Optional[BaseAgent] = PrivateAttr(default=None)
+    _tone_polish_agent: Optional[BaseAgent] = PrivateAttr(default=None)
+    _auth_agent: Optional[AuthAgent] = PrivateAttr(default=None)
+    _fast_classifier: Optional[FastRequestClassifier] = PrivateAttr(default=None)
+    _semantic_cache: Optional[SemanticCache] = PrivateAttr(default=None)
+    _warm_up_task: Optional[asyncio.Task] = PrivateAttr(default=None)
 
     def __init__(self, ctx):
-        logging.info("[BackOfficeRootAgent] Initializing root agent and sub-agents")
+        logging.info("[BackOfficeRootAgent] Initializing root agent")
 
         super().__init__(name="main_agent")
-        username = os.getenv("ES_USERNAME")
-        password = os.getenv("ES_PASSWORD")
-        es_url = os.getenv("ES_URL")
-        # MCP tool import
-        parking_tool = CustomMCPToolset(
-            connection_params=StdioServerParameters(
-                command="npx",
-                args=[
-                    "-y",
-                    "@elastic/mcp-server-elasticsearch@0.1.1",
-                ],
-                env={
-                    "ES_URL": es_url,
-                    "ES_USERNAME": username,
-                    "ES_PASSWORD": password,
-                },
-                # timeout=120, # It is not working 1.2.0
-                # tool_filter=["search"],
+        self._init_ctx = ctx
+
+    @property
+    def parking_tool(self):
+        if self._parking_tool is None:
+            username = os.getenv("ES_USERNAME")
+            password = os.getenv("ES_PASSWORD")
+            es_url = os.getenv("ES_URL")
+            if ES_SEARCH_BACKEND == "native":
+                # In-process search tool: no Node child process or stdio hop
+                self._parking_tool = ElasticsearchSearchTool(
+                    client=ElasticsearchClient(es_url, username, password),
+                    result_cache=ToolResultCache.from_env(),
+                )
+            else:
+                from google.adk.tools.mcp_tool.mcp_toolset import (
+                    StdioServerParameters,
+                )
+                from .custom_adk_patches import CustomMCPToolset
+
+                # MCP tool import (ES_MCP_COMMAND: e.g. a local install instead of npx)
+                command = shlex.split(
+                    os.getenv("ES_MCP_COMMAND", DEFAULT_ES_MCP_COMMAND)
+                )
+                self._parking_tool = CustomMCPToolset(
+                    connection_params=StdioServerParameters(
+                        command=command[0],
+                        args=command[1:],
+                        env={
+                            "ES_URL": es_url,
+                            "ES_USERNAME": username,
+                            "ES_PASSWORD": password,
+                        },
+                        # timeout=120, # It is not working 1.2.0
+                        # tool_filter=["search"],
+                    ),
+                    result_cache=ToolResultCache.from_env(),
+                )
+                # Without `warm_up` the MCP server processes are spawned here
+                # (in the background, if an event loop is running) or on first use
+                self._parking_tool.start_pool_soon()
+        return self._parking_tool
+
+    @parking_tool.setter
+    def parking_tool(self, tool):
+        # Set before the parking agent is built (e.g. the batch runner's `_msearch` client)
+        self._parking_tool = tool
+
+    @property
+    def dummy_tools(self):
+        if self._dummy_tools is None:
+            toolbox_url = os.environ.get("TOOLBOX_URL", "http://127.0.0.1:5000")
+            logging.info(f"[BackOfficeRootAgent] TOOLBOX_URL: {toolbox_url}")
+            # Loaded on first use (and retried in the background), not at import time
+            self._dummy_tools = ToolboxToolset(toolbox_url, "dummy-toolset")
+        return self._dummy_tools
+
+    @property
+    def classifier_agent(self):
+        if self._classifier_agent is None:
+            from .classifier_agent import ClassifierAgent
+
+            self._classifier_agent = ClassifierAgent(self._init_ctx)
+        return self._classifier_agent
+
+    @property
+    def parking_agent(self):
+        if self._parking_agent is None:
+            from .parking_agent import ParkingAgent
+
+            self._parking_agent = ParkingAgent(
+                self._init_ctx, tools=[self.parking_tool]
+            )
+        return self._parking_agent
+
+    @property
+    def common_agent(self):
+        if self._common_agent is None:
+            from .common_agent import CommonAgent
+
+            self._common_agent = CommonAgent(self._init_ctx, tools=[self.dummy_tools])
+        return self._common_agent
+
+    @property
+    def tone_polish_agent(self):
+        if self._tone_polish_agent is None:
+            from .tone_polish_agent import TonePolishAgent
+
+            self._tone_polish_agent = TonePolishAgent(self._init_ctx)
+        return self._tone_polish_agent
+
+    @property
+    def auth_agent(self):
+        if self._auth_agent is None:
+            self._auth_agent = AuthAgent(self._init_ctx)
+        return self._auth_agent
+
+    @property
+    def fast_classifier(self):
+        if self._fast_classifier is None:
+            self._fast_classifier = FastRequestClassifier.from_env()
+        return self._fast_classifier
+
+    @property
+    def semantic_cache(self):
+        if self._semantic_cache is None:
+            self._semantic_cache = SemanticCache.from_env()
+        return self._semantic_cache
+
+    async def warm_up(self):
+        """
+        Build every sub-agent and open the connections the first request needs.
+
+        Safe to call repeatedly and concurrently (e.g. from a readiness probe):
+        the work runs once and later calls return the same report.
+        """
+        if self._warm_up_task is None:
+            self._warm_up_task = asyncio.create_task(self._warm_up())
+        return await asyncio.shield(self._warm_up_task)
+
+    async def _warm_up(self):
+        report = {}
+
+        async def step(name, coro):
+            started = time.perf_counter()
+            try:
+                await coro
+                report[name] = {"ok": True}
+            except Exception as e:
+                logging.warning(
+                    f"[BackOfficeRootAgent] Warm-up step {name} failed: {e}"
+                )
+                report[name] = {"ok": False, "error": str(e)}
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            report[name]["ms"] = round(elapsed_ms, 1)
+            metrics.observe("warm_up_ms", elapsed_ms, step=name)
+
+        def import_agent_modules():
+            # The slow part (litellm); the import lock makes this thread-safe
+            for module in LLM_AGENT_MODULES:
+                importlib.import_module(module, __package__)
+
+        async def build_agents():
+            # Built on the loop thread, like the properties on the request path
+            for agent in (
+                self.classifier_agent,
+                self.parking_agent,
+                self.common_agent,
+                self.tone_polish_agent,
+                self.auth_agent,
+            ):
+                logging.info(f"[BackOfficeRootAgent] Built {agent.name}")
+            self.fast_classifier
+
+        configure_tracing()
+        started = time.perf_counter()
+        await step("imports", asyncio.to_thread(import_agent_modules))
+        await step("agents", build_agents())
+        tool = self.parking_tool
+        await asyncio.gather(
+            step(
+                "parking_tool",
+                (
+                    tool.client.warm_up()
+                    if isinstance(tool, ElasticsearchSearchTool)
+                    else tool.start_pool()
+                ),
+            ),
+            step("toolbox", self.dummy_tools.get_tools()),
+            *(
+                [step("station_index", get_station_index().refresh(full=True))]
+                if STATION_INDEX
+                else []
             ),
         )
+        report["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        logging.info(f"[BackOfficeRootAgent] Warm-up finished: {report}")
+        return report
 
+    async def close(self):
+        """Close the toolsets (MCP server processes, HTTP sessions) built so far."""
+        for tool in (self._parking_tool, self._dummy_tools):
+            if tool is not None:
+                await tool.close()
+        if STATION_INDEX:
+            await get_station_index().close()
+
+    def _speculation_target(self, ctx, request_type):
+        # ParkingAgent is only speculated for sessions that already passed AuthAgent
+        if request_type == RequestType.PARKING:
+            if ctx.session.state.get("api_auth_success"):
+                return self.parking_agent
+            return None
+        return self.common_agent
+
+    async def _run_answer_agent(self, agent, ctx, speculative):
+        if speculative is not None and speculative.agent is agent:
+            events = await speculative.commit()
+            if events is not None:
+                for event in events:
+                    yield event
+                return
+        elif speculative is not None:
+            await speculative.cancel()
+        async for event in agent.run_async(ctx):
+            yield event
+
+    async def _run_async_impl(self, ctx):
+        configure_tracing()
+        turn = TurnStats()
+        # Background reload of the live index mapping (SCHEMA_REFRESH_SECONDS)
+        get_schema_refresher().maybe_refresh()
+        # Incremental / full export of the station index (STATION_INDEX_*)
+        if STATION_INDEX:
+            get_station_index().maybe_refresh()
+        # Tool deadlines are cut down to what is left of TURN_BUDGET_SECONDS
+        budget = start_turn_budget()
         try:
-            toolbox_url = os.environ.get("TOOLBOX_URL", "http://127.0.0.1:5000")
-            toolbox = ToolboxSyncClient(toolbox_url)
-            logging.info(f"[BackOfficeRootAgent] Toolbox loaded from {toolbox_url}")
+            with span("turn", session__id=ctx.session.id) as turn_span:
+                async for event in self._run_workflow(ctx, turn):
+                    turn.add_tokens(event_token_count(event))
+                    turn.add_prompt_tokens(
+                        event.author, event_prompt_token_count(event)
+                    )
+                    yield event
+                set_attributes(
+                    turn_span,
+                    request_type=ctx.session.state.get("classifier_result"),
+                    llm__total_tokens=turn.tokens,
+                    **{f"turn__{k}": str(v) for k, v in turn.labels.items()},
+                )
+        finally:
+            end_turn_budget(budget)
+        # Only answered turns are comparable across tone polish modes
+        if "polish" in turn.labels:
+            elapsed_ms = turn.record()
             logging.info(
-                f"[BackOfficeRootAgent] TOOLBOX_URL: {os.environ.get('TOOLBOX_URL')}"
+                f"[BackOfficeRootAgent] Turn finished in {elapsed_ms:.0f}ms, {turn.tokens} tokens, prompt tokens {dict(turn.prompt_tokens)} ({turn.labels})"
             )
-            dummy_tools = toolbox.load_toolset("dummy-toolset")
-        except Exception as e:
-            logging.error(f"[BackOfficeRootAgent] Error loading toolbox: {str(e)}")
-            logging.error(f"[BackOfficeRootAgent] Traceback: {traceback.format_exc()}")
-            traceback.print_exc()
-            dummy_tools = []
-
-        # sub-agents
-        self._classifier_agent = ClassifierAgent(ctx)
-        self._parking_agent = ParkingAgent(ctx, tools=[parking_tool])
-        self._common_agent = CommonAgent(ctx, tools=dummy_tools)
-        self._tone_polish_agent = TonePolishAgent(ctx)
-        self._auth_agent = AuthAgent(ctx)
 
-    async def _run_async_impl(self, ctx):
+    async def _run_workflow(self, ctx, turn):
         logging.info("[BackOfficeRootAgent] Start workflow")
         logging.info(
             f"STATE: api_auth_success={ctx.session.state.get('api_auth_success')}, auth_in_progress={ctx.session.state.get('auth_in_progress')}, classifier_result={ctx.session.state.get('classifier_result')}"
@@ -78,73 +314,259 @@ class BackOfficeRootAgent(BaseAgent):
             logging.info(
                 "[BackOfficeRootAgent] Detected authentication in progress. Treating user input as authentication password."
             )
-            user_input = None
             # Save user input as user_auth_password
-            if getattr(ctx, "user_content", None) and ctx.user_content.parts:
-                user_input = ctx.user_content.parts[0].text
+            user_input = get_user_text(ctx)
             logging.info(f"[BackOfficeRootAgent] User input: {user_input}")
             if user_input:
                 ctx.session.state["user_auth_password"] = user_input
             else:
                 logging.info("[BackOfficeRootAgent] No user input found.")
-            async for event in self._auth_agent.run_async(ctx):
+            async for event in traced_events(
+                "auth", self.auth_agent.run_async(ctx), agent=self.auth_agent
+            ):
                 yield event
-            return
-
-        # Run ClassifierAgent
-        logging.info("[BackOfficeRootAgent] Running ClassifierAgent")
-        async for event in self._classifier_agent.run_async(ctx):
-            yield event
-        classifier_result = ctx.session.state.get("classifier_result")
-        logging.info(f"[BackOfficeRootAgent] Classifier result: {classifier_result}")
-
-        # 2. Branch according to classification result
-        if classifier_result == RequestType.PARKING:
-            logging.info("[BackOfficeRootAgent] classifier_result=parking")
-            # Run AuthAgent
+            pending_request = ctx.session.state.get(PENDING_REQUEST)
+            if not pending_request:
+                return
+            ctx.session.state[PENDING_REQUEST] = None
+            if not ctx.session.state.get("api_auth_success"):
+                yield Event(
+                    invocation_id=ctx.invocation_id,
+                    author=self.name,
+                    actions=EventActions(state_delta={PENDING_REQUEST: None}),
+                )
+                return
+            # Answer the request that started the login in this turn, instead
+            # of asking the user to send it again
             logging.info(
-                f"[BackOfficeRootAgent] user_auth_password in session: {ctx.session.state.get('user_auth_password')}"
+                f"[BackOfficeRootAgent] Authenticated. Resuming pending request: {pending_request}"
             )
-            async for event in self._auth_agent.run_async(ctx):
-                yield event
-            api_auth_success = ctx.session.state.get("api_auth_success")
-            if api_auth_success is False:
+            metrics.increment("auth_resumed_requests_total")
+            resumed = Content(role="user", parts=[Part(text=pending_request)])
+            ctx.user_content = resumed
+            yield Event(
+                invocation_id=ctx.invocation_id,
+                author="user",
+                content=resumed,
+                actions=EventActions(
+                    state_delta={
+                        PENDING_REQUEST: None,
+                        "classifier_result": RequestType.PARKING.value,
+                    }
+                ),
+            )
+            ctx.session.state["classifier_result"] = RequestType.PARKING.value
+            resumed_request = True
+        else:
+            resumed_request = False
+
+        streaming = (
+            ctx.run_config is not None
+            and ctx.run_config.streaming_mode == StreamingMode.SSE
+        )
+
+        # 1. Classify: in-process fast path, ClassifierAgent only when unsure
+        if not resumed_request:
+            with span("classify.fast") as classify_span:
+                request_type, confidence = self.fast_classifier.classify(
+                    get_user_text(ctx) or ""
+                )
+                set_attributes(
+                    classify_span,
+                    request_type=request_type.value,
+                    classifier__confidence=confidence,
+                )
+
+        # Answer of an earlier, (semantically) identical question
+        cache_probe = None
+        if SEMANTIC_CACHE:
+            if resumed_request:
+                route = RequestType.PARKING.value
+            else:
+                confident = confidence >= FAST_CLASSIFIER_THRESHOLD
+                route = request_type.value if confident else None
+            authenticated = bool(ctx.session.state.get("api_auth_success"))
+            # Parking answers are never served before AuthAgent
+            if authenticated or route != RequestType.PARKING.value:
+                with span("semantic_cache") as cache_span:
+                    cached, cache_probe = await self.semantic_cache.lookup(
+                        get_user_text(ctx) or "", route, authenticated
+                    )
+                    set_attributes(
+                        cache_span,
+                        cache__hit=cached is not None,
+                        cache__similarity=cached.similarity if cached else None,
+                    )
+                if cached is not None:
+                    logging.info(
+                        f"[BackOfficeRootAgent] Semantic cache hit ({cached.similarity:.3f}): {cached.query}"
+                    )
+                    ctx.session.state["classifier_result"] = cached.route
+                    ctx.session.state["polished_text"] = cached.response
+                    ctx.session.state["final_response"] = cached.response
+                    yield Event(
+                        invocation_id=ctx.invocation_id,
+                        author=self.name,
+                        content=Content(
+                            role="model", parts=[Part(text=cached.response)]
+                        ),
+                        actions=EventActions(
+                            state_delta={
+                                "classifier_result": cached.route,
+                                "polished_text": cached.response,
+                            }
+                        ),
+                    )
+                    turn.labels.update(mode=TONE_POLISH_MODE, polish="semantic_cache")
+                    return
+        speculative = None
+        try:
+            if resumed_request:
+                # Classified as parking when the request was stashed
+                metrics.increment("classifier_path_total", path="resumed")
+            elif confidence >= FAST_CLASSIFIER_THRESHOLD:
                 logging.info(
-                    "[BackOfficeRootAgent] Authentication failed. Clearing session state and terminating flow."
+                    f"[BackOfficeRootAgent] Fast classifier: {request_type.value} (confidence={confidence:.3f})"
                 )
-                ctx.session.state.clear()
-                return
-            elif api_auth_success is None:
+                metrics.increment("classifier_path_total", path="fast")
+                ctx.session.state["classifier_result"] = request_type.value
+                yield Event(
+                    invocation_id=ctx.invocation_id,
+                    author=self.name,
+                    actions=EventActions(
+                        state_delta={"classifier_result": request_type.value}
+                    ),
+                )
+            else:
                 logging.info(
-                    "[BackOfficeRootAgent] Waiting for authentication. Terminating flow (session retained)"
+                    f"[BackOfficeRootAgent] Fast classifier unsure (confidence={confidence:.3f}). Running ClassifierAgent"
                 )
-                return
+                metrics.increment("classifier_path_total", path="llm")
+                if SPECULATIVE_EXECUTION:
+                    target = self._speculation_target(ctx, request_type)
+                    if target is not None:
+                        speculative = SpeculativeBranch(target, ctx).start()
+                async for event in traced_events(
+                    "classify.llm",
+                    self.classifier_agent.run_async(ctx),
+                    agent=self.classifier_agent,
+                ):
+                    yield event
+            classifier_result = ctx.session.state.get("classifier_result")
             logging.info(
-                f"[BackOfficeRootAgent] (After authentication) user_auth_password in session: {ctx.session.state.get('user_auth_password')}"
+                f"[BackOfficeRootAgent] Classifier result: {classifier_result}"
             )
-            async for event in self._parking_agent.run_async(ctx):
-                yield event
-            response_text = ctx.session.state.get("response_text")
-        else:
-            logging.info(
-                f"[BackOfficeRootAgent] classifier_result={classifier_result} → Running CommonAgent"
+
+            # 2. Branch according to classification result
+            if classifier_result == RequestType.PARKING:
+                logging.info("[BackOfficeRootAgent] classifier_result=parking")
+                # Run AuthAgent
+                logging.info(
+                    f"[BackOfficeRootAgent] user_auth_password in session: {ctx.session.state.get('user_auth_password')}"
+                )
+                async for event in traced_events(
+                    "auth", self.auth_agent.run_async(ctx), agent=self.auth_agent
+                ):
+                    yield event
+                api_auth_success = ctx.session.state.get("api_auth_success")
+                if api_auth_success is False:
+                    logging.info(
+                        "[BackOfficeRootAgent] Authentication failed. Clearing session state and terminating flow."
+                    )
+                    ctx.session.state.clear()
+                    return
+                elif api_auth_success is None:
+                    logging.info(
+                        "[BackOfficeRootAgent] Waiting for authentication. Terminating flow (session retained)"
+                    )
+                    # Resumed as soon as the password is accepted
+                    pending_request = get_user_text(ctx)
+                    ctx.session.state[PENDING_REQUEST] = pending_request
+                    yield Event(
+                        invocation_id=ctx.invocation_id,
+                        author=self.name,
+                        actions=EventActions(
+                            state_delta={PENDING_REQUEST: pending_request}
+                        ),
+                    )
+                    return
+                logging.info(
+                    f"[BackOfficeRootAgent] (After authentication) user_auth_password in session: {ctx.session.state.get('user_auth_password')}"
+                )
+                answer_agent = self.parking_agent
+            else:
+                logging.info(
+                    f"[BackOfficeRootAgent] classifier_result={classifier_result} → Running CommonAgent"
+                )
+                answer_agent = self.common_agent
+            answer_events = traced_events(
+                "answer",
+                self._run_answer_agent(answer_agent, ctx, speculative),
+                agent=answer_agent,
+                speculative=speculative is not None,
+                streaming=streaming,
             )
-            async for event in self._common_agent.run_async(ctx):
-                yield event
+            if streaming and not INLINE_TONE_POLISH:
+                # Tone polishing consumes the answer while it is being generated
+                async for event in stream_polished(
+                    answer_events, self.tone_polish_agent, ctx
+                ):
+                    yield event
+            else:
+                async for event in answer_events:
+                    yield event
             response_text = ctx.session.state.get("response_text")
+        finally:
+            # The losing (or abandoned) branch never reaches the real session
+            if speculative is not None:
+                await speculative.cancel()
         logging.info(f"[BackOfficeRootAgent] Response text: {response_text}")
 
-        # 3. TonePolishAgent
+        # 3. TonePolishAgent (already done incrementally when streaming)
         ctx.session.state["to_polish"] = response_text
-        async for event in self._tone_polish_agent.run_async(ctx):
-            yield event
+        if INLINE_TONE_POLISH and passes_style_check(response_text):
+            polish_path = "inline"
+            ctx.session.state["polished_text"] = response_text
+            yield Event(
+                invocation_id=ctx.invocation_id,
+                author=self.name,
+                actions=EventActions(state_delta={"polished_text": response_text}),
+            )
+        elif streaming and not INLINE_TONE_POLISH:
+            polish_path = "streamed"
+        else:
+            polish_path = "fallback" if INLINE_TONE_POLISH else "separate"
+            async for event in traced_events(
+                "tone_polish",
+                self.tone_polish_agent.run_async(ctx),
+                agent=self.tone_polish_agent,
+                polish_path=polish_path,
+            ):
+                yield event
+        metrics.increment("tone_polish_path_total", path=polish_path)
+        turn.labels.update(mode=TONE_POLISH_MODE, polish=polish_path)
         polished_text = ctx.session.state.get("polished_text")
         logging.info(f"[BackOfficeRootAgent] Polished text: {polished_text}")
 
         # 4. final response
         ctx.session.state["final_response"] = polished_text
+        classifier_result = ctx.session.state.get("classifier_result")
+        if (
+            cache_probe is not None
+            and polished_text
+            and classifier_result
+            and not has_tool_errors(
+                e for e in ctx.session.events if e.invocation_id == ctx.invocation_id
+            )
+        ):
+            self.semantic_cache.store(cache_probe, classifier_result, polished_text)
 
         logging.info("[BackOfficeRootAgent] Workflow finished")
 
 
 root_agent = BackOfficeRootAgent(None)
+
+
+async def warm_up():
+    """Warm-up entry point for readiness probes (see server.py)."""
+    return await root_agent.warm_up()
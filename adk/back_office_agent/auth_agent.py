@@ -3,6 +3,7 @@ import logging
 from google.adk.agents.base_agent import BaseAgent
 from google.adk.events import Event, EventActions
 from google.genai.types import Part, Content
+from .utils import PENDING_REQUEST
 
 
 class AuthAgent(BaseAgent):
@@ -40,7 +41,11 @@ class AuthAgent(BaseAgent):
                 content=Content(
                     parts=[
                         Part(
-                            text="Authentication successful. Please re-enter your request you want."
+                            text=(
+                                "Authentication successful. Continuing with your request."
+                                if ctx.session.state.get(PENDING_REQUEST)
+                                else "Authentication successful. Please re-enter your request you want."
+                            )
                         )
                     ]
                 ),
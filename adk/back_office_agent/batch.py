@@ -0,0 +1,384 @@
+"""
+Batch runner: answers a JSONL file of queries through the root workflow.
+
+Each input line is `{"query": "...", "id": ...}` (`id` is optional and copied
+to the output). Every query gets a fresh session, deleted once answered, and
+`--concurrency` queries run at a time; the input is read as workers free up
+and each result is appended to the output JSONL as soon as it is done, so
+neither side is held in memory:
+
+    {"line": 3, "id": "faq-3", "query": "...", "answer": "...",
+     "classifier_result": "parking", "ms": 812.4, "error": null}
+
+Output lines are in completion order (`line` is the input line number).
+Progress is checkpointed next to the output; re-running the same command
+resumes after the last checkpoint (`--restart` starts over). Lines finished
+after the last checkpoint, and lines that ended in an error, are answered
+again, so deduplicate on `line` (keeping the last record).
+
+`--rate-limit openai=5,elasticsearch=20,toolbox=10` caps requests per second
+per provider: LLM calls by their model prefix (calls answered by the query
+compiler or a cache do not count), the parking `search` as `elasticsearch`
+and the hotel tools as `toolbox`. Parking searches go straight to
+Elasticsearch through `MsearchElasticsearchClient`, so identical queryBodies
+of concurrent queries are sent once and the rest are grouped into `_msearch`
+requests (`--no-msearch` keeps ES_SEARCH_BACKEND as configured).
+
+Parking queries need an authenticated session: `--authenticated` marks the
+batch sessions as logged in (trusted offline jobs only).
+
+    python -m back_office_agent.batch faq.jsonl --output answers.jsonl --concurrency 8
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from typing import Dict, Optional, Set
+
+from google.adk.runners import Runner
+from google.genai.types import Content, Part
+
+from .agent import BackOfficeRootAgent
+from .es_search import ElasticsearchSearchTool, MsearchElasticsearchClient
+from .metrics import metrics
+from .session_store import session_service_from_env
+from .tool_cache import ToolResultCache
+
+APP_NAME = "back_office_batch"
+USER_ID = "batch"
+# Provider of the tools each answer agent calls
+TOOL_PROVIDERS = {"parking_agent": "elasticsearch", "common_agent": "toolbox"}
+LLM_AGENTS = ("classifier_agent", "parking_agent", "common_agent", "tone_polish_agent")
+# Completed queries between two checkpoint writes
+CHECKPOINT_EVERY = 20
+
+
+def parse_rate_limits(spec: str) -> Dict[str, float]:
+    """Parse `provider=requests_per_second,...` (e.g. `openai=5,elasticsearch=20`)."""
+    limits = {}
+    for item in (spec or "").split(","):
+        if not item.strip():
+            continue
+        provider, _, rate = (part.strip() for part in item.partition("="))
+        try:
+            value = float(rate)
+        except ValueError:
+            value = -1.0
+        if not provider or value < 0:
+            raise argparse.ArgumentTypeError(
+                f"invalid rate limit '{item.strip()}', expected provider=requests_per_second"
+            )
+        limits[provider] = value
+    return limits
+
+
+class RateLimiter:
+    """Token bucket: `rate` acquisitions per second, bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        # Waiters queue on the lock, so they are served in order
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def _append_callback(agent, field: str, callback):
+    current = getattr(agent, field)
+    if current is None:
+        callbacks = []
+    elif isinstance(current, list):
+        callbacks = list(current)
+    else:
+        callbacks = [current]
+    # Last, so calls short-circuited by an earlier callback are not throttled
+    setattr(agent, field, callbacks + [callback])
+
+
+def apply_rate_limits(root: BackOfficeRootAgent, limiters: Dict[str, RateLimiter]):
+    """Throttle the LLM calls and tool calls of `root`'s agents per provider."""
+    if not limiters:
+        return
+
+    async def before_model(callback_context, llm_request):
+        provider = (llm_request.model or "").split("/", 1)[0]
+        limiter = limiters.get(provider) or limiters.get("llm")
+        if limiter is not None:
+            await limiter.acquire()
+            metrics.increment("batch_rate_limited_calls_total", provider=provider)
+        return None
+
+    def before_tool_for(provider):
+        async def before_tool(tool, args, tool_context):
+            await limiters[provider].acquire()
+            metrics.increment("batch_rate_limited_calls_total", provider=provider)
+            return None
+
+        return before_tool
+
+    for name in LLM_AGENTS:
+        agent = getattr(root, name)
+        _append_callback(agent, "before_model_callback", before_model)
+        provider = TOOL_PROVIDERS.get(name)
+        if provider in limiters:
+            _append_callback(agent, "before_tool_callback", before_tool_for(provider))
+
+
+class Checkpoint:
+    """
+    Input lines already answered: every line below `next_line`, plus the
+    (few, out-of-order) finished lines above it, except the `failed` ones,
+    which the next run answers again.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        next_line: int = 1,
+        done: Optional[Set[int]] = None,
+        failed: Optional[Set[int]] = None,
+    ):
+        self.path = path
+        self.next_line = next_line
+        self.done = set(done or ())
+        self.failed = set(failed or ())
+        self._unsaved = 0
+
+    @classmethod
+    def load(cls, path: str) -> "Checkpoint":
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls(path)
+        return cls(path, data.get("next_line", 1), data.get("done"), data.get("failed"))
+
+    def is_done(self, line: int) -> bool:
+        if line in self.failed:
+            return False
+        return line < self.next_line or line in self.done
+
+    def mark(self, line: int, failed: bool = False):
+        if failed:
+            self.failed.add(line)
+        else:
+            self.failed.discard(line)
+        if line >= self.next_line:
+            self.done.add(line)
+        while self.next_line in self.done:
+            self.done.discard(self.next_line)
+            self.next_line += 1
+        self._unsaved += 1
+        if self._unsaved >= CHECKPOINT_EVERY:
+            self.save()
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "next_line": self.next_line,
+                    "done": sorted(self.done),
+                    "failed": sorted(self.failed),
+                },
+                f,
+            )
+        os.replace(tmp_path, self.path)
+        self._unsaved = 0
+
+
+async def answer_query(runner, session_service, query: str, initial_state) -> dict:
+    """Run one query in a fresh session; the answer and classifier result."""
+    session = await session_service.create_session(
+        app_name=APP_NAME, user_id=USER_ID, state=dict(initial_state)
+    )
+    polished, final_text, classifier_result = None, None, None
+    try:
+        async for event in runner.run_async(
+            user_id=USER_ID,
+            session_id=session.id,
+            new_message=Content(role="user", parts=[Part(text=query)]),
+        ):
+            delta = event.actions.state_delta if event.actions else {}
+            polished = delta.get("polished_text", polished)
+            classifier_result = delta.get("classifier_result", classifier_result)
+            if event.author != "user" and event.is_final_response() and event.content:
+                text = "".join(p.text or "" for p in event.content.parts or [])
+                final_text = text or final_text
+    finally:
+        await session_service.delete_session(
+            app_name=APP_NAME, user_id=USER_ID, session_id=session.id
+        )
+    return {
+        "answer": polished or final_text,
+        "classifier_result": classifier_result,
+    }
+
+
+async def run(args) -> dict:
+    root = BackOfficeRootAgent(None)
+    if args.msearch:
+        root.parking_tool = ElasticsearchSearchTool(
+            client=MsearchElasticsearchClient(
+                os.getenv("ES_URL"),
+                os.getenv("ES_USERNAME"),
+                os.getenv("ES_PASSWORD"),
+            ),
+            result_cache=ToolResultCache.from_env(),
+        )
+    limiters = {
+        provider: RateLimiter(rate)
+        for provider, rate in args.rate_limit.items()
+        if rate > 0
+    }
+    apply_rate_limits(root, limiters)
+    await root.warm_up()
+
+    session_service = session_service_from_env(args.session_store)
+    runner = Runner(app_name=APP_NAME, agent=root, session_service=session_service)
+    initial_state = {"api_auth_success": True} if args.authenticated else {}
+    checkpoint_path = args.checkpoint or f"{args.output}.checkpoint"
+    if args.restart:
+        checkpoint = Checkpoint(checkpoint_path)
+    else:
+        checkpoint = Checkpoint.load(checkpoint_path)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=args.concurrency * 2)
+    summary = {"answered": 0, "errors": 0, "skipped": 0}
+
+    output = open(args.output, "w" if args.restart else "a", encoding="utf-8")
+
+    def write(record):
+        output.write(json.dumps(record, ensure_ascii=False) + "\n")
+        output.flush()
+        checkpoint.mark(record["line"], failed=bool(record["error"]))
+        summary["errors" if record["error"] else "answered"] += 1
+        if args.progress_every and sum(summary.values()) % args.progress_every == 0:
+            print(f"[batch] Progress: {summary}", file=sys.stderr, flush=True)
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            line, record = item
+            started = time.perf_counter()
+            result, error = {"answer": None, "classifier_result": None}, None
+            try:
+                result = await answer_query(
+                    runner, session_service, record["query"], initial_state
+                )
+            except Exception as e:
+                logging.exception(f"[batch] Line {line} failed")
+                error = f"{type(e).__name__}: {e}"
+            write(
+                {
+                    "line": line,
+                    "id": record.get("id"),
+                    "query": record["query"],
+                    **result,
+                    "ms": round((time.perf_counter() - started) * 1000, 1),
+                    "error": error,
+                }
+            )
+
+    workers = [asyncio.create_task(worker()) for _ in range(args.concurrency)]
+    started = time.perf_counter()
+    try:
+        with open(args.input, encoding="utf-8") as f:
+            for line, text in enumerate(f, 1):
+                if not text.strip():
+                    continue
+                if checkpoint.is_done(line):
+                    summary["skipped"] += 1
+                    continue
+                try:
+                    record = json.loads(text)
+                    record["query"]
+                except (ValueError, TypeError, KeyError) as e:
+                    write(
+                        {
+                            "line": line,
+                            "id": None,
+                            "query": None,
+                            "answer": None,
+                            "classifier_result": None,
+                            "ms": 0.0,
+                            "error": f"Invalid input line: {e!r}",
+                        }
+                    )
+                    continue
+                await queue.put((line, record))
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:
+            task.cancel()
+        checkpoint.save()
+        output.close()
+        await root.close()
+        if hasattr(session_service, "close"):
+            await session_service.close()
+    summary["elapsed_s"] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Answer a JSONL file of queries with the back office workflow"
+    )
+    parser.add_argument("input", help='JSONL, one {"query": ..., "id": ...} per line')
+    parser.add_argument("--output", required=True, help="results JSONL (appended)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument(
+        "--rate-limit",
+        type=parse_rate_limits,
+        default={},
+        help="requests/sec per provider, e.g. openai=5,elasticsearch=20,toolbox=10",
+    )
+    parser.add_argument(
+        "--no-msearch",
+        dest="msearch",
+        action="store_false",
+        help="keep ES_SEARCH_BACKEND instead of grouped `_msearch` requests",
+    )
+    parser.add_argument(
+        "--authenticated",
+        action="store_true",
+        help="run the sessions as logged in (parking queries skip the password)",
+    )
+    parser.add_argument(
+        "--session-store",
+        default="memory",
+        help="SESSION_STORE_URL for the batch sessions (default: in memory)",
+    )
+    parser.add_argument("--checkpoint", help="default: OUTPUT.checkpoint")
+    parser.add_argument(
+        "--restart", action="store_true", help="ignore the checkpoint, truncate OUTPUT"
+    )
+    parser.add_argument("--progress-every", type=int, default=100)
+    args = parser.parse_args()
+    summary = asyncio.run(run(args))
+    print(json.dumps(summary, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Parity and latency bench for the parking `search` backends.
+
+Starts a local stub Elasticsearch (aiohttp) serving deterministic hits, then
+runs the same queryBodies through the in-process ElasticsearchSearchTool and
+through the Elastic MCP server (CustomMCPToolset, `npx`), compares the text
+the two tools return and prints latency percentiles as JSON.
+
+    python -m back_office_agent.bench.es_backends --iterations 50 --concurrency 8
+
+`--backends native` skips the MCP server (no Node / npm registry needed).
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import sys
+import time
+
+from aiohttp import web
+from mcp import StdioServerParameters
+
+from ..custom_adk_patches import CustomMCPToolset
+from ..es_search import ElasticsearchClient, ElasticsearchSearchTool
+from ..metrics import percentile
+from ..query_compiler import PARKING_INDEX, ParkingQueryCompiler
+from ..schema import DATA_TYPE_PATH
+
+SAMPLE_REQUESTS = [
+    "渋谷駅の駐車場",
+    "新宿駅 3万円以下の駐車場",
+    "世田谷区の月極駐車場",
+    "大阪府の駐車場を探して",
+]
+
+STUB_HITS = [
+    {
+        "id": f"P{i:04d}",
+        "name": f"テスト駐車場{i}",
+        "address": f"東京都渋谷区道玄坂{i}-1",
+        "nearbyStations": [{"name": "渋谷", "distance": 100 + i}],
+        "spaces": [{"rent": 20000 + 1000 * i, "capacity": 1}],
+    }
+    for i in range(20)
+]
+
+
+def stub_app(latency_ms: float) -> web.Application:
+    with open(DATA_TYPE_PATH, encoding="utf-8") as f:
+        mappings = json.load(f)
+
+    def respond(payload, request):
+        resp = web.json_response(
+            payload, dumps=lambda v: json.dumps(v, ensure_ascii=False)
+        )
+        # The Elasticsearch JS client refuses servers without this header
+        resp.headers["x-elastic-product"] = "Elasticsearch"
+        if "gzip" in request.headers.get("Accept-Encoding", ""):
+            resp.enable_compression()
+        return resp
+
+    async def root(request):
+        return respond({"version": {"number": "8.13.0"}}, request)
+
+    async def mapping(request):
+        return respond({request.match_info["index"]: {"mappings": mappings}}, request)
+
+    async def read(request):
+        raw = await request.read()
+        if request.headers.get("Content-Encoding") == "gzip":
+            raw = gzip.decompress(raw)
+        return raw.decode("utf-8")
+
+    def hits_for(index, body):
+        start = body.get("from", 0)
+        hits = []
+        for doc in STUB_HITS[start : start + body.get("size", 10)]:
+            source = doc
+            if body.get("_source") not in (None, True):
+                source = {k: v for k, v in doc.items() if k in body["_source"]}
+            hit = {"_index": index, "_source": source}
+            if "address" in (body.get("highlight") or {}).get("fields", {}):
+                hit["highlight"] = {"address": [f"<em>{doc['address']}</em>"]}
+            hits.append(hit)
+        return {
+            "took": 1,
+            "hits": {"total": {"value": len(STUB_HITS)}, "hits": hits},
+        }
+
+    async def search(request):
+        body = json.loads(await read(request) or "{}")
+        await asyncio.sleep(latency_ms / 1000)
+        return respond(hits_for(request.match_info["index"], body), request)
+
+    async def msearch(request):
+        lines = [
+            json.loads(line) for line in (await read(request)).splitlines() if line
+        ]
+        await asyncio.sleep(latency_ms / 1000)
+        responses = [
+            {**hits_for(header["index"], body), "status": 200}
+            for header, body in zip(lines[::2], lines[1::2])
+        ]
+        return respond({"took": 1, "responses": responses}, request)
+
+    app = web.Application()
+    app.router.add_route("*", "/", root)
+    app.router.add_get("/{index}/_mapping", mapping)
+    app.router.add_route("*", "/_msearch", msearch)
+    app.router.add_route("*", "/{index}/_search", search)
+    return app
+
+
+def _texts(result):
+    return [c.text for c in result.content]
+
+
+async def _measure(tool, bodies, iterations, concurrency):
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(body):
+        async with semaphore:
+            started = time.perf_counter()
+            await tool.run_async(
+                args={"index": PARKING_INDEX, "queryBody": body}, tool_context=None
+            )
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(call(bodies[i % len(bodies)]) for i in range(iterations)))
+    elapsed = time.perf_counter() - started
+    return {
+        "calls": len(latencies),
+        "throughput_per_s": round(len(latencies) / elapsed, 1),
+        **{f"p{q}_ms": round(percentile(latencies, q), 2) for q in (50, 95, 99)},
+    }
+
+
+async def start_stub(latency_ms: float, port: int = 0):
+    """Serve `stub_app` on localhost; returns the runner and its URL."""
+    runner = web.AppRunner(stub_app(latency_ms))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", port)
+    await site.start()
+    return runner, f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+
+async def open_backends(es_url, backends, mcp_command):
+    """The `search` tool of each backend against `es_url`, and their closers."""
+    tools, closers = {}, []
+    if "native" in backends:
+        tool = ElasticsearchSearchTool(
+            client=ElasticsearchClient(es_url, "elastic", "x")
+        )
+        tools["native"] = tool
+        closers.append(tool.close)
+    if "mcp" in backends:
+        toolset = CustomMCPToolset(
+            connection_params=StdioServerParameters(
+                command=mcp_command[0],
+                args=mcp_command[1:],
+                env={"ES_URL": es_url, "ES_USERNAME": "elastic", "ES_PASSWORD": "x"},
+            )
+        )
+        closers.append(toolset.close)
+        try:
+            await toolset.start_pool()
+            tools["mcp"] = next(
+                t for t in await toolset.get_tools() if t.name == "search"
+            )
+        except BaseException:
+            for close in closers:
+                await close()
+            raise
+    return tools, closers
+
+
+async def search_texts(tool, bodies):
+    """Text blocks `tool` returns for each queryBody, in order."""
+    return [
+        _texts(
+            await tool.run_async(
+                args={"index": PARKING_INDEX, "queryBody": body}, tool_context=None
+            )
+        )
+        for body in bodies
+    ]
+
+
+def sample_bodies():
+    compiler = ParkingQueryCompiler()
+    return [compiler.compile(text).query_body for text in SAMPLE_REQUESTS]
+
+
+async def run(args):
+    runner, es_url = await start_stub(args.stub_latency_ms, args.port)
+    bodies = sample_bodies()
+    try:
+        tools, closers = await open_backends(es_url, args.backends, args.mcp_command)
+    except BaseException:
+        await runner.cleanup()
+        raise
+
+    report = {"stub_latency_ms": args.stub_latency_ms, "backends": {}}
+    try:
+        outputs = {}
+        for name, tool in tools.items():
+            # First call per backend also warms up connections / processes
+            outputs[name] = await search_texts(tool, bodies)
+            report["backends"][name] = await _measure(
+                tool, bodies, args.iterations, args.concurrency
+            )
+        if len(outputs) == 2:
+            mismatches = [
+                {"queryBody": body, "native": native, "mcp": mcp}
+                for body, native, mcp in zip(bodies, outputs["native"], outputs["mcp"])
+                if native != mcp
+            ]
+            report["parity"] = {
+                "queries": len(bodies),
+                "mismatches": len(mismatches),
+                "examples": mismatches[:1],
+            }
+    finally:
+        for close in closers:
+            await close()
+        await runner.cleanup()
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--backends", nargs="+", default=["native", "mcp"], choices=["native", "mcp"]
+    )
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--stub-latency-ms", type=float, default=5.0)
+    parser.add_argument("--port", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument(
+        "--mcp-command",
+        nargs="+",
+        default=["npx", "-y", "@elastic/mcp-server-elasticsearch@0.1.1"],
+    )
+    report = asyncio.run(run(parser.parse_args()))
+    if report.get("parity", {}).get("mismatches"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
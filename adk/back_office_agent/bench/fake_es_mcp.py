@@ -0,0 +1,142 @@
+"""
+Fake Elasticsearch MCP server (stdio) for the offline benches.
+
+Serves the tools of @elastic/mcp-server-elasticsearch (`list_indices`,
+`get_mappings`, `search`) from deterministic in-memory parking documents,
+with the same text output, after a configurable latency. The query itself
+is not evaluated: every search returns the `from` / `size` window of the
+documents, projected to `_source`.
+
+Standalone on purpose (only the `mcp` package): each pooled MCP process
+starts it by path without importing the agent.
+
+    ES_MCP_COMMAND="python back_office_agent/bench/fake_es_mcp.py --latency-ms 20"
+"""
+
+import argparse
+import asyncio
+import json
+from typing import List
+
+from mcp.server.fastmcp import FastMCP
+from mcp.types import TextContent
+
+INDEX = "parking"
+STATIONS = ["渋谷", "新宿", "池袋", "恵比寿", "品川"]
+CITIES = ["渋谷区", "新宿区", "豊島区", "世田谷区", "品川区"]
+
+
+def make_documents(count: int) -> List[dict]:
+    documents = []
+    for i in range(count):
+        station, city = STATIONS[i % len(STATIONS)], CITIES[i % len(CITIES)]
+        documents.append(
+            {
+                "id": f"P{i:05d}",
+                "name": f"{station}第{i + 1}駐車場",
+                "address": f"東京都{city}{i % 9 + 1}-{i % 20 + 1}-{i % 7 + 1}",
+                "addressView": f"東京都{city}{i % 9 + 1}丁目",
+                "location": {"lat": 35.6 + i % 50 / 1000, "lon": 139.7 + i % 30 / 1000},
+                "city": {"name": city},
+                "prefecture": {"name": "東京都"},
+                "region": {"name": "関東"},
+                "nearbyStations": [
+                    {"name": station, "distance": 100 + 10 * (i % 40)},
+                    {"name": STATIONS[(i + 1) % len(STATIONS)], "distance": 900},
+                ],
+                "payment": {"fee": 0},
+                "spaces": [
+                    {
+                        "rent": 18000 + 1000 * (i % 25),
+                        "rentMin": 18000 + 1000 * (i % 25),
+                        "rentTaxClass": "taxIncluded",
+                        "capacity": 1 + i % 3,
+                        "facility": "flat",
+                    }
+                ],
+                "capacity": 1 + i % 3,
+                "referralFeeTotal": 0,
+                "hasDivisionDrawing": i % 2 == 0,
+            }
+        )
+    return documents
+
+
+def project_source(document: dict, source) -> dict:
+    if source in (None, True):
+        return document
+    if not source:
+        return {}
+    heads = {path.split(".")[0] for path in source}
+    return {k: v for k, v in document.items() if k in heads}
+
+
+def render_hit(document: dict) -> str:
+    # Same layout as the Elastic MCP server: highlighted fields, then the rest
+    lines = [f"address (highlighted): <em>{document['address']}</em>"]
+    lines += [
+        f"{field}: {json.dumps(value, ensure_ascii=False, separators=(',', ':'))}"
+        for field, value in document.items()
+        if field != "address"
+    ]
+    return "\n".join(lines)
+
+
+def build_server(latency_ms: float, documents: List[dict]) -> FastMCP:
+    server = FastMCP("fake-elasticsearch", log_level="WARNING")
+
+    @server.tool()
+    async def list_indices() -> List[TextContent]:
+        """List all available Elasticsearch indices"""
+        return [
+            TextContent(type="text", text="Found 1 indices"),
+            TextContent(
+                type="text",
+                text=json.dumps(
+                    [{"index": INDEX, "health": "green", "docsCount": len(documents)}]
+                ),
+            ),
+        ]
+
+    @server.tool()
+    async def get_mappings(index: str) -> List[TextContent]:
+        """Get field mappings for a specific Elasticsearch index"""
+        return [
+            TextContent(type="text", text=f"Mappings for index: {index}"),
+            TextContent(type="text", text=json.dumps({index: {"mappings": {}}})),
+        ]
+
+    @server.tool()
+    async def search(index: str, queryBody: dict) -> List[TextContent]:
+        """Perform an Elasticsearch search with the provided query DSL. Highlights are always enabled."""
+        await asyncio.sleep(latency_ms / 1000)
+        start = int(queryBody.get("from") or 0)
+        window = documents[start : start + int(queryBody.get("size", 10))]
+        hits = [project_source(doc, queryBody.get("_source")) for doc in window]
+        fragments = [
+            TextContent(
+                type="text",
+                text=f"Total results: {len(documents)}, showing {len(hits)} from position {start}",
+            )
+        ]
+        fragments += [
+            TextContent(
+                type="text", text=render_hit({"address": doc["address"], **hit})
+            )
+            for doc, hit in zip(window, hits)
+        ]
+        return fragments
+
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Elasticsearch MCP server")
+    parser.add_argument("--latency-ms", type=float, default=10.0)
+    parser.add_argument("--documents", type=int, default=200)
+    args = parser.parse_args()
+    build_server(args.latency_ms, make_documents(args.documents)).run()
+
+
+if __name__ == "__main__":
+    main()
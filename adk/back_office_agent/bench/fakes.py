@@ -0,0 +1,220 @@
+"""
+Offline stand-ins for the model and Toolbox, used by the load bench.
+
+`FakeLiteLlm` is a drop-in for the agents' `LiteLlm` clients: deterministic
+answers per agent role, a fixed time to first token and a token rate, usage
+metadata with tiktoken counts of the prompt and the answer, and partial
+responses when streaming. `toolbox_app` serves a Toolbox toolset manifest and
+tool invocations with deterministic hotel rows.
+"""
+
+import asyncio
+import json
+from typing import AsyncGenerator, List, Optional
+
+from aiohttp import web
+from google.adk.models.lite_llm import LiteLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai.types import (
+    Content,
+    FunctionCall,
+    GenerateContentResponseUsageMetadata,
+    Part,
+)
+
+from ..history_window import request_tokens
+from ..query_compiler import PARKING_INDEX, SEARCH_TOOL_NAME
+from ..tokens import count_tokens
+from ..tone_style import CHUNK_INSTRUCTION, TONE_POLISH_TITLE
+
+PARKING_KEYWORDS = ("駐車", "parking", "パーキング")
+HOTEL_KEYWORDS = ("ホテル", "hotel", "宿")
+HOTEL_TOOL_NAME = "search-all-hotels-dummy"
+STREAM_CHUNK_CHARS = 8
+
+
+def _text(content: Optional[Content]) -> str:
+    return "".join(p.text or "" for p in (content.parts if content else None) or [])
+
+
+def _last_user_text(llm_request: LlmRequest) -> str:
+    for content in reversed(llm_request.contents or []):
+        if content.role == "user" and not any(
+            p.function_response for p in content.parts or []
+        ):
+            return _text(content)
+    return ""
+
+
+def _tool_result(llm_request: LlmRequest) -> Optional[str]:
+    """Result text of the tool call answering the latest user message."""
+    for content in reversed(llm_request.contents or []):
+        for part in content.parts or []:
+            if part.function_response:
+                return json.dumps(part.function_response.response, ensure_ascii=False)
+        if content.role == "user" and _text(content):
+            return None
+    return None
+
+
+class FakeLiteLlm(LiteLlm):
+    """Deterministic LiteLlm for one agent role, without any network call."""
+
+    # classifier | parking | common | tone_polish
+    role: str = "common"
+    # Time to the first token, and output tokens per second after it
+    latency_ms: float = 50.0
+    tokens_per_second: float = 200.0
+
+    def _reply(self, llm_request: LlmRequest):
+        """Text or function call this role answers `llm_request` with."""
+        user_text = _last_user_text(llm_request)
+        tool_result = _tool_result(llm_request)
+        if self.role == "classifier":
+            parking = any(k in user_text.lower() for k in PARKING_KEYWORDS)
+            return "parking" if parking else "other"
+        if self.role == "tone_polish":
+            if str(llm_request.config.system_instruction or "") == CHUNK_INSTRUCTION:
+                return user_text
+            return f"{TONE_POLISH_TITLE}\n{user_text}"
+        if self.role == "parking":
+            if tool_result is None and SEARCH_TOOL_NAME in llm_request.tools_dict:
+                return FunctionCall(
+                    name=SEARCH_TOOL_NAME,
+                    args={
+                        "index": PARKING_INDEX,
+                        "queryBody": {"query": {"match_all": {}}, "size": 10},
+                    },
+                )
+            return (
+                "[Parking Agent]\n"
+                f"{user_text}について検索しました。\n"
+                "条件に合う駐車場が見つかりました。\n"
+                "賃料と最寄り駅からの距離をご確認ください。"
+            )
+        if (
+            tool_result is None
+            and HOTEL_TOOL_NAME in llm_request.tools_dict
+            and any(k in user_text.lower() for k in HOTEL_KEYWORDS)
+        ):
+            return FunctionCall(name=HOTEL_TOOL_NAME, args={})
+        if tool_result is not None:
+            return "[Common Agent]\nご希望に近いホテルをいくつかご紹介します。"
+        return "[Common Agent]\nご質問ありがとうございます。お手伝いできることがあればお知らせください。"
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        reply = self._reply(llm_request)
+        text = reply if isinstance(reply, str) else json.dumps(reply.args)
+        prompt_tokens = request_tokens(llm_request)
+        completion_tokens = count_tokens(text)
+        usage = GenerateContentResponseUsageMetadata(
+            prompt_token_count=prompt_tokens,
+            candidates_token_count=completion_tokens,
+            total_token_count=prompt_tokens + completion_tokens,
+        )
+        await asyncio.sleep(self.latency_ms / 1000)
+        if isinstance(reply, FunctionCall):
+            await self._generate(completion_tokens)
+            yield LlmResponse(
+                content=Content(role="model", parts=[Part(function_call=reply)]),
+                usage_metadata=usage,
+            )
+            return
+        if stream:
+            for start in range(0, len(text), STREAM_CHUNK_CHARS):
+                chunk = text[start : start + STREAM_CHUNK_CHARS]
+                await self._generate(count_tokens(chunk))
+                yield LlmResponse(
+                    content=Content(role="model", parts=[Part(text=chunk)]),
+                    partial=True,
+                )
+        else:
+            await self._generate(completion_tokens)
+        yield LlmResponse(
+            content=Content(role="model", parts=[Part(text=text)]),
+            usage_metadata=usage,
+        )
+
+    async def _generate(self, tokens: int):
+        if self.tokens_per_second > 0:
+            await asyncio.sleep(tokens / self.tokens_per_second)
+
+
+HOTEL_TOOLS = {
+    "search-all-hotels-dummy": ("Search for all hotels.", []),
+    "search-hotels-by-name": (
+        "Search for hotels based on name.",
+        [{"name": "name", "type": "string", "description": "The name of the hotel."}],
+    ),
+    "search-hotels-by-location": (
+        "Search for hotels based on location.",
+        [
+            {
+                "name": "location",
+                "type": "string",
+                "description": "The location of the hotel.",
+            }
+        ],
+    ),
+}
+
+
+def make_hotels(count: int) -> List[dict]:
+    cities = ["Tokyo", "Osaka", "Kyoto", "Sapporo", "Fukuoka"]
+    return [
+        {
+            "id": i + 1,
+            "name": f"Hotel {cities[i % len(cities)]} {i + 1}",
+            "location": cities[i % len(cities)],
+            "price_tier": ["Economy", "Midscale", "Luxury"][i % 3],
+            "checkin_date": "2024-04-01",
+            "checkout_date": "2024-04-03",
+            "booked": i % 4 == 0,
+        }
+        for i in range(count)
+    ]
+
+
+def toolbox_app(
+    latency_ms: float = 10.0, hotels: int = 50, toolset: str = "dummy-toolset"
+) -> web.Application:
+    """Fake Toolbox server: `GET /api/toolset/{name}`, `POST /api/tool/{name}/invoke`."""
+    rows = make_hotels(hotels)
+    manifest = {
+        "serverVersion": "0.6.0+fake",
+        "tools": {
+            name: {"description": description, "parameters": parameters}
+            for name, (description, parameters) in HOTEL_TOOLS.items()
+        },
+    }
+
+    async def get_toolset(request):
+        if request.match_info["name"] != toolset:
+            raise web.HTTPNotFound()
+        return web.json_response(manifest)
+
+    async def invoke(request):
+        name = request.match_info["name"]
+        if name not in HOTEL_TOOLS:
+            raise web.HTTPNotFound()
+        params = await request.json()
+        await asyncio.sleep(latency_ms / 1000)
+        matched = [
+            row
+            for row in rows
+            if all(
+                str(v).lower() in str(row.get(k, "")).lower() for k, v in params.items()
+            )
+        ]
+        return web.json_response(
+            {"result": json.dumps(matched, ensure_ascii=False)},
+            dumps=lambda v: json.dumps(v, ensure_ascii=False),
+        )
+
+    app = web.Application()
+    app.router.add_get("/api/toolset/{name}", get_toolset)
+    app.router.add_post("/api/tool/{name}/invoke", invoke)
+    return app
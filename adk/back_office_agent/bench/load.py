@@ -0,0 +1,301 @@
+"""
+Offline load bench for the root workflow.
+
+Runs N concurrent sessions through a fresh BackOfficeRootAgent whose agents
+use FakeLiteLlm, with the parking tool served by the fake Elasticsearch MCP
+server (through the real CustomMCPToolset pool) and the hotel tools by a
+fake Toolbox server. Half of the sessions take the parking + auth path, the
+other half the common path. No OpenAI, Elasticsearch or BigQuery needed.
+
+Reports turns/sec, turn latency and per-stage (span) latency percentiles,
+the tool-call coalescing ratio per backend, the metrics counters (cache hits,
+classifier / polish paths, ...) and memory per session as JSON. With
+`--baseline`, exits 1 when throughput or a stage p95 regressed by more than
+`--tolerance` against an earlier report.
+
+    python -m back_office_agent.bench.load --sessions 50 --concurrency 10 \
+        --output load.json
+    python -m back_office_agent.bench.load --baseline load.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shlex
+import sys
+import time
+from collections import defaultdict
+
+from aiohttp import web
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.runners import Runner
+from google.genai.types import Content, Part
+
+from ..agent import BackOfficeRootAgent
+from ..metrics import metrics, percentile
+from ..session_store import session_service_from_env
+from .fakes import FakeLiteLlm, toolbox_app
+
+SCENARIOS = {
+    # The first parking request is answered right after the password
+    "parking": [
+        "駐車場を探して",
+        "{password}",
+        "渋谷駅の駐車場",
+        "新宿駅 3万円以下の駐車場",
+    ],
+    "common": ["こんにちは", "東京のホテルを教えて", "ありがとうございました"],
+}
+AGENT_ROLES = {
+    "classifier_agent": "classifier",
+    "parking_agent": "parking",
+    "common_agent": "common",
+    "tone_polish_agent": "tone_polish",
+}
+PASSWORD = "bench-password"
+FAKE_ES_MCP_PATH = os.path.join(os.path.dirname(__file__), "fake_es_mcp.py")
+# Relative p95 / throughput change reported as a regression
+DEFAULT_TOLERANCE = 0.2
+
+
+def _percentiles(samples) -> dict:
+    return {f"p{q}_ms": round(percentile(samples, q), 2) for q in (50, 95, 99)}
+
+
+def _rss_kb() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        # No procfs (macOS): peak RSS, in bytes there
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == "darwin" else peak
+
+
+def build_root_agent(args):
+    """A fresh root agent wired to the fakes (env is read when it builds tools)."""
+    root = BackOfficeRootAgent(None)
+    for name, role in AGENT_ROLES.items():
+        agent = getattr(root, name)
+        agent.model = FakeLiteLlm(
+            model=f"fake/{role}",
+            role=role,
+            latency_ms=args.llm_latency_ms,
+            tokens_per_second=args.llm_tokens_per_second,
+        )
+    return root
+
+
+async def run_session(runner, session_service, scenario, run_config, turns_out):
+    session = await session_service.create_session(app_name="bench", user_id="bench")
+    for i, text in enumerate(SCENARIOS[scenario]):
+        message = Content(
+            role="user", parts=[Part(text=text.format(password=PASSWORD))]
+        )
+        started = time.perf_counter()
+        error, answered = None, False
+        try:
+            async for event in runner.run_async(
+                user_id="bench",
+                session_id=session.id,
+                new_message=message,
+                run_config=run_config,
+            ):
+                answered = answered or event.is_final_response()
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        turns_out.append(
+            {
+                "scenario": scenario,
+                "turn": i,
+                "ms": (time.perf_counter() - started) * 1000,
+                "answered": answered,
+                "error": error,
+            }
+        )
+    session = await session_service.get_session(
+        app_name="bench", user_id="bench", session_id=session.id
+    )
+    return {
+        "events": len(session.events),
+        "state_bytes": len(json.dumps(session.state, ensure_ascii=False, default=str)),
+        "session_bytes": len(session.model_dump_json()),
+    }
+
+
+def _labels_key(labels: dict) -> str:
+    return ",".join(f"{k}={v}" for k, v in labels.items()) or "total"
+
+
+def summarize(turns, sessions, elapsed, rss_delta_kb) -> dict:
+    by_scenario = defaultdict(list)
+    for turn in turns:
+        by_scenario[turn["scenario"]].append(turn["ms"])
+    snapshot = metrics.snapshot()
+    stages = {
+        series["labels"]["span"]: {
+            "count": series["count"],
+            **{f"{q}_ms": round(series[q], 2) for q in ("p50", "p95", "p99")},
+        }
+        for series in snapshot["histograms"].get("span_duration_ms", [])
+    }
+    # Share of tool calls served by an identical call already in flight
+    coalescing = defaultdict(lambda: {"calls": 0, "shared": 0})
+    for series in snapshot["counters"].get("tool_coalesce_calls_total", []):
+        entry = coalescing[series["labels"]["backend"]]
+        entry["calls"] += series["value"]
+        if series["labels"]["outcome"] == "shared":
+            entry["shared"] += series["value"]
+    return {
+        "turns": len(turns),
+        "errors": sum(1 for turn in turns if turn["error"]),
+        "error_examples": [turn["error"] for turn in turns if turn["error"]][:3],
+        "unanswered": sum(1 for turn in turns if not turn["answered"]),
+        "elapsed_s": round(elapsed, 3),
+        "turns_per_s": round(len(turns) / elapsed, 2) if elapsed else 0.0,
+        "turn_latency": {
+            "all": _percentiles([turn["ms"] for turn in turns]),
+            **{name: _percentiles(ms) for name, ms in sorted(by_scenario.items())},
+        },
+        "stages": dict(sorted(stages.items())),
+        "coalescing_ratio": {
+            backend: round(entry["shared"] / entry["calls"], 3)
+            for backend, entry in sorted(coalescing.items())
+        },
+        "memory": {
+            "rss_delta_kb_per_session": round(rss_delta_kb / len(sessions), 1),
+            "events_per_session": round(
+                sum(s["events"] for s in sessions) / len(sessions), 1
+            ),
+            "state_bytes_p95": percentile([s["state_bytes"] for s in sessions], 95),
+            "session_bytes_p95": percentile([s["session_bytes"] for s in sessions], 95),
+        },
+        "counters": {
+            name: {_labels_key(series["labels"]): series["value"] for series in values}
+            for name, values in sorted(snapshot["counters"].items())
+        },
+    }
+
+
+async def run(args):
+    toolbox_runner = web.AppRunner(toolbox_app(args.tool_latency_ms))
+    await toolbox_runner.setup()
+    await web.TCPSite(toolbox_runner, "127.0.0.1", 0).start()
+    os.environ.update(
+        TOOLBOX_URL=f"http://127.0.0.1:{toolbox_runner.addresses[0][1]}",
+        ES_MCP_COMMAND=shlex.join(
+            [
+                sys.executable,
+                FAKE_ES_MCP_PATH,
+                "--latency-ms",
+                str(args.tool_latency_ms),
+            ]
+        ),
+        ES_URL=os.getenv("ES_URL") or "http://127.0.0.1:9200",
+        ES_USERNAME=os.getenv("ES_USERNAME") or "elastic",
+        ES_PASSWORD=os.getenv("ES_PASSWORD") or "bench",
+        DEMO_AUTH_API_KEY=PASSWORD,
+    )
+
+    root = build_root_agent(args)
+    warm_up = await root.warm_up()
+    metrics.reset()
+
+    session_service = session_service_from_env(args.session_store)
+    runner = Runner(app_name="bench", agent=root, session_service=session_service)
+    run_config = RunConfig(
+        streaming_mode=StreamingMode.SSE if args.streaming else StreamingMode.NONE
+    )
+    semaphore = asyncio.Semaphore(args.concurrency)
+    turns = []
+
+    async def bounded(i):
+        async with semaphore:
+            scenario = "parking" if i % 2 == 0 else "common"
+            return await run_session(
+                runner, session_service, scenario, run_config, turns
+            )
+
+    rss_before = _rss_kb()
+    started = time.perf_counter()
+    try:
+        sessions = await asyncio.gather(*(bounded(i) for i in range(args.sessions)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await root.close()
+        await toolbox_runner.cleanup()
+        if hasattr(session_service, "close"):
+            await session_service.close()
+
+    report = {
+        "config": {
+            key: getattr(args, key)
+            for key in (
+                "sessions",
+                "concurrency",
+                "streaming",
+                "llm_latency_ms",
+                "llm_tokens_per_second",
+                "tool_latency_ms",
+                "session_store",
+            )
+        },
+        "warm_up": warm_up,
+        **summarize(turns, sessions, elapsed, _rss_kb() - rss_before),
+    }
+    return report
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list:
+    """Regressions of `report` against `baseline`, beyond `tolerance`."""
+    regressions = []
+    if report["turns_per_s"] < baseline["turns_per_s"] * (1 - tolerance):
+        regressions.append(
+            f"turns_per_s {baseline['turns_per_s']} -> {report['turns_per_s']}"
+        )
+    for name, stage in baseline.get("stages", {}).items():
+        current = report["stages"].get(name)
+        if current and current["p95_ms"] > stage["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name} p95 {stage['p95_ms']}ms -> {current['p95_ms']}ms"
+            )
+    if report["errors"] > baseline.get("errors", 0):
+        regressions.append(f"errors {baseline.get('errors', 0)} -> {report['errors']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--streaming", action="store_true", help="SSE run config")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--tool-latency-ms", type=float, default=10.0)
+    parser.add_argument(
+        "--session-store",
+        default="memory",
+        help="SESSION_STORE_URL to run against, e.g. sqlite:////tmp/sessions.db",
+    )
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+    report = asyncio.run(run(args))
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            report["regressions"] = compare(report, json.load(f), args.tolerance)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    if report.get("regressions"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Cold start bench for the root agent.
+
+Each run starts a fresh interpreter and measures the time to import the ADK
+runtime, to import `back_office_agent` (building `root_agent`), to warm it up
+(optional) and to get the first event / final response of one message
+through a Runner with an in-memory session. Prints medians and p95 as JSON.
+
+    python -m back_office_agent.bench.startup --runs 5 --warm-up
+
+Needs the usual environment (ES_URL, TOOLBOX_URL, model API keys, ...);
+a failing first response is reported per run instead of aborting the bench.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from ..metrics import percentile
+
+ADK_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Runs in the child process. It must not import the package before timing it.
+CHILD_SCRIPT = """
+import asyncio, json, sys, time
+
+config = json.loads(sys.argv[1])
+timings = {}
+started = time.perf_counter()
+
+
+def mark(name, since):
+    now = time.perf_counter()
+    timings[name] = round((now - since) * 1000, 1)
+    return now
+
+
+import google.adk.runners
+import google.adk.sessions
+from google.genai import types
+
+t = mark("import_adk_ms", started)
+from back_office_agent.agent import root_agent, warm_up
+
+t = mark("import_agent_ms", t)
+
+
+async def main():
+    t = time.perf_counter()
+    if config["warm_up"]:
+        timings["warm_up"] = await warm_up()
+        t = mark("warm_up_ms", t)
+    session_service = google.adk.sessions.InMemorySessionService()
+    runner = google.adk.runners.Runner(
+        app_name="bench", agent=root_agent, session_service=session_service
+    )
+    session = await session_service.create_session(app_name="bench", user_id="bench")
+    message = types.Content(role="user", parts=[types.Part(text=config["message"])])
+    try:
+        async for event in runner.run_async(
+            user_id="bench", session_id=session.id, new_message=message
+        ):
+            if "first_event_ms" not in timings:
+                mark("first_event_ms", t)
+            if event.is_final_response() and "first_response_ms" not in timings:
+                mark("first_response_ms", t)
+    except Exception as e:
+        timings["error"] = f"{type(e).__name__}: {e}"
+    mark("total_ms", started)
+
+
+asyncio.run(main())
+with open(config["output"], "w") as f:
+    json.dump(timings, f)
+"""
+
+SUMMARY_KEYS = (
+    "process_ms",
+    "import_adk_ms",
+    "import_agent_ms",
+    "warm_up_ms",
+    "first_event_ms",
+    "first_response_ms",
+    "total_ms",
+)
+
+
+def run_once(message: str, warm_up: bool) -> dict:
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        output = f.name
+    config = {"message": message, "warm_up": warm_up, "output": output}
+    started = time.perf_counter()
+    try:
+        subprocess.run(
+            [sys.executable, "-c", CHILD_SCRIPT, json.dumps(config)],
+            cwd=ADK_DIR,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        with open(output, encoding="utf-8") as f:
+            timings = json.load(f)
+    finally:
+        os.unlink(output)
+    # Includes interpreter start up and shutdown
+    timings["process_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return timings
+
+
+def summarize(runs) -> dict:
+    summary = {}
+    for key in SUMMARY_KEYS:
+        values = [run[key] for run in runs if key in run]
+        if values:
+            summary[key] = {
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+            }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--message", default="こんにちは")
+    parser.add_argument(
+        "--warm-up",
+        action="store_true",
+        help="call warm_up() before the first message, as server.py does",
+    )
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    args = parser.parse_args()
+
+    runs = [run_once(args.message, args.warm_up) for _ in range(args.runs)]
+    report = {
+        "runs": args.runs,
+        "warm_up": args.warm_up,
+        "summary": summarize(runs),
+        "errors": sorted({run["error"] for run in runs if "error" in run}),
+        "samples": runs,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
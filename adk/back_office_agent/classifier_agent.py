@@ -1,5 +1,6 @@
 from google.adk.agents.llm_agent import LlmAgent
-from google.adk.models.lite_llm import LiteLlm
+from .custom_adk_patches import CustomLiteLlm
+from .history_window import HistoryWindow
 from .utils import RequestType
 import logging
 
@@ -10,7 +11,7 @@ class ClassifierAgent(LlmAgent):
 
         super().__init__(
             name="classifier_agent",
-            model=LiteLlm(model="openai/gpt-4o-mini"),
+            model=CustomLiteLlm(model="openai/gpt-4o-mini"),
             instruction=f"""
 Guidelines:
 - You are a request classifier. 
@@ -19,4 +20,8 @@ Guidelines:
 - Do not explain. Output only one word: '{RequestType.PARKING.value}' or '{RequestType.OTHER.value}'.
 """,
             output_key="classifier_result",
+            # Only the latest user message matters for classification
+            before_model_callback=HistoryWindow.for_agent(
+                "classifier_agent"
+            ).before_model_callback,
         )
@@ -1,17 +1,21 @@
 from google.adk.agents.llm_agent import LlmAgent
-from google.adk.models.lite_llm import LiteLlm
+from .custom_adk_patches import CustomLiteLlm
+from .history_window import HistoryWindow
+from .result_compactor import ToolResultCompactor
+from .tone_style import ANSWER_STYLE_GUIDELINES, INLINE_TONE_POLISH
 import logging
 
 
 class CommonAgent(LlmAgent):
-    def __init__(self, ctx, tools):
+    def __init__(self, ctx, tools, inline_tone=INLINE_TONE_POLISH):
         logging.info("[CommonAgent] Initializing CommonAgent")
         logging.info(f"Tools: {tools}")
 
         super().__init__(
             name="common_agent",
-            model=LiteLlm(model="openai/gpt-4o-mini"),
-            instruction="""
+            model=CustomLiteLlm(model="openai/gpt-4o-mini"),
+            instruction=(
+                """
 Guidelines:
 - For every response, always start with a title line: `[Common Agent]` (include this exactly, at the very top of your reply).
 - If you are unsure about a fact, clearly state that you are not certain rather than providing potentially incorrect or misleading information.
@@ -24,9 +28,18 @@ Guidelines:
     - If you can answer directly, do so.
     - If you need more information or need to search, use the provided tools (search-all-hotels-dummy, search-hotels-by-name, search-hotels-by-location).
     - If tool usage is not possible, answer as best as you can based on your knowledge.
-""",
+"""
+                + (ANSWER_STYLE_GUIDELINES if inline_tone else "")
+            ),
             output_key="response_text",
             tools=tools,
+            before_model_callback=HistoryWindow.for_agent(
+                "common_agent"
+            ).before_model_callback,
+            # `SELECT *` rows reach the model as a table within the token budget
+            after_tool_callback=ToolResultCompactor.for_agent(
+                "common_agent"
+            ).after_tool_callback,
         )
 
     async def run_async(self, ctx):
@@ -2,35 +2,86 @@
 Custom ADK Patches for MCP Timeout Configuration.
 
 This module provides custom implementations of ADK's MCP classes to allow
-configurable timeouts for StdioServerParameters connections.
+configurable timeouts for StdioServerParameters connections (with a pool of
+pre-spawned sessions, see mcp_pool.py), and a LiteLlm whose text streaming
+does not block the event loop.
+
+`CustomMCPToolset` lists the server's tools once and serves the cached tools
+(with their prebuilt function declarations) to every session until the
+server sends `notifications/tools/list_changed`, a session is recreated, or
+MCP_TOOL_SCHEMA_TTL_SECONDS pass.
 
 The google-adk 1.2.0 introduced a hardcoded 5-second timeout for stdio-based
 MCP connections, which can be too short for some legitimate operations like
 Spinach AI transcription and analysis.
 """
 
+import asyncio
+import json
+import logging
+import os
 import sys
-from contextlib import AsyncExitStack
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
 from datetime import timedelta
-from typing import Any, Dict, List, Optional, TextIO, Union
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Dict,
+    List,
+    Optional,
+    TextIO,
+    Tuple,
+    Union,
+)
 
+from google.adk.models.lite_llm import (
+    ChatCompletionAssistantMessage,
+    ChatCompletionMessageToolCall,
+    Function,
+    FunctionChunk,
+    LiteLlm,
+    TextChunk,
+    UsageMetadataChunk,
+    _get_completion_inputs,
+    _message_to_generate_content_response,
+    _model_response_to_chunk,
+)
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.agents.readonly_context import ReadonlyContext
+from google.adk.tools.base_tool import BaseTool
 from google.adk.tools.mcp_tool.mcp_session_manager import (
     MCPSessionManager,
     StdioServerParameters,
+    retry_on_closed_resource,
 )
+from google.adk.tools.mcp_tool.mcp_tool import MCPTool
 from google.adk.tools.mcp_tool.mcp_toolset import (
     MCPToolset,
     SseServerParams,
     StreamableHTTPServerParams,
     ToolPredicate,
 )
+from mcp import types as mcp_types
 from mcp.client.session import ClientSession
 from mcp.client.sse import sse_client
 from mcp.client.stdio import stdio_client
 from mcp.client.streamable_http import streamablehttp_client
+from google.genai import types
+
+from .mcp_pool import MCP_POOL_MAX_SIZE, MCP_POOL_MIN_SIZE, McpSessionPool
+from .metrics import metrics
+from .resilience import ResilientCaller, unavailable_message
+from .single_flight import SingleFlight
+from .tool_cache import ToolResultCache
+from .tracing import set_tool_result, span
 
 # Configure your desired timeout for stdio-based MCP connections
 CUSTOM_STDIO_TIMEOUT_SECONDS = 300  # 60 seconds instead of the default 5 seconds
+# How long the listed MCP tools are reused without asking the server (0: every call)
+MCP_TOOL_SCHEMA_TTL_SECONDS = float(os.getenv("MCP_TOOL_SCHEMA_TTL_SECONDS", "3600"))
 
 
 class CustomMcpSessionManager(MCPSessionManager):
@@ -48,6 +99,8 @@ class CustomMcpSessionManager(MCPSessionManager):
             StdioServerParameters, SseServerParams, StreamableHTTPServerParams
         ],
         errlog: TextIO = sys.stderr,
+        pool_min_size: int = MCP_POOL_MIN_SIZE,
+        pool_max_size: int = MCP_POOL_MAX_SIZE,
     ):
         """Initialize the custom session manager with all required attributes."""
         # Initialize all attributes exactly as the original MCPSessionManager does
@@ -55,6 +108,24 @@ class CustomMcpSessionManager(MCPSessionManager):
         self._errlog = errlog
         self._exit_stack: Optional[AsyncExitStack] = None
         self._session: Optional[ClientSession] = None
+        # Tool calls go through a pool of sessions (pool_max_size=0 disables it)
+        self._pool_min_size = pool_min_size
+        self._pool_max_size = pool_max_size
+        self._pool: Optional[McpSessionPool] = None
+        # Bumped whenever the server's tool list may have changed
+        self.tools_generation = 0
+
+    def invalidate_tools(self, reason: str):
+        """Make the toolsets list the tools again on their next `get_tools`."""
+        self.tools_generation += 1
+        metrics.increment("mcp_tool_schema_invalidations_total", reason=reason)
+        logging.info(f"[CustomMcpSessionManager] Tool schemas invalidated ({reason})")
+
+    async def _handle_message(self, message):
+        if isinstance(message, mcp_types.ServerNotification) and isinstance(
+            message.root, mcp_types.ToolListChangedNotification
+        ):
+            self.invalidate_tools("list_changed")
 
     async def create_session(self) -> ClientSession:
         """
@@ -70,6 +141,21 @@ class CustomMcpSessionManager(MCPSessionManager):
         self._exit_stack = AsyncExitStack()
 
         try:
+            self._session = await self._open_session(self._exit_stack)
+            return self._session
+
+        except Exception:
+            # If session creation fails, clean up the exit stack
+            if self._exit_stack:
+                await self._exit_stack.aclose()
+                self._exit_stack = None
+            raise
+
+    async def _open_session(self, exit_stack: AsyncExitStack) -> ClientSession:
+        """Open and initialize a session whose resources live on `exit_stack`."""
+        with span(
+            "mcp_session_open", mcp__transport=type(self._connection_params).__name__
+        ):
             if isinstance(self._connection_params, StdioServerParameters):
                 client = stdio_client(
                     server=self._connection_params, errlog=self._errlog
@@ -98,40 +184,72 @@ class CustomMcpSessionManager(MCPSessionManager):
                     f" {self._connection_params}"
                 )
 
-            transports = await self._exit_stack.enter_async_context(client)
+            transports = await exit_stack.enter_async_context(client)
 
             # HERE IS THE CUSTOM TIMEOUT LOGIC:
             if isinstance(self._connection_params, StdioServerParameters):
                 print(
                     f"CUSTOM_ADK: Applying custom timeout for StdioServerParameters: {CUSTOM_STDIO_TIMEOUT_SECONDS}s"
                 )
-                session = await self._exit_stack.enter_async_context(
+                session = await exit_stack.enter_async_context(
                     ClientSession(
                         *transports[:2],
                         read_timeout_seconds=timedelta(
                             seconds=CUSTOM_STDIO_TIMEOUT_SECONDS
                         ),
+                        message_handler=self._handle_message,
                     )
                 )
             else:
                 # Original logic for other connection types
-                session = await self._exit_stack.enter_async_context(
-                    ClientSession(*transports[:2])
+                session = await exit_stack.enter_async_context(
+                    ClientSession(*transports[:2], message_handler=self._handle_message)
                 )
 
             await session.initialize()
-            self._session = session
             return session
 
-        except Exception:
-            # If session creation fails, clean up the exit stack
-            if self._exit_stack:
-                await self._exit_stack.aclose()
-                self._exit_stack = None
-            raise
+    def _get_pool(self) -> Optional[McpSessionPool]:
+        if self._pool is None and self._pool_max_size > 0:
+            self._pool = McpSessionPool(
+                self._open_session,
+                min_size=self._pool_min_size,
+                max_size=self._pool_max_size,
+                # A replacement process may serve other tools
+                on_recycle=lambda reason: self.invalidate_tools("session_recreated"),
+            )
+        return self._pool
+
+    async def start_pool(self):
+        """Pre-spawn and initialize the pooled sessions (e.g. at startup)."""
+        pool = self._get_pool()
+        if pool is not None:
+            await pool.start()
+
+    def start_pool_soon(self) -> bool:
+        """Schedule `start_pool` if an event loop is running; False otherwise."""
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        pool = self._get_pool()
+        if pool is not None:
+            pool.start_soon()
+        return True
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[ClientSession]:
+        """Check out a pooled session, or share the single session without a pool."""
+        pool = self._get_pool()
+        if pool is None:
+            yield await self.create_session()
+            return
+        async with pool.acquire() as session:
+            yield session
 
     async def close(self):
         """Closes the session and cleans up resources."""
+        self.invalidate_tools("session_recreated")
         if self._exit_stack:
             try:
                 await self._exit_stack.aclose()
@@ -143,6 +261,92 @@ class CustomMcpSessionManager(MCPSessionManager):
             finally:
                 self._exit_stack = None
                 self._session = None
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await pool.close()
+
+
+class CustomMCPTool(MCPTool):
+    """
+    MCP tool whose calls go through the toolset's result cache.
+
+    Only successful results are cached; `isError` results always go back to
+    the MCP server on the next call. Cache misses identical to a call already
+    in flight share its result (see single_flight.py).
+    """
+
+    def __init__(
+        self,
+        *,
+        mcp_tool,
+        mcp_session_manager: MCPSessionManager,
+        result_cache: Optional[ToolResultCache] = None,
+        single_flight: Optional[SingleFlight] = None,
+        resilience: Optional[ResilientCaller] = None,
+    ):
+        super().__init__(mcp_tool=mcp_tool, mcp_session_manager=mcp_session_manager)
+        self._result_cache = result_cache
+        self._single_flight = single_flight
+        self._resilience = resilience
+        self._declaration = None
+
+    def _get_declaration(self):
+        # Built once per listed tool instead of on every LLM request
+        if self._declaration is None:
+            self._declaration = super()._get_declaration()
+        return self._declaration
+
+    async def run_async(self, *, args, tool_context):
+        with span(
+            f"tool [{self.name}]", tool__name=self.name, tool__backend="mcp"
+        ) as current:
+            hit, shared, response = False, False, None
+            if self._result_cache is not None:
+                hit, response = self._result_cache.get(self.name, args)
+            if not hit:
+                if self._single_flight is not None:
+                    response, shared = await self._single_flight.call(
+                        self.name, args, lambda: self._call_and_cache(args)
+                    )
+                else:
+                    response = await self._call_and_cache(args)
+            set_tool_result(current, response, cache_hit=hit, coalesced=shared)
+            return response
+
+    async def _call_and_cache(self, args):
+        if self._resilience is None:
+            return await self._attempt(args, None)
+        return await self._resilience.call(
+            self.name,
+            args,
+            lambda timeout: self._attempt(args, timeout),
+            self._unavailable,
+        )
+
+    async def _attempt(self, args, timeout: Optional[float]):
+        response = await self._call_tool(args, timeout)
+        if self._result_cache is not None and not getattr(response, "isError", False):
+            self._result_cache.put(self.name, args, response)
+        return response
+
+    async def _call_tool(self, args, timeout: Optional[float] = None):
+        # A timed out call recycles its (possibly hung) session, see mcp_pool.py
+        read_timeout = timedelta(seconds=timeout) if timeout else None
+        async with self._mcp_session_manager.acquire() as session:
+            return await session.call_tool(
+                self.name, arguments=args, read_timeout_seconds=read_timeout
+            )
+
+    def _unavailable(self, reason: str) -> mcp_types.CallToolResult:
+        return mcp_types.CallToolResult(
+            content=[
+                mcp_types.TextContent(
+                    type="text",
+                    text=f"Error: {unavailable_message('Elasticsearch', reason)}",
+                )
+            ],
+            isError=True,
+        )
 
 
 class CustomMCPToolset(MCPToolset):
@@ -160,6 +364,7 @@ class CustomMCPToolset(MCPToolset):
         ],
         tool_filter: Union[ToolPredicate, List[str], None] = None,
         errlog: TextIO = sys.stderr,
+        result_cache: Optional[ToolResultCache] = None,
     ):
         """
         Initialize Custom MCPToolset with CustomMcpSessionManager.
@@ -168,6 +373,7 @@ class CustomMCPToolset(MCPToolset):
             connection_params: Parameters for the MCP connection
             tool_filter: Optional filter to select specific tools
             errlog: TextIO stream for error logging
+            result_cache: Optional cache shared by the toolset's tool calls
         """
         # Call BaseToolset's __init__ directly, bypassing MCPToolset's __init__
         # This prevents the original MCPToolset from creating the default MCPSessionManager
@@ -184,6 +390,78 @@ class CustomMCPToolset(MCPToolset):
         self._loaded_tools = False
         self._closed = False
         self._session: Optional[ClientSession] = None  # Normal attribute, not property
+        self._result_cache = result_cache
+        self._single_flight = SingleFlight("mcp")
+        self._resilience = ResilientCaller("mcp")
+        # (tools_generation, expiry, tools) of the last listing, for every session
+        self._listed: Optional[Tuple[int, float, List[CustomMCPTool]]] = None
+        self._list_lock: Optional[asyncio.Lock] = None
+        self._schema_ttl = MCP_TOOL_SCHEMA_TTL_SECONDS
+
+    @retry_on_closed_resource("_reinitialize_session")
+    async def get_tools(
+        self, readonly_context: Optional[ReadonlyContext] = None
+    ) -> List[BaseTool]:
+        """Same as MCPToolset.get_tools, but wraps the tools in CustomMCPTool."""
+        tools, outcome = self._cached_tools(), "hit"
+        if tools is None:
+            if self._list_lock is None:
+                self._list_lock = asyncio.Lock()
+            async with self._list_lock:
+                # One listing for all the sessions that found the cache stale
+                tools, outcome = self._cached_tools(), "shared"
+                if tools is None:
+                    tools, outcome = await self._list_tools(), "miss"
+        metrics.increment("mcp_tool_schema_cache_total", outcome=outcome)
+        return [
+            tool for tool in tools if self._is_tool_selected(tool, readonly_context)
+        ]
+
+    def _cached_tools(self) -> Optional[List["CustomMCPTool"]]:
+        listed = self._listed
+        if (
+            listed is not None
+            and listed[0] == self._mcp_session_manager.tools_generation
+            and time.monotonic() < listed[1]
+        ):
+            return listed[2]
+        return None
+
+    async def _list_tools(self) -> List["CustomMCPTool"]:
+        generation = self._mcp_session_manager.tools_generation
+        async with self._mcp_session_manager.acquire() as session:
+            tools_response = await session.list_tools()
+        tools = [
+            CustomMCPTool(
+                mcp_tool=tool,
+                mcp_session_manager=self._mcp_session_manager,
+                result_cache=self._result_cache,
+                single_flight=self._single_flight,
+                resilience=self._resilience,
+            )
+            for tool in tools_response.tools
+        ]
+        # Generation read before listing: an invalidation meanwhile lists again
+        self._listed = (generation, time.monotonic() + self._schema_ttl, tools)
+        return tools
+
+    async def _reinitialize_session(self):
+        """Drop all sessions; the next call re-creates them (pool or single)."""
+        await self._mcp_session_manager.close()
+
+    async def start_pool(self):
+        """Pre-spawn the MCP server processes (and list their tools) so no user request pays for it."""
+        await self._mcp_session_manager.start_pool()
+        await self.get_tools()
+
+    def start_pool_soon(self) -> bool:
+        return self._mcp_session_manager.start_pool_soon()
+
+    def invalidate_cache(self, tool_name: Optional[str] = None) -> int:
+        """Invalidation hook: drop cached results (of one tool, or all)."""
+        if self._result_cache is None:
+            return 0
+        return self._result_cache.invalidate(tool_name)
 
     @property
     def _session(self):
@@ -196,3 +474,117 @@ class CustomMCPToolset(MCPToolset):
         # The ADK tries to set this, but we let the session manager handle it
         # We don't actually need to store it here since we get it from the session manager
         pass
+
+
+class CustomLiteLlm(LiteLlm):
+    """
+    LiteLlm with non-blocking streaming.
+
+    google-adk 1.2.1 streams through litellm's synchronous `completion()`
+    iterator, which blocks the event loop between chunks and serialises every
+    concurrently streaming agent. Requests are streamed here through
+    `acompletion(stream=True)` instead, with text and function call deltas
+    aggregated the same way as the original implementation.
+    """
+
+    async def generate_content_async(
+        self, llm_request: LlmRequest, stream: bool = False
+    ) -> AsyncGenerator[LlmResponse, None]:
+        if not stream:
+            async for response in super().generate_content_async(
+                llm_request, stream=stream
+            ):
+                yield response
+            return
+
+        self._maybe_append_user_content(llm_request)
+        messages, tools, response_format = _get_completion_inputs(llm_request)
+        completion_args = {
+            "model": self.model,
+            "messages": messages,
+            "tools": tools,
+            "response_format": response_format,
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+        completion_args.update(self._additional_args)
+
+        text = ""
+        # index -> {"name", "args", "id"} of the function calls being streamed
+        function_calls: Dict[int, Dict[str, Any]] = {}
+        fallback_index = 0
+        text_response, tool_call_response = None, None
+        usage_metadata = None
+        async for part in await self.llm_client.acompletion(**completion_args):
+            for chunk, finish_reason in _model_response_to_chunk(part):
+                if isinstance(chunk, FunctionChunk):
+                    index = chunk.index or fallback_index
+                    call = function_calls.setdefault(
+                        index, {"name": "", "args": "", "id": None}
+                    )
+                    call["name"] += chunk.name or ""
+                    if chunk.args:
+                        call["args"] += chunk.args
+                        # Some providers send every call with index 0: a
+                        # complete JSON object ends the current one
+                        try:
+                            json.loads(call["args"])
+                            fallback_index += 1
+                        except ValueError:
+                            pass
+                    call["id"] = chunk.id or call["id"] or str(index)
+                elif isinstance(chunk, TextChunk):
+                    text += chunk.text
+                    yield _message_to_generate_content_response(
+                        ChatCompletionAssistantMessage(
+                            role="assistant", content=chunk.text
+                        ),
+                        is_partial=True,
+                    )
+                elif isinstance(chunk, UsageMetadataChunk):
+                    usage_metadata = types.GenerateContentResponseUsageMetadata(
+                        prompt_token_count=chunk.prompt_tokens,
+                        candidates_token_count=chunk.completion_tokens,
+                        total_token_count=chunk.total_tokens,
+                    )
+
+                if finish_reason in ("tool_calls", "stop") and function_calls:
+                    tool_call_response = _tool_call_response(function_calls)
+                    function_calls.clear()
+                elif finish_reason == "stop" and text:
+                    text_response = _message_to_generate_content_response(
+                        ChatCompletionAssistantMessage(role="assistant", content=text)
+                    )
+                    text = ""
+        if function_calls:
+            # Stream ended without a finish reason
+            tool_call_response = _tool_call_response(function_calls)
+        if text and text_response is None and tool_call_response is None:
+            text_response = _message_to_generate_content_response(
+                ChatCompletionAssistantMessage(role="assistant", content=text)
+            )
+
+        # Yielded once the stream ends: litellm sends the usage chunk after the
+        # one with the finish reason
+        for response in (text_response, tool_call_response):
+            if response is not None:
+                response.usage_metadata = usage_metadata
+                usage_metadata = None
+                yield response
+
+
+def _tool_call_response(function_calls: Dict[int, Dict[str, Any]]) -> LlmResponse:
+    tool_calls = [
+        ChatCompletionMessageToolCall(
+            type="function",
+            id=call["id"],
+            function=Function(name=call["name"], arguments=call["args"], index=index),
+        )
+        for index, call in function_calls.items()
+        if call["id"]
+    ]
+    return _message_to_generate_content_response(
+        ChatCompletionAssistantMessage(
+            role="assistant", content="", tool_calls=tool_calls
+        )
+    )
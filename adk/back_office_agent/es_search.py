@@ -0,0 +1,401 @@
+"""
+In-process Elasticsearch `search` tool.
+
+Same contract as the `search` tool of @elastic/mcp-server-elasticsearch
+(`index`, `queryBody`; one text block with the totals, then one per hit with
+highlighted text fields and the remaining `_source` fields), without the
+JSON-RPC / stdio hop and the Node child process.
+
+Requests go through one pooled aiohttp session (keep-alive, gzip) and use
+`filter_path` so Elasticsearch only returns the parts of the response that
+are rendered. Highlight fields come from the SchemaRegistry instead of a
+`_mapping` request per search. Deadlines, hedging and the circuit breaker
+come from a ResilientCaller, like for the MCP tools. Select it with
+ES_SEARCH_BACKEND=native.
+
+`MsearchElasticsearchClient` sends the searches issued within a few
+milliseconds of each other as one `_msearch` request, and identical ones
+only once (used by the batch runner).
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+from google.adk.tools.base_tool import BaseTool
+from google.genai.types import FunctionDeclaration, Schema, Type
+from mcp.types import CallToolResult, TextContent
+
+from .metrics import metrics
+from .resilience import ResilientCaller, unavailable_message
+from .schema import SchemaRegistry, get_schema
+from .single_flight import SingleFlight
+from .tool_cache import ToolResultCache
+from .tracing import set_tool_result, span
+
+# "mcp": CustomMCPToolset with the Elastic MCP server (default)
+# "native": ElasticsearchSearchTool
+ES_SEARCH_BACKEND = os.getenv("ES_SEARCH_BACKEND", "mcp").lower()
+ES_POOL_SIZE = int(os.getenv("ES_POOL_SIZE", "16"))
+ES_REQUEST_TIMEOUT_SECONDS = float(os.getenv("ES_REQUEST_TIMEOUT_SECONDS", "30"))
+ES_KEEPALIVE_SECONDS = 60
+# How long a search waits for others to share its `_msearch`, and the batch cap
+ES_MSEARCH_WINDOW_MS = float(os.getenv("ES_MSEARCH_WINDOW_MS", "5"))
+ES_MSEARCH_MAX_BATCH = int(os.getenv("ES_MSEARCH_MAX_BATCH", "50"))
+
+SEARCH_FILTER_PATH = "hits.total,hits.hits._source,hits.hits.highlight"
+SEARCH_DESCRIPTION = (
+    "Perform an Elasticsearch search with the provided query DSL. "
+    "Highlights are always enabled."
+)
+
+
+class ElasticsearchError(Exception):
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+    @property
+    def retryable(self) -> bool:
+        """False for a request Elasticsearch rejected (4xx other than 429)."""
+        return self.status is None or self.status == 429 or self.status >= 500
+
+
+async def _read_json(resp: aiohttp.ClientResponse) -> Any:
+    try:
+        return await resp.json(content_type=None)
+    except ValueError:
+        # Not Elasticsearch answering, e.g. a proxy's HTML 502 page
+        status = resp.status if resp.status >= 400 else None
+        raise ElasticsearchError(f"{resp.status} {resp.reason}", status) from None
+
+
+class ElasticsearchClient:
+    """Minimal async Elasticsearch HTTP client over one pooled session."""
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        pool_size: int = ES_POOL_SIZE,
+        timeout: float = ES_REQUEST_TIMEOUT_SECONDS,
+    ):
+        self.url = (url or os.getenv("ES_URL") or "").rstrip("/")
+        username = username if username is not None else os.getenv("ES_USERNAME")
+        password = password if password is not None else os.getenv("ES_PASSWORD")
+        self._auth = aiohttp.BasicAuth(username, password or "") if username else None
+        self._pool_size = pool_size
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Created lazily: aiohttp sessions are bound to the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self._pool_size, keepalive_timeout=ES_KEEPALIVE_SECONDS
+                ),
+                auth=self._auth,
+                timeout=self._timeout,
+                headers={
+                    "Accept-Encoding": "gzip",
+                    "Content-Type": "application/json",
+                },
+            )
+        return self._session
+
+    async def search(
+        self, index: str, body: Dict[str, Any], filter_path: Optional[str] = None
+    ) -> Dict[str, Any]:
+        params = {"filter_path": filter_path} if filter_path else None
+        async with self._get_session().post(
+            f"{self.url}/{index}/_search",
+            params=params,
+            data=json.dumps(body, ensure_ascii=False).encode("utf-8"),
+        ) as resp:
+            payload = await _read_json(resp)
+            if resp.status >= 400:
+                error = (payload or {}).get("error", payload)
+                if isinstance(error, dict):
+                    error = error.get("reason") or error.get("type") or error
+                raise ElasticsearchError(f"{resp.status} {error}", resp.status)
+            return payload or {}
+
+    async def msearch(
+        self, searches: List[Tuple[str, Dict[str, Any]]], filter_path: Optional[str]
+    ) -> List[Dict[str, Any]]:
+        """One `_msearch` for (index, body) pairs; responses (or errors) in order."""
+        lines = []
+        for index, body in searches:
+            lines.append(json.dumps({"index": index}))
+            lines.append(json.dumps(body, ensure_ascii=False))
+        params = None
+        if filter_path:
+            paths = [f"responses.{path}" for path in filter_path.split(",")]
+            # `status` keeps every response (and so the order) in the array
+            extra = ["responses.status", "responses.error"]
+            params = {"filter_path": ",".join(paths + extra)}
+        async with self._get_session().post(
+            f"{self.url}/_msearch",
+            params=params,
+            data=("\n".join(lines) + "\n").encode("utf-8"),
+            headers={"Content-Type": "application/x-ndjson"},
+        ) as resp:
+            payload = await _read_json(resp)
+            if resp.status >= 400:
+                error = (payload or {}).get("error", payload)
+                if isinstance(error, dict):
+                    error = error.get("reason") or error.get("type") or error
+                raise ElasticsearchError(f"{resp.status} {error}", resp.status)
+        responses = (payload or {}).get("responses") or []
+        if len(responses) != len(searches):
+            raise ElasticsearchError(
+                f"_msearch returned {len(responses)} responses for {len(searches)}"
+            )
+        return responses
+
+    async def warm_up(self):
+        """Open a pooled keep-alive connection (and check the credentials)."""
+        async with self._get_session().head(f"{self.url}/") as resp:
+            if resp.status >= 400:
+                raise ElasticsearchError(f"{resp.status} {resp.reason}", resp.status)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class MsearchElasticsearchClient(ElasticsearchClient):
+    """
+    ElasticsearchClient grouping concurrent searches into `_msearch` requests.
+
+    A search waits up to `window_ms` for others (at most `max_batch` per
+    request); identical (index, body) searches of a batch are sent once and
+    share the response. A caller being cancelled does not cancel the batch.
+    """
+
+    def __init__(
+        self,
+        *args,
+        window_ms: float = ES_MSEARCH_WINDOW_MS,
+        max_batch: int = ES_MSEARCH_MAX_BATCH,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.window_ms = window_ms
+        self.max_batch = max_batch
+        # (filter_path, index, body JSON) -> future of the response
+        self._pending: Dict[Tuple[Optional[str], str, str], asyncio.Future] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+    async def search(
+        self, index: str, body: Dict[str, Any], filter_path: Optional[str] = None
+    ) -> Dict[str, Any]:
+        key = (filter_path, index, json.dumps(body, ensure_ascii=False, sort_keys=True))
+        future = self._pending.get(key)
+        if future is not None:
+            metrics.increment("es_msearch_searches_total", outcome="shared")
+        else:
+            metrics.increment("es_msearch_searches_total", outcome="sent")
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            # Retrieved even if every caller was cancelled
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            self._pending[key] = future
+            if len(self._pending) >= self.max_batch:
+                self._send_pending()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.window_ms / 1000, self._send_pending)
+        return await asyncio.shield(future)
+
+    def _send_pending(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch):
+        groups: Dict[Optional[str], list] = {}
+        for key, future in batch.items():
+            groups.setdefault(key[0], []).append((key, future))
+        for filter_path, items in groups.items():
+            metrics.observe("es_msearch_batch_size", len(items))
+            try:
+                responses = await self.msearch(
+                    [(index, json.loads(body)) for (_, index, body), _ in items],
+                    filter_path,
+                )
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), response in zip(items, responses):
+                if future.done():
+                    continue
+                error = response.get("error")
+                if error:
+                    if isinstance(error, dict):
+                        error = error.get("reason") or error.get("type") or error
+                    future.set_exception(
+                        ElasticsearchError(str(error), response.get("status"))
+                    )
+                else:
+                    future.set_result(response)
+
+    async def close(self):
+        self._send_pending()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        await super().close()
+
+
+def format_search_result(result: Dict[str, Any], from_: int = 0) -> CallToolResult:
+    """Render a search response the way the Elastic MCP server does."""
+    hits_section = result.get("hits") or {}
+    total = hits_section.get("total", 0)
+    if isinstance(total, dict):
+        total = total.get("value", 0)
+    hits = hits_section.get("hits") or []
+    fragments = [
+        TextContent(
+            type="text",
+            text=f"Total results: {total}, showing {len(hits)} from position {from_}",
+        )
+    ]
+    for hit in hits:
+        highlighted = hit.get("highlight") or {}
+        lines = [
+            f"{field} (highlighted): {' ... '.join(values)}"
+            for field, values in highlighted.items()
+            if values
+        ]
+        lines += [
+            f"{field}: {json.dumps(value, ensure_ascii=False, separators=(',', ':'))}"
+            for field, value in (hit.get("_source") or {}).items()
+            if field not in highlighted
+        ]
+        fragments.append(TextContent(type="text", text="\n".join(lines).strip()))
+    return CallToolResult(content=fragments)
+
+
+class ElasticsearchSearchTool(BaseTool):
+    """ADK `search` tool calling Elasticsearch directly."""
+
+    def __init__(
+        self,
+        client: Optional[ElasticsearchClient] = None,
+        schema: Optional[SchemaRegistry] = None,
+        result_cache: Optional[ToolResultCache] = None,
+    ):
+        super().__init__(name="search", description=SEARCH_DESCRIPTION)
+        self.client = client or ElasticsearchClient()
+        self.schema = schema if schema is not None else get_schema()
+        self._result_cache = result_cache
+        self._single_flight = SingleFlight("native")
+        self._resilience = ResilientCaller("native")
+
+    def _get_declaration(self) -> FunctionDeclaration:
+        return FunctionDeclaration(
+            name=self.name,
+            description=self.description,
+            parameters=Schema(
+                type=Type.OBJECT,
+                properties={
+                    "index": Schema(
+                        type=Type.STRING,
+                        description="Name of the Elasticsearch index to search",
+                    ),
+                    "queryBody": Schema(
+                        type=Type.OBJECT,
+                        description=(
+                            "Complete Elasticsearch query DSL object that can "
+                            "include query, size, from, sort, etc."
+                        ),
+                    ),
+                },
+                required=["index", "queryBody"],
+            ),
+        )
+
+    def _highlight(self) -> Dict[str, Any]:
+        # Same fields the MCP server derives from `_mapping`: top-level text fields
+        fields = {
+            path: {}
+            for path, field_type in self.schema.field_types.items()
+            if "." not in path and field_type == "text"
+        }
+        return {"fields": fields, "pre_tags": ["<em>"], "post_tags": ["</em>"]}
+
+    async def run_async(self, *, args, tool_context):
+        with span(
+            f"tool [{self.name}]", tool__name=self.name, tool__backend="native"
+        ) as current:
+            hit, shared, response = False, False, None
+            if self._result_cache is not None:
+                hit, response = self._result_cache.get(self.name, args)
+            if not hit:
+                response, shared = await self._single_flight.call(
+                    self.name, args, lambda: self._search_and_cache(args)
+                )
+            set_tool_result(current, response, cache_hit=hit, coalesced=shared)
+            return response
+
+    async def _search_and_cache(self, args) -> CallToolResult:
+        index = (args.get("index") or "").strip()
+        query_body = args.get("queryBody")
+        if isinstance(query_body, str):
+            try:
+                query_body = json.loads(query_body)
+            except ValueError:
+                query_body = None
+        if not index or not isinstance(query_body, dict):
+            # The model's mistake, not the backend's: not a breaker failure
+            return _error("'index' and an object 'queryBody' are required")
+        return await self._resilience.call(
+            self.name,
+            args,
+            lambda timeout: self._attempt(args, index, query_body, timeout),
+            lambda reason: _error(unavailable_message("Elasticsearch", reason)),
+        )
+
+    async def _attempt(
+        self, args, index: str, query_body: Dict[str, Any], timeout: float
+    ) -> CallToolResult:
+        async with asyncio.timeout(timeout):
+            response = await self._search(index, query_body)
+        if self._result_cache is not None and not response.isError:
+            self._result_cache.put(self.name, args, response)
+        return response
+
+    async def _search(self, index: str, query_body: Dict[str, Any]) -> CallToolResult:
+        body = {**query_body, "highlight": self._highlight()}
+        try:
+            result = await self.client.search(index, body, SEARCH_FILTER_PATH)
+        except ElasticsearchError as e:
+            if e.retryable:
+                # Counted against the circuit breaker by the ResilientCaller
+                raise
+            # A query Elasticsearch rejected goes back to the model to fix
+            logging.warning(f"[ElasticsearchSearchTool] Search rejected: {e}")
+            return _error(str(e))
+        return format_search_result(result, query_body.get("from") or 0)
+
+    async def close(self):
+        await self.client.close()
+
+
+def _error(message: str) -> CallToolResult:
+    return CallToolResult(
+        content=[TextContent(type="text", text=f"Error: {message}")], isError=True
+    )
@@ -0,0 +1,201 @@
+"""
+In-process fast-path request classifier.
+
+Scores a user message with a keyword lexicon plus (optionally) character
+n-gram weights learned offline from logged turns, and returns a `RequestType`
+with a confidence. `BackOfficeRootAgent` only falls back to the LLM based
+`ClassifierAgent` when the confidence is below `FAST_CLASSIFIER_THRESHOLD`.
+
+Train weights from logged turns (JSONL lines of {"text": ..., "label": ...}):
+
+    python -m back_office_agent.fast_classifier turns.jsonl weights.json
+"""
+
+import json
+import logging
+import math
+import os
+import re
+import sys
+import unicodedata
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+
+from .utils import RequestType
+
+FAST_CLASSIFIER_THRESHOLD = float(os.getenv("FAST_CLASSIFIER_THRESHOLD", "0.85"))
+FAST_CLASSIFIER_WEIGHTS_PATH = os.getenv("FAST_CLASSIFIER_WEIGHTS_PATH")
+
+# Positive weights push towards `parking`, negative towards `other`
+DEFAULT_KEYWORD_WEIGHTS: Dict[str, float] = {
+    # Japanese
+    "駐車場": 3.0,
+    "駐車": 2.5,
+    "パーキング": 3.0,
+    "月極": 2.5,
+    "車庫": 2.0,
+    "駐輪": 1.5,
+    "空き区画": 2.0,
+    "車室": 1.5,
+    "賃料": 1.0,
+    # English
+    "parking": 3.0,
+    "car park": 3.0,
+    "garage": 2.0,
+    "where to park": 3.0,
+    "park my car": 3.0,
+    # Korean
+    "주차": 3.0,
+    # Other domains served by CommonAgent
+    "ホテル": -3.0,
+    "旅館": -2.5,
+    "宿泊": -2.5,
+    "hotel": -3.0,
+    "호텔": -3.0,
+    "숙박": -2.5,
+    "天気": -2.0,
+    "weather": -2.0,
+}
+DEFAULT_BIAS = -0.5
+DEFAULT_NGRAM_RANGE = (2, 3)
+
+
+def normalize_text(text: str) -> str:
+    return (
+        re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text or "")).strip().lower()
+    )
+
+
+def char_ngrams(text: str, ngram_range: Tuple[int, int] = DEFAULT_NGRAM_RANGE):
+    low, high = ngram_range
+    grams = set()
+    for n in range(low, high + 1):
+        for i in range(len(text) - n + 1):
+            grams.add(text[i : i + n])
+    return grams
+
+
+class FastRequestClassifier:
+    """Linear keyword / char-n-gram scorer with a logistic confidence."""
+
+    def __init__(
+        self,
+        keyword_weights: Optional[Dict[str, float]] = None,
+        ngram_weights: Optional[Dict[str, float]] = None,
+        bias: float = DEFAULT_BIAS,
+        ngram_range: Tuple[int, int] = DEFAULT_NGRAM_RANGE,
+    ):
+        self.keyword_weights = {
+            normalize_text(k): v
+            for k, v in (
+                DEFAULT_KEYWORD_WEIGHTS if keyword_weights is None else keyword_weights
+            ).items()
+        }
+        self.ngram_weights = ngram_weights or {}
+        self.bias = bias
+        self.ngram_range = tuple(ngram_range)
+        # One alternation, longest keywords first, so scanning is a single pass
+        keywords = sorted(self.keyword_weights, key=len, reverse=True)
+        self._keyword_pattern = (
+            re.compile("|".join(re.escape(k) for k in keywords)) if keywords else None
+        )
+
+    def score(self, text: str) -> float:
+        normalized = normalize_text(text)
+        score = self.bias
+        if self._keyword_pattern is not None:
+            for keyword in set(self._keyword_pattern.findall(normalized)):
+                score += self.keyword_weights[keyword]
+        if self.ngram_weights:
+            for gram in char_ngrams(normalized, self.ngram_range):
+                score += self.ngram_weights.get(gram, 0.0)
+        return score
+
+    def classify(self, text: str) -> Tuple[RequestType, float]:
+        """Return the predicted request type and its confidence (0.5..1.0)."""
+        probability = 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, self.score(text)))))
+        if probability >= 0.5:
+            return RequestType.PARKING, probability
+        return RequestType.OTHER, 1.0 - probability
+
+    @classmethod
+    def fit(
+        cls,
+        samples: Iterable[Tuple[str, str]],
+        ngram_range: Tuple[int, int] = DEFAULT_NGRAM_RANGE,
+        min_count: int = 2,
+        smoothing: float = 1.0,
+    ) -> "FastRequestClassifier":
+        """Learn n-gram log-count ratios (naive Bayes) from labelled turns."""
+        counts = {RequestType.PARKING: Counter(), RequestType.OTHER: Counter()}
+        docs = Counter()
+        for text, label in samples:
+            request_type = RequestType(label)
+            docs[request_type] += 1
+            counts[request_type].update(char_ngrams(normalize_text(text), ngram_range))
+        parking, other = counts[RequestType.PARKING], counts[RequestType.OTHER]
+        parking_total = sum(parking.values()) + smoothing
+        other_total = sum(other.values()) + smoothing
+        ngram_weights = {}
+        for gram in set(parking) | set(other):
+            if parking[gram] + other[gram] < min_count:
+                continue
+            weight = math.log((parking[gram] + smoothing) / parking_total) - math.log(
+                (other[gram] + smoothing) / other_total
+            )
+            ngram_weights[gram] = round(weight, 4)
+        bias = math.log(
+            (docs[RequestType.PARKING] + smoothing)
+            / (docs[RequestType.OTHER] + smoothing)
+        )
+        return cls(ngram_weights=ngram_weights, bias=bias, ngram_range=ngram_range)
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "bias": self.bias,
+                    "ngram_range": list(self.ngram_range),
+                    "keyword_weights": self.keyword_weights,
+                    "ngram_weights": self.ngram_weights,
+                },
+                f,
+                ensure_ascii=False,
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "FastRequestClassifier":
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(
+            keyword_weights=data.get("keyword_weights"),
+            ngram_weights=data.get("ngram_weights"),
+            bias=data.get("bias", DEFAULT_BIAS),
+            ngram_range=tuple(data.get("ngram_range", DEFAULT_NGRAM_RANGE)),
+        )
+
+    @classmethod
+    def from_env(cls) -> "FastRequestClassifier":
+        if FAST_CLASSIFIER_WEIGHTS_PATH:
+            try:
+                return cls.load(FAST_CLASSIFIER_WEIGHTS_PATH)
+            except Exception as e:
+                logging.error(
+                    f"[FastRequestClassifier] Failed to load weights from {FAST_CLASSIFIER_WEIGHTS_PATH}: {e}"
+                )
+        return cls()
+
+
+def _load_samples(path: str):
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield record["text"], record["label"]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("usage: python -m back_office_agent.fast_classifier TURNS.jsonl OUT.json")
+        sys.exit(1)
+    FastRequestClassifier.fit(_load_samples(sys.argv[1])).save(sys.argv[2])
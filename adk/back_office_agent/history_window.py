@@ -0,0 +1,238 @@
+"""
+Per-agent conversation history windows.
+
+ADK sends every LlmAgent the whole session history: earlier turns, their
+tool calls and (large) tool results, AuthAgent's prompts and the replies of
+the other agents. `HistoryWindow.before_model_callback` cuts `contents` down
+to what the agent needs, per policy:
+
+- `full`: unchanged
+- `latest`: the current turn only
+- `turns:N`: the current turn and the N-1 turns before it
+- `summary:N`: like `turns:N`, preceded by a short summary of the older turns
+  (user message and final answer of each, within HISTORY_SUMMARY_TOKENS)
+- `to_polish`: only the `to_polish` state (the answer TonePolishAgent rewrites)
+
+Tool calls and results of turns before the current one are always dropped.
+Prompt tokens before and after windowing are recorded per call.
+"""
+
+import json
+import logging
+import os
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+from google.genai.types import Content, Part
+
+from .metrics import metrics
+from .tokens import count_tokens
+
+DEFAULT_CONTEXT_POLICIES = {
+    "classifier_agent": "latest",
+    "parking_agent": "summary:2",
+    "common_agent": "summary:3",
+    "tone_polish_agent": "to_polish",
+}
+# Overrides, e.g. `parking_agent=turns:3,common_agent=full`
+AGENT_CONTEXT_POLICIES = os.getenv("AGENT_CONTEXT_POLICIES", "")
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "300"))
+SUMMARY_LINE_CHARS = 200
+SUMMARY_TITLE = "Summary of the earlier conversation:"
+# Login exchanges (including the password) never go into a summary
+SUMMARY_SKIP_AUTHORS = {"auth_agent"}
+
+# How ADK renders the events of other agents (flows/llm_flows/contents.py)
+FOREIGN_PREFIX = "For context:"
+FOREIGN_SAID = re.compile(r"^\[([^\]]+)\] said: (.*)$", re.S)
+FOREIGN_TOOL_PART = re.compile(
+    r"^\[[^\]]+\] (called tool `|`[^`]+` tool returned result:)"
+)
+
+
+class ContextPolicy(NamedTuple):
+    kind: str
+    turns: int = 1
+
+    @classmethod
+    def parse(cls, spec: str) -> "ContextPolicy":
+        kind, _, turns = spec.strip().partition(":")
+        kind = kind.lower()
+        if kind not in ("full", "latest", "turns", "summary", "to_polish"):
+            raise ValueError(f"Unknown context policy '{spec}'")
+        return cls(kind, max(1, int(turns)) if turns else 1)
+
+
+def parse_policies(spec: Optional[str]) -> Dict[str, ContextPolicy]:
+    """Parse `agent=policy,agent=policy` (e.g. AGENT_CONTEXT_POLICIES)."""
+    policies = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, policy = item.split("=", 1)
+            policies[name.strip()] = ContextPolicy.parse(policy)
+    return policies
+
+
+def policy_for(agent_name: str) -> ContextPolicy:
+    overrides = parse_policies(AGENT_CONTEXT_POLICIES)
+    if agent_name in overrides:
+        return overrides[agent_name]
+    return ContextPolicy.parse(DEFAULT_CONTEXT_POLICIES.get(agent_name, "full"))
+
+
+def _is_foreign(content: Content) -> bool:
+    parts = content.parts or []
+    return bool(parts) and (parts[0].text or "") == FOREIGN_PREFIX
+
+
+def _starts_turn(content: Content) -> bool:
+    # A message the user typed (not another agent's reply or a tool result)
+    if content.role != "user" or not content.parts or _is_foreign(content):
+        return False
+    return not any(p.function_response for p in content.parts)
+
+
+def split_turns(contents: List[Content]) -> List[List[Content]]:
+    turns: List[List[Content]] = []
+    for content in contents:
+        if not turns or _starts_turn(content):
+            turns.append([])
+        turns[-1].append(content)
+    return turns
+
+
+def _without_tool_parts(content: Content) -> Optional[Content]:
+    parts = [
+        part
+        for part in content.parts or []
+        if not (part.function_call or part.function_response)
+        and not FOREIGN_TOOL_PART.match(part.text or "")
+    ]
+    if not parts or (_is_foreign(content) and len(parts) == 1):
+        return None
+    return Content(role=content.role, parts=parts)
+
+
+def _text(content: Content) -> str:
+    return "".join(part.text or "" for part in content.parts or []).strip()
+
+
+def _clip(text: str) -> str:
+    text = re.sub(r"\s+", " ", text).strip()
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[: SUMMARY_LINE_CHARS - 3] + "..."
+    return text
+
+
+def summarize_turns(turns: List[List[Content]], max_tokens: int) -> Optional[str]:
+    """User message and final answer of each turn, newest kept first."""
+    lines = []
+    for turn in turns:
+        user, answer, skip = None, None, False
+        for content in turn:
+            if _starts_turn(content) and user is None:
+                user = _text(content)
+            elif _is_foreign(content):
+                for part in content.parts[1:]:
+                    said = FOREIGN_SAID.match(part.text or "")
+                    if said:
+                        skip = skip or said.group(1) in SUMMARY_SKIP_AUTHORS
+                        answer = said.group(2)
+            elif content.role == "model" and _text(content):
+                answer = _text(content)
+        if skip:
+            continue
+        turn_lines = []
+        if user:
+            turn_lines.append(f"- user: {_clip(user)}")
+        if answer:
+            turn_lines.append(f"- assistant: {_clip(answer)}")
+        lines.append("\n".join(turn_lines))
+    kept, used = [], count_tokens(SUMMARY_TITLE)
+    for line in reversed([line for line in lines if line]):
+        tokens = count_tokens(line) + 1
+        if used + tokens > max_tokens:
+            break
+        kept.insert(0, line)
+        used += tokens
+    if not kept:
+        return None
+    return "\n".join([SUMMARY_TITLE] + kept)
+
+
+def request_tokens(llm_request) -> int:
+    """tiktoken estimate of the prompt: system instruction plus contents."""
+    texts = [str(llm_request.config.system_instruction or "")]
+    for content in llm_request.contents or []:
+        for part in content.parts or []:
+            if part.text:
+                texts.append(part.text)
+            elif part.function_call:
+                texts.append(json.dumps(part.function_call.args, ensure_ascii=False))
+            elif part.function_response:
+                texts.append(
+                    json.dumps(
+                        part.function_response.response,
+                        ensure_ascii=False,
+                        default=str,
+                    )
+                )
+    return count_tokens("\n".join(texts))
+
+
+class HistoryWindow:
+    """`before_model_callback` applying one agent's context policy."""
+
+    def __init__(
+        self,
+        policy: ContextPolicy,
+        summary_tokens: int = HISTORY_SUMMARY_TOKENS,
+    ):
+        self.policy = policy
+        self.summary_tokens = summary_tokens
+
+    @classmethod
+    def for_agent(cls, agent_name: str) -> "HistoryWindow":
+        return cls(policy_for(agent_name))
+
+    def window(self, contents: List[Content], state=None) -> List[Content]:
+        kind = self.policy.kind
+        if kind == "full" or not contents:
+            return contents
+        if kind == "to_polish":
+            to_polish = state.get("to_polish") if state is not None else None
+            if to_polish:
+                return [Content(role="user", parts=[Part(text=to_polish)])]
+            kind = "latest"
+        turns = split_turns(contents)
+        keep = 1 if kind == "latest" else self.policy.turns
+        older, recent = turns[:-keep], turns[-keep:]
+        windowed = []
+        if kind == "summary" and older:
+            summary = summarize_turns(older, self.summary_tokens)
+            if summary:
+                windowed.append(Content(role="user", parts=[Part(text=summary)]))
+        for turn in recent[:-1]:
+            windowed += filter(None, (_without_tool_parts(c) for c in turn))
+        return windowed + recent[-1]
+
+    async def before_model_callback(self, callback_context, llm_request):
+        agent_name = callback_context.agent_name
+        before = request_tokens(llm_request)
+        contents = llm_request.contents
+        try:
+            llm_request.contents = self.window(contents, callback_context.state)
+        except Exception as e:
+            logging.warning(f"[HistoryWindow] Sending {agent_name} full history: {e}")
+            return None
+        after = request_tokens(llm_request)
+        if after >= before:
+            # Short histories: the summary can be longer than what it replaces
+            llm_request.contents, after = contents, before
+        labels = {"agent": agent_name, "policy": self.policy.kind}
+        metrics.observe("prompt_window_tokens", before, stage="full", **labels)
+        metrics.observe("prompt_window_tokens", after, stage="windowed", **labels)
+        logging.info(
+            f"[HistoryWindow] {agent_name} ({self.policy.kind}): {before} -> {after} prompt tokens"
+        )
+        return None
@@ -0,0 +1,250 @@
+"""
+Local replica of `dummy.hotels` for the hotel Toolbox tools.
+
+With HOTEL_REPLICA=true, the rows of `search-all-hotels-dummy` (the whole
+table, as Toolbox returns it from BigQuery) are snapshotted into an in-memory
+SQLite database with an FTS5 trigram index on lower-cased `name` and
+`location`. `search-all-hotels-dummy`, `search-hotels-by-name` and
+`search-hotels-by-location` are then answered locally with the same
+`LOWER(col) LIKE '%x%'` semantics as MCP/tools.yaml, in well under a
+millisecond, instead of a BigQuery job per call. The trigram index matches
+nothing for patterns without 3 consecutive characters (e.g. `東京`), so those
+scan the lower-cased columns of `hotels` instead.
+
+The snapshot is refreshed in the background every
+HOTEL_REPLICA_REFRESH_SECONDS and persisted to HOTEL_REPLICA_PATH, so a
+restart serves the last snapshot right away. A snapshot older than
+HOTEL_REPLICA_MAX_STALENESS_SECONDS, or none at all, is not used: the tools
+go to Toolbox / BigQuery as before.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .metrics import metrics
+
+HOTEL_REPLICA = os.getenv("HOTEL_REPLICA", "false").lower() == "true"
+HOTEL_REPLICA_PATH = os.getenv(
+    "HOTEL_REPLICA_PATH",
+    os.path.join(tempfile.gettempdir(), "back_office_agent_hotels.db"),
+)
+HOTEL_REPLICA_REFRESH_SECONDS = float(os.getenv("HOTEL_REPLICA_REFRESH_SECONDS", "300"))
+HOTEL_REPLICA_MAX_STALENESS_SECONDS = float(
+    os.getenv("HOTEL_REPLICA_MAX_STALENESS_SECONDS", "3600")
+)
+# Tool whose result is the whole table, and the column each lookup tool filters
+SNAPSHOT_TOOL = "search-all-hotels-dummy"
+REPLICA_TOOLS = {
+    "search-all-hotels-dummy": None,
+    "search-hotels-by-name": "name",
+    "search-hotels-by-location": "location",
+}
+
+# Stored as the database's user_version; files of another format are ignored
+SNAPSHOT_FORMAT = 2
+_SCHEMA = f"""
+PRAGMA user_version = {SNAPSHOT_FORMAT};
+CREATE TABLE meta (snapshot_at REAL NOT NULL, rows INTEGER NOT NULL);
+CREATE TABLE hotels (
+    id INTEGER PRIMARY KEY, data TEXT NOT NULL, name TEXT, location TEXT
+);
+CREATE VIRTUAL TABLE hotels_fts USING fts5(name, location, tokenize='trigram');
+"""
+# Shortest run of non-wildcard characters the trigram index can match
+TRIGRAM_MIN_CHARS = 3
+
+
+def _lower(value: Any) -> Optional[str]:
+    # NULL (and non-string) columns stay NULL, so LIKE never matches them,
+    # like LOWER(col) LIKE ... in BigQuery
+    return value.lower() if isinstance(value, str) else None
+
+
+def _uses_trigrams(pattern: str) -> bool:
+    return max(len(run) for run in re.split(r"[%_]", pattern)) >= TRIGRAM_MIN_CHARS
+
+
+def build_snapshot(
+    rows: List[Dict[str, Any]], snapshot_at: float
+) -> sqlite3.Connection:
+    """In-memory database of `rows` (in table order) with the trigram index."""
+    db = sqlite3.connect(":memory:", check_same_thread=False)
+    db.executescript(_SCHEMA)
+    with db:
+        db.executemany(
+            "INSERT INTO hotels (id, data, name, location) VALUES (?, ?, ?, ?)",
+            (
+                (
+                    i,
+                    json.dumps(row, ensure_ascii=False, separators=(",", ":")),
+                    _lower(row.get("name")),
+                    _lower(row.get("location")),
+                )
+                for i, row in enumerate(rows)
+            ),
+        )
+        db.execute(
+            "INSERT INTO hotels_fts (rowid, name, location) "
+            "SELECT id, name, location FROM hotels"
+        )
+        db.execute("INSERT INTO meta VALUES (?, ?)", (snapshot_at, len(rows)))
+    return db
+
+
+class HotelReplica:
+    """Snapshot of the hotels table serving the Toolbox hotel tools locally."""
+
+    def __init__(
+        self,
+        path: Optional[str] = HOTEL_REPLICA_PATH,
+        refresh_seconds: float = HOTEL_REPLICA_REFRESH_SECONDS,
+        max_staleness: float = HOTEL_REPLICA_MAX_STALENESS_SECONDS,
+    ):
+        self.path = path
+        self.refresh_seconds = refresh_seconds
+        self.max_staleness = max_staleness
+        self._db: Optional[sqlite3.Connection] = None
+        self.snapshot_at = 0.0
+        self.rows = 0
+        self._last_attempt = 0.0
+        self._task: Optional[asyncio.Task] = None
+        self._load_from_disk()
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.snapshot_at
+
+    def fresh(self) -> bool:
+        return self._db is not None and self.age <= self.max_staleness
+
+    def lookup(self, tool_name: str, args: Optional[Dict[str, Any]]) -> Optional[str]:
+        """The tool's result (a JSON array, like Toolbox), or None to ask Toolbox."""
+        if tool_name not in REPLICA_TOOLS:
+            return None
+        if not self.fresh():
+            outcome = "stale" if self._db is not None else "missing"
+            metrics.increment(
+                "hotel_replica_requests_total", tool=tool_name, outcome=outcome
+            )
+            return None
+        column = REPLICA_TOOLS[tool_name]
+        started = time.perf_counter()
+        if column is None:
+            cursor = self._db.execute("SELECT data FROM hotels ORDER BY id")
+        else:
+            value = (args or {}).get(column)
+            if not isinstance(value, str):
+                # Let Toolbox report the missing / invalid parameter
+                return None
+            pattern = value.lower()
+            if _uses_trigrams(pattern):
+                cursor = self._db.execute(
+                    "SELECT h.data FROM hotels_fts f JOIN hotels h ON h.id = f.rowid "
+                    f"WHERE f.{column} LIKE ? ORDER BY h.id",
+                    (f"%{pattern}%",),
+                )
+            else:
+                cursor = self._db.execute(
+                    f"SELECT data FROM hotels WHERE {column} LIKE ? ORDER BY id",
+                    (f"%{pattern}%",),
+                )
+        result = "[" + ",".join(data for (data,) in cursor) + "]"
+        metrics.observe(
+            "hotel_replica_lookup_ms",
+            (time.perf_counter() - started) * 1000,
+            tool=tool_name,
+        )
+        metrics.increment("hotel_replica_requests_total", tool=tool_name, outcome="hit")
+        return result
+
+    async def refresh(self, fetch_all: Callable[[], Awaitable[Any]]) -> int:
+        """Snapshot the table from `fetch_all()` (the SNAPSHOT_TOOL result)."""
+        result = await fetch_all()
+        rows = json.loads(result) if isinstance(result, str) else result
+        if rows is None:
+            rows = []
+        if not isinstance(rows, list):
+            raise ValueError(f"{SNAPSHOT_TOOL} returned {type(rows).__name__}")
+        snapshot_at = time.time()
+        db = await asyncio.to_thread(build_snapshot, rows, snapshot_at)
+        # Written before it is served, so the file is never read concurrently
+        await asyncio.to_thread(self._save_to_disk, db)
+        old, self._db = self._db, db
+        self.snapshot_at, self.rows = snapshot_at, len(rows)
+        if old is not None:
+            old.close()
+        metrics.set_gauge("hotel_replica_rows", len(rows))
+        metrics.set_gauge("hotel_replica_snapshot_at", snapshot_at)
+        logging.info(f"[HotelReplica] Snapshot of {len(rows)} hotels")
+        return len(rows)
+
+    def maybe_refresh(self, fetch_all: Callable[[], Awaitable[Any]]):
+        """Start a background refresh when the interval has elapsed (non-blocking)."""
+        if self._task and not self._task.done():
+            return
+        now = time.monotonic()
+        due = self._db is None or self.age >= self.refresh_seconds
+        if not due or now - self._last_attempt < min(self.refresh_seconds, 30):
+            return
+        self._last_attempt = now
+        self._task = asyncio.create_task(self._refresh_logged(fetch_all))
+
+    async def _refresh_logged(self, fetch_all):
+        try:
+            await self.refresh(fetch_all)
+            metrics.increment("hotel_replica_refresh_total", outcome="ok")
+        except Exception as e:
+            metrics.increment("hotel_replica_refresh_total", outcome="error")
+            logging.warning(f"[HotelReplica] Snapshot refresh failed: {e}")
+
+    def _load_from_disk(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            source = sqlite3.connect(self.path)
+            db = sqlite3.connect(":memory:", check_same_thread=False)
+            source.backup(db)
+            source.close()
+            (version,) = db.execute("PRAGMA user_version").fetchone()
+            if version != SNAPSHOT_FORMAT:
+                db.close()
+                logging.info(
+                    f"[HotelReplica] Ignoring snapshot file of format {version}"
+                )
+                return
+            self.snapshot_at, self.rows = db.execute(
+                "SELECT snapshot_at, rows FROM meta"
+            ).fetchone()
+            self._db = db
+            logging.info(
+                f"[HotelReplica] Loaded snapshot of {self.rows} hotels ({self.age:.0f}s old)"
+            )
+        except (sqlite3.Error, TypeError) as e:
+            logging.warning(f"[HotelReplica] Ignoring broken snapshot file: {e}")
+
+    def _save_to_disk(self, db: sqlite3.Connection):
+        if not self.path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            target = sqlite3.connect(tmp_path)
+            db.backup(target)
+            target.close()
+            os.replace(tmp_path, self.path)
+        except (OSError, sqlite3.Error) as e:
+            logging.warning(f"[HotelReplica] Could not write snapshot file: {e}")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
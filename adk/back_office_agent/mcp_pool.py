@@ -0,0 +1,256 @@
+"""
+Pool of pre-warmed MCP client sessions.
+
+Each pooled session (for stdio: one MCP server child process) is opened and
+`initialize()`d by its own owner task, which also closes it again: the MCP
+transports are anyio task groups that must be exited by the task that entered
+them. Tool calls check a session out exclusively, so concurrent calls are
+spread over up to `max_size` processes instead of sharing one stdio pipe.
+
+Sessions idle for longer than the health check interval are pinged before
+reuse. Dead children, failed pings and timed out (hung) calls recycle the
+session; the pool is then topped up to `min_size` in the background.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, List, Optional
+
+import httpx
+from mcp.client.session import ClientSession
+from mcp.shared.exceptions import McpError
+
+from .metrics import metrics
+
+MCP_POOL_MIN_SIZE = int(os.getenv("MCP_POOL_MIN_SIZE", "1"))
+MCP_POOL_MAX_SIZE = int(os.getenv("MCP_POOL_MAX_SIZE", "4"))
+# Idle sessions are pinged before reuse after this many seconds
+MCP_POOL_HEALTH_CHECK_SECONDS = float(os.getenv("MCP_POOL_HEALTH_CHECK_SECONDS", "30"))
+MCP_POOL_PING_TIMEOUT_SECONDS = 5.0
+
+SessionOpener = Callable[[AsyncExitStack], Awaitable[ClientSession]]
+
+
+class PooledSession:
+    def __init__(self):
+        self.session: Optional[ClientSession] = None
+        self.busy = False
+        self.dead = False
+        self.last_used = time.monotonic()
+        self.stop = asyncio.Event()
+        self.owner: Optional[asyncio.Task] = None
+
+    @property
+    def alive(self) -> bool:
+        return not self.dead and self.owner is not None and not self.owner.done()
+
+
+def _is_session_failure(error: BaseException) -> bool:
+    # Protocol errors (bad arguments, unknown tool) leave the session usable
+    if isinstance(error, McpError):
+        return error.error.code == httpx.codes.REQUEST_TIMEOUT
+    return isinstance(error, Exception)
+
+
+class McpSessionPool:
+    """Bounded pool of MCP sessions opened by `open_session`."""
+
+    def __init__(
+        self,
+        open_session: SessionOpener,
+        min_size: int = MCP_POOL_MIN_SIZE,
+        max_size: int = MCP_POOL_MAX_SIZE,
+        health_check_seconds: float = MCP_POOL_HEALTH_CHECK_SECONDS,
+        name: str = "mcp",
+        on_recycle: Optional[Callable[[str], None]] = None,
+    ):
+        self._open_session = open_session
+        # Called with the reason whenever a session is recycled
+        self._on_recycle = on_recycle
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.health_check_seconds = health_check_seconds
+        self.name = name
+        self._sessions: List[PooledSession] = []
+        self._spawning = 0
+        self._changed: Optional[asyncio.Condition] = None
+        self._closed = False
+        self._refill: Optional[asyncio.Task] = None
+
+    @property
+    def size(self) -> int:
+        return len(self._sessions) + self._spawning
+
+    def _condition(self) -> asyncio.Condition:
+        # Created lazily so the pool can be built outside an event loop
+        if self._changed is None:
+            self._changed = asyncio.Condition()
+        return self._changed
+
+    def start_soon(self) -> None:
+        """Top the pool up to `min_size` in the background."""
+        if self._closed or (self._refill and not self._refill.done()):
+            return
+        self._refill = asyncio.create_task(self.start())
+
+    async def start(self) -> None:
+        """Pre-spawn sessions up to `min_size` (concurrently)."""
+        missing = self.min_size - self.size
+        if missing <= 0:
+            return
+        results = await asyncio.gather(
+            *(self._spawn() for _ in range(missing)), return_exceptions=True
+        )
+        failures = [r for r in results if isinstance(r, BaseException)]
+        if failures:
+            logging.warning(
+                f"[McpSessionPool] {len(failures)}/{missing} {self.name} sessions failed to start: {failures[0]}"
+            )
+        else:
+            logging.info(f"[McpSessionPool] Pre-spawned {missing} {self.name} sessions")
+
+    async def _spawn(self) -> PooledSession:
+        pooled = PooledSession()
+        ready = asyncio.get_running_loop().create_future()
+        self._spawning += 1
+        started = time.perf_counter()
+        try:
+            pooled.owner = asyncio.create_task(self._own(pooled, ready))
+            await ready
+        except BaseException:
+            metrics.increment("mcp_pool_spawn_total", pool=self.name, outcome="error")
+            raise
+        finally:
+            self._spawning -= 1
+        if self._closed:
+            # Spawned while the pool was closing (e.g. a refill after a recycle)
+            pooled.stop.set()
+            await asyncio.gather(pooled.owner, return_exceptions=True)
+            raise RuntimeError(f"MCP session pool '{self.name}' is closed")
+        metrics.observe(
+            "mcp_pool_spawn_latency_ms",
+            (time.perf_counter() - started) * 1000,
+            pool=self.name,
+        )
+        metrics.increment("mcp_pool_spawn_total", pool=self.name, outcome="ok")
+        self._sessions.append(pooled)
+        # Wakes callers that found the pool full while this refill was starting
+        await self._notify()
+        return pooled
+
+    async def _own(self, pooled: PooledSession, ready: asyncio.Future) -> None:
+        try:
+            async with AsyncExitStack() as exit_stack:
+                pooled.session = await self._open_session(exit_stack)
+                ready.set_result(pooled)
+                await pooled.stop.wait()
+        except asyncio.CancelledError:
+            if not ready.done():
+                ready.cancel()
+            raise
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                logging.warning(f"[McpSessionPool] {self.name} session died: {e}")
+        finally:
+            pooled.dead = True
+            await self._notify()
+
+    async def _notify(self):
+        async with self._condition():
+            self._condition().notify_all()
+
+    async def _healthy(self, pooled: PooledSession) -> bool:
+        if not pooled.alive:
+            return False
+        if time.monotonic() - pooled.last_used < self.health_check_seconds:
+            return True
+        try:
+            await asyncio.wait_for(
+                pooled.session.send_ping(), MCP_POOL_PING_TIMEOUT_SECONDS
+            )
+            return True
+        except Exception as e:
+            logging.warning(f"[McpSessionPool] {self.name} ping failed: {e}")
+            return False
+
+    async def _checkout(self) -> PooledSession:
+        condition = self._condition()
+        while True:
+            if self._closed:
+                raise RuntimeError(f"MCP session pool '{self.name}' is closed")
+            for pooled in list(self._sessions):
+                if not pooled.alive:
+                    self._discard(pooled, reason="dead")
+            idle = [p for p in self._sessions if not p.busy]
+            if idle:
+                # Most recently used first: its process is warm and known good
+                pooled = max(idle, key=lambda p: p.last_used)
+                pooled.busy = True
+                if await self._healthy(pooled):
+                    return pooled
+                pooled.busy = False
+                self._discard(pooled, reason="unhealthy")
+                continue
+            if self.size < self.max_size:
+                pooled = await self._spawn()
+                if not pooled.busy:
+                    pooled.busy = True
+                    return pooled
+                continue
+            async with condition:
+                # Re-checked under the lock so a release cannot slip in unseen
+                if self.size >= self.max_size and all(p.busy for p in self._sessions):
+                    await condition.wait()
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[ClientSession]:
+        """Check a session out exclusively for one or more calls."""
+        started = time.perf_counter()
+        if self.size < self.min_size:
+            # Not pre-spawned at startup (no event loop yet): warm up now
+            self.start_soon()
+        pooled = await self._checkout()
+        metrics.observe(
+            "mcp_pool_wait_ms", (time.perf_counter() - started) * 1000, pool=self.name
+        )
+        try:
+            yield pooled.session
+        except BaseException as e:
+            if _is_session_failure(e):
+                self._discard(pooled, reason="failed")
+            raise
+        finally:
+            pooled.busy = False
+            pooled.last_used = time.monotonic()
+            await self._notify()
+
+    def _discard(self, pooled: PooledSession, reason: str) -> None:
+        if pooled not in self._sessions:
+            return
+        self._sessions.remove(pooled)
+        pooled.dead = True
+        pooled.stop.set()
+        metrics.increment("mcp_pool_recycled_total", pool=self.name, reason=reason)
+        logging.info(f"[McpSessionPool] Recycled {self.name} session ({reason})")
+        if self._on_recycle is not None:
+            self._on_recycle(reason)
+        if self.size < self.min_size:
+            self.start_soon()
+
+    async def close(self) -> None:
+        self._closed = True
+        sessions, self._sessions = self._sessions, []
+        for pooled in sessions:
+            pooled.stop.set()
+        owners = [p.owner for p in sessions if p.owner is not None]
+        if self._refill is not None and not self._refill.done():
+            owners.append(self._refill)
+        if owners:
+            await asyncio.gather(*owners, return_exceptions=True)
+        if self._changed is not None:
+            await self._notify()
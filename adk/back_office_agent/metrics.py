@@ -0,0 +1,121 @@
+"""
+In-process metrics for the back office workflow.
+
+A deliberately small registry of labelled counters, gauges and sample
+histograms so the agents can report which code paths were taken (fast-path vs LLM, cache hits,
+speculative wins, ...) without requiring an external metrics backend.
+"""
+
+import math
+import threading
+import time
+from collections import defaultdict, deque
+from typing import Deque, Dict, Tuple
+
+# Upper bound of samples kept per histogram series
+MAX_HISTOGRAM_SAMPLES = 2048
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def percentile(samples, q: float) -> float:
+    """Nearest-rank percentile of `samples` (q in 0..100)."""
+    values = sorted(samples)
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, math.ceil(q / 100 * len(values)) - 1))
+    return float(values[rank])
+
+
+class MetricsRegistry:
+    """Thread-safe registry of counters and bounded histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = defaultdict(
+            lambda: defaultdict(float)
+        )
+        self._histograms: Dict[str, Dict[LabelKey, Deque[float]]] = defaultdict(
+            lambda: defaultdict(lambda: deque(maxlen=MAX_HISTOGRAM_SAMPLES))
+        )
+        self._gauges: Dict[str, Dict[LabelKey, float]] = defaultdict(dict)
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        with self._lock:
+            self._counters[name][_label_key(labels)] += value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._gauges[name][_label_key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self._histograms[name][_label_key(labels)].append(value)
+
+    def counter(self, name: str, **labels) -> float:
+        with self._lock:
+            return self._counters.get(name, {}).get(_label_key(labels), 0)
+
+    def snapshot(self) -> dict:
+        """Return a JSON-serialisable view of every series."""
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(k), "value": v} for k, v in series.items()]
+                for name, series in self._counters.items()
+            }
+            histograms = {
+                name: [
+                    {
+                        "labels": dict(k),
+                        "count": len(samples),
+                        "p50": percentile(samples, 50),
+                        "p95": percentile(samples, 95),
+                        "p99": percentile(samples, 99),
+                    }
+                    for k, samples in series.items()
+                ]
+                for name, series in self._histograms.items()
+            }
+            gauges = {
+                name: [{"labels": dict(k), "value": v} for k, v in series.items()]
+                for name, series in self._gauges.items()
+            }
+        return {"counters": counters, "gauges": gauges, "histograms": histograms}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._histograms.clear()
+
+
+metrics = MetricsRegistry()
+
+
+class TurnStats:
+    """Latency and token totals of one root workflow turn."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.tokens = 0
+        self.prompt_tokens: Dict[str, int] = defaultdict(int)
+        self.labels: Dict[str, object] = {}
+
+    def add_tokens(self, tokens: int) -> None:
+        self.tokens += tokens
+
+    def add_prompt_tokens(self, agent: str, tokens: int) -> None:
+        if tokens:
+            self.prompt_tokens[agent] += tokens
+
+    def record(self) -> float:
+        elapsed_ms = (time.perf_counter() - self.started) * 1000
+        metrics.observe("turn_latency_ms", elapsed_ms, **self.labels)
+        metrics.observe("turn_tokens", self.tokens, **self.labels)
+        for agent, tokens in self.prompt_tokens.items():
+            metrics.observe("turn_prompt_tokens", tokens, agent=agent, **self.labels)
+        return elapsed_ms
@@ -1,27 +1,19 @@
 import logging
 from google.adk.agents.llm_agent import LlmAgent
-from google.adk.models.lite_llm import LiteLlm
-from .utils import (
-    get_default_parking_fields,
-    get_nested_fields,
-    # ensure_required_params_callback,
-)
+from .custom_adk_patches import CustomLiteLlm
+from .tone_style import ANSWER_STYLE_GUIDELINES, INLINE_TONE_POLISH
+from .query_compiler import SEARCH_TOOL_NAME, ParkingQueryCompiler
+from .history_window import HistoryWindow
+from .query_validator import QueryBodyValidator
+from .result_compactor import ToolResultCompactor
+from .schema import get_schema
+from .station_index import STATION_INDEX, get_station_index
 
-DEFAULT_PARKING_FIELDS = get_default_parking_fields()
-NESTED_FIELDS = get_nested_fields()
 
-
-class ParkingAgent(LlmAgent):
-    def __init__(self, ctx, tools):
-        logging.info("[ParkingAgent] Initializing ParkingAgent")
-
-        fields_str = ", ".join(DEFAULT_PARKING_FIELDS)
-        nested_fields_str = ", ".join(NESTED_FIELDS)
-
-        super().__init__(
-            name="parking_agent",
-            model=LiteLlm(model="openai/gpt-4o-mini"),
-            instruction=f"""
+def build_parking_instruction(schema, inline_tone=INLINE_TONE_POLISH):
+    fields_str = ", ".join(schema.default_fields)
+    nested_fields_str = ", ".join(schema.nested_paths)
+    return f"""
 You are a helpful AI agent specialized in parking lot search. For every user request, you MUST use the Elasticsearch MCP server's search tool to retrieve real data. 
 
 Guidelines:
@@ -51,10 +43,51 @@ Example nested query:
     }}
   }}
 }}
-""",
+""" + (ANSWER_STYLE_GUIDELINES if inline_tone else "")
+
+
+class ParkingAgent(LlmAgent):
+    def __init__(self, ctx, tools, inline_tone=INLINE_TONE_POLISH):
+        logging.info("[ParkingAgent] Initializing ParkingAgent")
+
+        schema = get_schema()
+        query_compiler = ParkingQueryCompiler(schema=schema)
+        query_validator = QueryBodyValidator(schema=schema)
+        result_compactor = ToolResultCompactor.for_agent(
+            "parking_agent",
+            fields={SEARCH_TOOL_NAME: query_validator.source_fields_of},
+        )
+        built = {}
+
+        def instruction(readonly_context):
+            # Rebuilt only after a live mapping refresh changed the schema
+            if schema.digest not in built:
+                built.clear()
+                built[schema.digest] = build_parking_instruction(schema, inline_tone)
+            return built[schema.digest]
+
+        super().__init__(
+            name="parking_agent",
+            model=CustomLiteLlm(model="openai/gpt-4o-mini"),
+            instruction=instruction,
             output_key="response_text",
             tools=tools,
-            # before_tool_callback=ensure_required_params_callback,
+            # Common station / area / rent requests skip the query planning call
+            before_model_callback=[
+                query_compiler.before_model_callback,
+                HistoryWindow.for_agent("parking_agent").before_model_callback,
+            ],
+            # Validated station / radius searches are answered from memory
+            before_tool_callback=(
+                [
+                    query_validator.before_tool_callback,
+                    get_station_index().before_tool_callback,
+                ]
+                if STATION_INDEX
+                else query_validator.before_tool_callback
+            ),
+            # Hits reach the model as a table of the requested fields
+            after_tool_callback=result_compactor.after_tool_callback,
         )
 
     async def run_async(self, ctx):
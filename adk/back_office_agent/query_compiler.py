@@ -0,0 +1,255 @@
+"""
+Deterministic query compiler for common parking requests.
+
+Extracts slots (station, city, ward, prefecture, maximum rent) from the user
+message and compiles them into an Elasticsearch `queryBody` using the field
+types in data_type.json: `match_phrase` for text, `term` for keyword/boolean,
+`range` for numbers and dates, wrapped in `nested` queries for nested paths.
+A ward of a designated city (`大阪市北区`) is split into the city (`大阪市`)
+and the ward, which is matched in the address.
+
+Only Japanese requests are compiled: station and area names are stored in
+Japanese, so a message in another language (`parking near Shibuya station`)
+goes to the LLM, which translates them.
+
+When the message is fully explained by the extracted slots, ParkingAgent's
+`before_model_callback` answers the first model step with a ready-made
+`search` function call, skipping the LLM query planning round trip. Anything
+else falls back to the LLM.
+"""
+
+import logging
+import os
+import re
+import unicodedata
+from typing import Dict, List, NamedTuple, Optional
+
+from google.adk.models.llm_response import LlmResponse
+from google.genai.types import Content, FunctionCall, Part
+
+from .metrics import metrics
+from .schema import SchemaRegistry, get_schema
+
+PARKING_QUERY_COMPILER = os.getenv("PARKING_QUERY_COMPILER", "true").lower() == "true"
+PARKING_QUERY_SIZE = int(os.getenv("PARKING_QUERY_SIZE", "10"))
+# Share of the message that must be explained by slots and filler words
+COMPILER_MIN_CONFIDENCE = float(os.getenv("COMPILER_MIN_CONFIDENCE", "0.8"))
+
+PARKING_INDEX = "parking"
+SEARCH_TOOL_NAME = "search"
+
+STATION_FIELD = "nearbyStations.name"
+CITY_FIELD = "city.name"
+WARD_FIELD = "address"
+PREFECTURE_FIELD = "prefecture.name"
+RENT_FIELD = "spaces.rent"
+# Always returned so the answer can name the parking lot
+SOURCE_EXTRA_FIELDS = ["id", "name"]
+
+_KANJI = "一-龥々ヶ"
+PREFECTURE_PATTERN = re.compile(rf"(東京都|北海道|大阪府|京都府|[{_KANJI}]{{2,3}}県)")
+CITY_PATTERN = re.compile(
+    rf"(?P<city>[{_KANJI}]{{1,4}}市)?(?P<area>[{_KANJI}]{{1,5}}(?:市|区|町|村))(?![画域間分内駅])"
+)
+STATION_PATTERN = re.compile(rf"([{_KANJI}ァ-ヶーA-Za-z0-9]{{1,12}}?)駅")
+RENT_PATTERN = re.compile(
+    r"(?P<amount>\d+(?:[.,]\d+)*)\s*(?P<man>万)?\s*円?\s*(?P<op>以下|以内|未満|まで)"
+)
+EXCLUSIVE_OPS = {"未満"}
+
+# Words that carry no search condition of their own
+JA_FILLER_WORDS = """
+駐車場 パーキング 月極 の 近く 周辺 付近 近辺 最寄り にある で を は が に と
+探して 探す 探し 検索 して ください 下さい 教えて ありますか あります ある か
+賃料 月額 家賃 料金 円 から 徒歩 すぐ 一覧 見せて お願いします お願い たい です ます 駅
+""".split()
+_FILLER_PATTERN = re.compile(
+    "|".join(re.escape(w) for w in sorted(JA_FILLER_WORDS, key=len, reverse=True))
+)
+_NOISE_PATTERN = re.compile(r"[\s\W_]+")
+
+
+class CompiledQuery(NamedTuple):
+    query_body: dict
+    slots: Dict[str, object]
+    confidence: float
+
+
+def wrap_nested(clause: dict, path: str, nested_paths: List[str]) -> dict:
+    """Wrap `clause` on `path` in one nested query per nested ancestor."""
+    for nested in sorted(nested_paths, key=len, reverse=True):
+        if path.startswith(nested + "."):
+            clause = {"nested": {"path": nested, "query": clause}}
+    return clause
+
+
+def field_clause(
+    path: str,
+    value,
+    field_types: Dict[str, str],
+    nested_paths: List[str],
+    op: Optional[str] = None,
+) -> dict:
+    """Query clause for `path` matching its mapping type."""
+    field_type = field_types.get(path)
+    if op is not None or field_type == "date":
+        clause = {"range": {path: {op or "gte": value}}}
+    elif field_type == "text":
+        clause = {"match_phrase": {path: value}}
+    else:
+        # keyword, boolean, long, float, ...
+        clause = {"term": {path: value}}
+    return wrap_nested(clause, path, nested_paths)
+
+
+def _mask(text: str, match) -> str:
+    return (
+        text[: match.start()]
+        + " " * (match.end() - match.start())
+        + text[match.end() :]
+    )
+
+
+def _parse_amount(amount: str, man: Optional[str]) -> int:
+    value = float(amount.replace(",", ""))
+    return int(value * 10000) if man else int(value)
+
+
+class ParkingQueryCompiler:
+    """Compiles station / area / rent requests into a parking `queryBody`."""
+
+    def __init__(
+        self,
+        schema: Optional[SchemaRegistry] = None,
+        source_fields: Optional[List[str]] = None,
+        size: int = PARKING_QUERY_SIZE,
+        min_confidence: float = COMPILER_MIN_CONFIDENCE,
+    ):
+        # Read through the registry on every call so live mapping refreshes apply
+        self.schema = schema if schema is not None else get_schema()
+        self._source_fields = source_fields
+        self.size = size
+        self.min_confidence = min_confidence
+
+    @property
+    def source_fields(self) -> List[str]:
+        source_fields = self._source_fields or self.schema.default_fields
+        return SOURCE_EXTRA_FIELDS + [
+            f for f in source_fields if f not in SOURCE_EXTRA_FIELDS
+        ]
+
+    def extract_slots(self, text: str):
+        """Return (slots, text with the slot spans masked out)."""
+        slots = {}
+        rest = unicodedata.normalize("NFKC", text or "")
+        match = RENT_PATTERN.search(rest)
+        if match:
+            op = "lt" if match.group("op") in EXCLUSIVE_OPS else "lte"
+            slots["max_rent"] = (
+                _parse_amount(match.group("amount"), match.group("man")),
+                op,
+            )
+            rest = _mask(rest, match)
+        match = PREFECTURE_PATTERN.search(rest)
+        if match:
+            slots["prefecture"] = match.group(1)
+            rest = _mask(rest, match)
+        match = CITY_PATTERN.search(rest)
+        if match:
+            if match.group("city"):
+                # 大阪市北区: city.name is 大阪市, the ward only appears in addresses
+                slots["city"] = match.group("city")
+                slots["ward"] = match.group("area")
+            else:
+                slots["city"] = match.group("area")
+            rest = _mask(rest, match)
+        match = STATION_PATTERN.search(rest)
+        if match:
+            slots["station"] = match.group(1)
+            rest = _mask(rest, match)
+        return slots, rest
+
+    def compile(self, text: str) -> Optional[CompiledQuery]:
+        slots, rest = self.extract_slots(text)
+        if not slots:
+            return None
+        meaningful = len(_NOISE_PATTERN.sub("", unicodedata.normalize("NFKC", text)))
+        unexplained = len(_NOISE_PATTERN.sub("", _FILLER_PATTERN.sub(" ", rest)))
+        confidence = 1.0 - unexplained / max(meaningful, 1)
+        if confidence < self.min_confidence:
+            logging.info(
+                f"[ParkingQueryCompiler] Low confidence {confidence:.2f} for slots {slots}"
+            )
+            return None
+
+        clauses = []
+        if "station" in slots:
+            clauses.append(self._clause(STATION_FIELD, slots["station"]))
+        if "city" in slots:
+            clauses.append(self._clause(CITY_FIELD, slots["city"]))
+        if "ward" in slots:
+            clauses.append(self._clause(WARD_FIELD, slots["ward"]))
+        if "prefecture" in slots:
+            clauses.append(self._clause(PREFECTURE_FIELD, slots["prefecture"]))
+        if "max_rent" in slots:
+            amount, op = slots["max_rent"]
+            clauses.append(self._clause(RENT_FIELD, amount, op=op))
+        query_body = {
+            "query": clauses[0] if len(clauses) == 1 else {"bool": {"must": clauses}},
+            "_source": self.source_fields,
+            "size": self.size,
+        }
+        return CompiledQuery(query_body, slots, confidence)
+
+    def _clause(self, path, value, op=None):
+        return field_clause(
+            path, value, self.schema.field_types, self.schema.nested_paths, op=op
+        )
+
+    async def before_model_callback(self, callback_context, llm_request):
+        """Answer the query planning step with a compiled `search` call."""
+        if not PARKING_QUERY_COMPILER or SEARCH_TOOL_NAME not in llm_request.tools_dict:
+            return None
+        user_content = callback_context.user_content
+        user_text = "".join(
+            p.text or "" for p in (user_content.parts if user_content else None) or []
+        )
+        if not user_text or not _is_first_step(llm_request, user_text):
+            return None
+        compiled = self.compile(user_text)
+        if compiled is None:
+            metrics.increment("parking_query_path_total", path="llm")
+            return None
+        metrics.increment("parking_query_path_total", path="compiled")
+        logging.info(
+            f"[ParkingQueryCompiler] Compiled slots {compiled.slots} (confidence={compiled.confidence:.2f})"
+        )
+        return LlmResponse(
+            content=Content(
+                role="model",
+                parts=[
+                    Part(
+                        function_call=FunctionCall(
+                            name=SEARCH_TOOL_NAME,
+                            args={
+                                "index": PARKING_INDEX,
+                                "queryBody": compiled.query_body,
+                            },
+                        )
+                    )
+                ],
+            )
+        )
+
+
+def _is_first_step(llm_request, user_text: str) -> bool:
+    # No tool call has happened since the current user message
+    for content in reversed(llm_request.contents):
+        for part in content.parts or []:
+            if part.function_call or part.function_response:
+                return False
+        if content.role == "user" and any(
+            (p.text or "").strip() == user_text.strip() for p in content.parts or []
+        ):
+            return True
+    return True
@@ -0,0 +1,295 @@
+"""
+Mapping-aware validation and rewriting of `queryBody` before tool execution.
+
+ParkingAgent's `before_tool_callback` checks every `search` call against the
+shared SchemaRegistry (data_type.json) and repairs what can be repaired locally:
+
+- field names given as a unique suffix (`rent`) are expanded (`spaces.rent`)
+- leaf queries on nested paths are wrapped in the missing `nested` query
+- `term` on text fields uses the `.keyword` sub-field (or becomes
+  `match_phrase`), `match`/`match_phrase` on keyword/number/boolean fields
+  becomes `term`
+- `_source` is limited to known fields (DEFAULT_PARKING_FIELDS when missing)
+- `size` is defaulted and capped
+
+Anything else (unknown fields, wrong index, `range` on text, invalid JSON) is
+rejected with a precise error message, without a round trip to Elasticsearch.
+"""
+
+import copy
+import difflib
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from .metrics import metrics
+from .query_compiler import (
+    PARKING_INDEX,
+    PARKING_QUERY_SIZE,
+    SEARCH_TOOL_NAME,
+    SOURCE_EXTRA_FIELDS,
+)
+from .schema import SchemaRegistry, get_schema
+
+MAX_QUERY_SIZE = int(os.getenv("MAX_QUERY_SIZE", "20"))
+
+# Leaf queries whose body is {field: ...}
+FIELD_QUERIES = {
+    "match_phrase",
+    "match",
+    "match_phrase_prefix",
+    "term",
+    "terms",
+    "range",
+    "prefix",
+    "wildcard",
+}
+TEXT_QUERIES = {"match_phrase", "match", "match_phrase_prefix"}
+EXACT_QUERIES = {"term", "terms"}
+BOOL_CLAUSES = ("must", "should", "filter", "must_not")
+NUMERIC_TYPES = {"long", "integer", "short", "byte", "float", "double", "date"}
+
+
+class QueryValidationError(ValueError):
+    pass
+
+
+class QueryBodyValidator:
+    """Validates and rewrites parking `queryBody` payloads against the mapping."""
+
+    def __init__(
+        self,
+        schema: Optional[SchemaRegistry] = None,
+        source_fields: Optional[List[str]] = None,
+        default_size: int = PARKING_QUERY_SIZE,
+        max_size: int = MAX_QUERY_SIZE,
+    ):
+        # Read through the registry on every call so live mapping refreshes apply
+        self.schema = schema if schema is not None else get_schema()
+        self._source_fields = source_fields
+        self.default_size = default_size
+        self.max_size = max_size
+
+    @property
+    def field_types(self) -> Dict[str, str]:
+        return self.schema.field_types
+
+    @property
+    def default_source(self) -> List[str]:
+        source_fields = self._source_fields or self.schema.default_fields
+        return SOURCE_EXTRA_FIELDS + [
+            f for f in source_fields if f not in SOURCE_EXTRA_FIELDS
+        ]
+
+    def rewrite(self, query_body: Any) -> Dict[str, Any]:
+        """Return a repaired copy of `query_body` or raise QueryValidationError."""
+        if isinstance(query_body, str):
+            try:
+                query_body = json.loads(query_body)
+            except ValueError as e:
+                raise QueryValidationError(f"'queryBody' is not valid JSON: {e}")
+        if not isinstance(query_body, dict):
+            raise QueryValidationError("'queryBody' must be a JSON object.")
+        body = copy.deepcopy(query_body)
+        if "query" not in body and self._is_query(body):
+            # A bare query clause was passed as the whole body
+            body = {"query": body}
+        if "query" in body:
+            body["query"] = self._rewrite_query(body["query"], None)
+        body["_source"] = self._rewrite_source(body.get("_source"))
+        size = body.get("size", self.default_size)
+        # bool is an int subclass, but `true` is no size
+        if not isinstance(size, int) or isinstance(size, bool) or size < 0:
+            raise QueryValidationError(
+                f"'size' must be a non-negative integer, got {size!r}."
+            )
+        body["size"] = min(size, self.max_size)
+        return body
+
+    def _is_query(self, body):
+        return bool(body) and all(
+            k in FIELD_QUERIES
+            or k in ("bool", "nested", "match_all", "exists", "geo_distance")
+            for k in body
+        )
+
+    def _check_field(self, path: str) -> Tuple[str, str]:
+        """Return (path, type), resolving a unique dotted suffix such as `rent`."""
+        field_type = self.field_types.get(path)
+        if field_type is not None:
+            return path, field_type
+        candidates = self.schema.find_by_suffix(path)
+        if len(candidates) == 1:
+            return candidates[0], self.field_types[candidates[0]]
+        close = candidates[:3] or difflib.get_close_matches(
+            path, list(self.field_types), n=3
+        )
+        hint = f" Did you mean: {', '.join(close)}?" if close else ""
+        raise QueryValidationError(
+            f"Unknown field '{path}' in the parking index.{hint}"
+        )
+
+    def _rewrite_query(self, query: Any, nested_context: Optional[str]) -> Any:
+        if isinstance(query, list):
+            return [self._rewrite_query(q, nested_context) for q in query]
+        if not isinstance(query, dict):
+            raise QueryValidationError(f"Invalid query clause: {query!r}")
+        if len(query) != 1:
+            # Several clauses in one object: treat them as a conjunction
+            return {
+                "bool": {
+                    "must": [
+                        self._rewrite_query({k: v}, nested_context)
+                        for k, v in query.items()
+                    ]
+                }
+            }
+        ((kind, spec),) = query.items()
+        if kind == "bool":
+            return {
+                "bool": {
+                    k: (
+                        self._rewrite_query(v, nested_context)
+                        if k in BOOL_CLAUSES
+                        else v
+                    )
+                    for k, v in spec.items()
+                }
+            }
+        if kind == "nested":
+            path = spec.get("path")
+            if path not in self.schema.nested_paths:
+                raise QueryValidationError(
+                    f"'{path}' is not a nested field. Nested fields: {', '.join(sorted(self.schema.nested_paths))}."
+                )
+            return {
+                "nested": {
+                    **spec,
+                    "query": self._rewrite_query(spec.get("query", {}), path),
+                }
+            }
+        if kind == "exists":
+            field, _ = self._check_field(spec.get("field", ""))
+            return self._wrap_nested(
+                {"exists": {**spec, "field": field}}, field, nested_context
+            )
+        if kind not in FIELD_QUERIES:
+            return query
+        if not isinstance(spec, dict) or len(spec) != 1:
+            raise QueryValidationError(
+                f"'{kind}' must target exactly one field: {spec!r}"
+            )
+        ((field, value),) = spec.items()
+        leaf = self._fix_leaf_type(kind, field, value)
+        leaf_field = next(iter(next(iter(leaf.values()))))
+        return self._wrap_nested(leaf, leaf_field, nested_context)
+
+    def _fix_leaf_type(self, kind: str, field: str, value: Any) -> dict:
+        field, field_type = self._check_field(field)
+        if field_type in ("object", "nested"):
+            raise QueryValidationError(
+                f"'{field}' is an {field_type} field; query one of its sub-fields instead."
+            )
+        if kind in EXACT_QUERIES and field_type == "text":
+            keyword = f"{field}.keyword"
+            if self.field_types.get(keyword) == "keyword":
+                return {kind: {keyword: value}}
+            if kind == "terms":
+                if not value:
+                    # Matches nothing either way, and has no clause to expand
+                    return {"terms": {field: []}}
+                return {
+                    "bool": {
+                        "should": [{"match_phrase": {field: v}} for v in value],
+                        "minimum_should_match": 1,
+                    }
+                }
+            return {
+                "match_phrase": {
+                    field: value.get("value") if isinstance(value, dict) else value
+                }
+            }
+        if kind in TEXT_QUERIES and field_type != "text":
+            if isinstance(value, dict):
+                value = value.get("query")
+            return {"term": {field: value}}
+        if kind == "range" and field_type not in NUMERIC_TYPES:
+            raise QueryValidationError(
+                f"'range' is not supported on {field_type} field '{field}'; use match_phrase or term."
+            )
+        return {kind: {field: value}}
+
+    def _wrap_nested(
+        self, leaf: dict, field: str, nested_context: Optional[str]
+    ) -> dict:
+        if leaf.get("bool"):
+            # terms on text expanded into should clauses: wrap the whole bool
+            field = next(iter(leaf["bool"]["should"][0]["match_phrase"]))
+        parent = self.schema.nested_parent(field)
+        if parent == nested_context:
+            return leaf
+        if parent is None or (
+            nested_context and not parent.startswith(nested_context + ".")
+        ):
+            raise QueryValidationError(
+                f"Field '{field}' cannot be queried inside nested path '{nested_context}'."
+            )
+        return {"nested": {"path": parent, "query": leaf}}
+
+    def _rewrite_source(self, source: Any) -> Any:
+        if source in (None, True, "*"):
+            return list(self.default_source)
+        if source is False:
+            return False
+        if isinstance(source, str):
+            source = [source]
+        if isinstance(source, dict):
+            source = source.get("includes") or list(self.default_source)
+        known = [
+            f
+            for f in source
+            if f in self.field_types or f.endswith("*") or f in SOURCE_EXTRA_FIELDS
+        ]
+        return known or list(self.default_source)
+
+    def source_fields_of(self, args: Dict[str, Any]) -> List[str]:
+        """`_source` fields of a search call that passed `before_tool_callback`."""
+        query_body = (args or {}).get("queryBody")
+        source = query_body.get("_source") if isinstance(query_body, dict) else None
+        if isinstance(source, list) and source:
+            return source
+        return list(self.default_source)
+
+    async def before_tool_callback(self, tool, args, tool_context):
+        """Rewrite `queryBody` in place, or reject the call with an error."""
+        if tool.name != SEARCH_TOOL_NAME:
+            return None
+        try:
+            if args.get("index") not in (None, PARKING_INDEX):
+                raise QueryValidationError(
+                    f"Only the '{PARKING_INDEX}' index can be searched, got '{args.get('index')}'."
+                )
+            query_body = args.get("queryBody")
+            if isinstance(query_body, str) and query_body.strip():
+                try:
+                    # Parsed here so "{}" counts as missing, like {}
+                    query_body = json.loads(query_body)
+                except ValueError:
+                    pass
+            if query_body in (None, "", {}):
+                raise QueryValidationError(
+                    "Your search is missing the required 'queryBody' parameter."
+                )
+            rewritten = self.rewrite(query_body)
+        except QueryValidationError as e:
+            logging.info(f"[QueryBodyValidator] Rejected search: {e}")
+            metrics.increment("query_validation_total", outcome="rejected")
+            return {"status": "error", "error_message": str(e)}
+        outcome = "ok" if rewritten == query_body else "rewritten"
+        if outcome == "rewritten":
+            logging.info(f"[QueryBodyValidator] Rewrote queryBody: {rewritten}")
+        metrics.increment("query_validation_total", outcome=outcome)
+        args["index"] = PARKING_INDEX
+        args["queryBody"] = rewritten
+        return None
@@ -0,0 +1,367 @@
+"""
+Deadlines, hedged requests and circuit breaking for tool backends.
+
+Every tool call of a backend (the Elasticsearch MCP server, the native
+Elasticsearch `search` tool, Toolbox) goes through that backend's
+`ResilientCaller`:
+
+- Deadline: TOOL_DEADLINES per tool (e.g. `search=8`, default
+  TOOL_DEADLINE_SECONDS), cut down to what is left of the turn budget
+  (TURN_BUDGET_SECONDS, started by the root agent for every turn).
+- Hedging (TOOL_HEDGING=true): when a call has not answered after the p95
+  of its recent latencies, an identical second request is sent and the first
+  answer wins; the other is cancelled. Tool calls are read-only searches, so
+  sending one twice is safe.
+- Circuit breaker: after TOOL_BREAKER_FAILURES consecutive failures
+  (timeouts, transport errors, 5xx / 429 answers, and `isError` results
+  reporting one of these, e.g. an Elasticsearch outage seen by the MCP
+  server) the backend is considered unhealthy and calls fail fast for
+  TOOL_BREAKER_RESET_SECONDS; then one probe call decides whether it closes
+  again. Other `isError` results (a malformed queryBody, a 4xx) are the
+  model's to fix: they go back to it and do not count against the breaker.
+
+A call that times out, fails or is rejected by the open breaker returns the
+last good result of the same call (a small LRU kept here, deep-copied in
+and out) or, without one, the backend's graceful error result (for a failed
+`isError` result, that result itself), so the answer agent can still reply.
+
+Metrics: `tool_breaker_state{backend}` gauge (0 closed, 1 half open, 2 open),
+`tool_breaker_transitions_total`, `tool_breaker_rejected_total`,
+`tool_call_failures_total{reason=timeout|error|tool_error}`,
+`tool_fallback_total{kind}` and
+`tool_hedge_total{outcome=sent|hedge_won|primary_won}`.
+"""
+
+import asyncio
+import contextvars
+import copy
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+import httpx
+from mcp.shared.exceptions import McpError
+
+from .metrics import metrics, percentile
+from .tool_cache import canonicalize_args, parse_ttls
+
+TURN_BUDGET_SECONDS = float(os.getenv("TURN_BUDGET_SECONDS", "60"))
+TOOL_DEADLINE_SECONDS = float(os.getenv("TOOL_DEADLINE_SECONDS", "20"))
+TOOL_DEADLINES = parse_ttls(os.getenv("TOOL_DEADLINES"))
+TOOL_HEDGING = os.getenv("TOOL_HEDGING", "false").lower() == "true"
+# Latencies needed before hedging a tool, and the shortest hedge delay
+TOOL_HEDGE_MIN_SAMPLES = 20
+TOOL_HEDGE_MIN_DELAY_MS = float(os.getenv("TOOL_HEDGE_MIN_DELAY_MS", "50"))
+TOOL_LATENCY_WINDOW = 200
+TOOL_BREAKER_FAILURES = int(os.getenv("TOOL_BREAKER_FAILURES", "5"))
+TOOL_BREAKER_RESET_SECONDS = float(os.getenv("TOOL_BREAKER_RESET_SECONDS", "30"))
+# Last good results kept per backend for fallback answers
+TOOL_FALLBACK_ENTRIES = 256
+# Slack on top of a deadline, so the backend's own timeout (which recycles a
+# hung MCP session) fires before the call is cancelled from outside
+DEADLINE_GRACE_SECONDS = 1.0
+
+# `isError` texts reporting an unhealthy backend rather than a rejected query:
+# Node / Elasticsearch client transport errors, overload and 5xx exceptions
+BACKEND_FAILURE_PATTERN = re.compile(
+    r"ECONNREFUSED|ECONNRESET|ETIMEDOUT|EAI_AGAIN|ENOTFOUND|socket hang up"
+    r"|ConnectionError|NoLivingConnectionsError|no living connections"
+    r"|TimeoutError|timed out|circuit_breaking_exception"
+    r"|es_rejected_execution_exception|too_many_requests"
+    r"|unavailable_shards_exception|no_shard_available_action_exception"
+    r"|master_not_discovered_exception|service unavailable|bad gateway"
+    r"|gateway timeout",
+    re.IGNORECASE,
+)
+
+# Monotonic time the current turn must be answered by
+_turn_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "turn_deadline", default=None
+)
+
+
+def start_turn_budget(seconds: float = TURN_BUDGET_SECONDS) -> contextvars.Token:
+    """Start the budget tool deadlines of this turn are cut down to."""
+    return _turn_deadline.set(time.monotonic() + seconds)
+
+
+def end_turn_budget(token: contextvars.Token) -> None:
+    try:
+        _turn_deadline.reset(token)
+    except ValueError:
+        # Generator finalized in another context: the budget dies with it
+        pass
+
+
+def tool_deadline(tool_name: str) -> float:
+    """Seconds the call of `tool_name` may take from now."""
+    seconds = TOOL_DEADLINES.get(tool_name, TOOL_DEADLINE_SECONDS)
+    turn_deadline = _turn_deadline.get()
+    if turn_deadline is not None:
+        seconds = min(seconds, turn_deadline - time.monotonic())
+    return max(seconds, 0.0)
+
+
+class ToolErrorResult(Exception):
+    """A backend failure `isError` result, raised so it counts as a failed call."""
+
+    def __init__(self, result: Any):
+        super().__init__(_result_text(result))
+        self.result = result
+
+
+def _result_text(result: Any) -> str:
+    return " ".join(getattr(c, "text", "") or "" for c in result.content or [])
+
+
+def is_error_result(result: Any) -> bool:
+    return getattr(result, "isError", False) is True
+
+
+def is_backend_failure(result: Any) -> bool:
+    """Whether an `isError` result reports an unhealthy backend (not a bad query)."""
+    return is_error_result(result) and bool(
+        BACKEND_FAILURE_PATTERN.search(_result_text(result))
+    )
+
+
+def failure_reason(error: BaseException) -> str:
+    if isinstance(error, TimeoutError):
+        return "timeout"
+    # `read_timeout_seconds` expiring inside the MCP client session
+    if isinstance(error, McpError) and error.error.code == httpx.codes.REQUEST_TIMEOUT:
+        return "timeout"
+    if isinstance(error, ToolErrorResult):
+        return "tool_error"
+    return "error"
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open -> half open (one probe)."""
+
+    CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+    _GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(
+        self,
+        backend: str,
+        failure_threshold: int = TOOL_BREAKER_FAILURES,
+        reset_seconds: float = TOOL_BREAKER_RESET_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.backend = backend
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        metrics.set_gauge("tool_breaker_state", 0, backend=backend)
+
+    def allow(self) -> bool:
+        """Whether a call may go to the backend now."""
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            if self.state == self.OPEN:
+                if self._clock() - self._opened_at < self.reset_seconds:
+                    return False
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN:
+                if self._probing:
+                    return False
+                self._probing = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self.state != self.CLOSED:
+                self._set_state(self.CLOSED)
+
+    def record_cancelled(self) -> None:
+        # The caller gave up: says nothing about the backend, frees the probe
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or (
+                self.state == self.CLOSED and self._failures >= self.failure_threshold
+            ):
+                self._opened_at = self._clock()
+                self._set_state(self.OPEN)
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        metrics.set_gauge(
+            "tool_breaker_state", self._GAUGE[state], backend=self.backend
+        )
+        metrics.increment(
+            "tool_breaker_transitions_total", backend=self.backend, state=state
+        )
+        logging.warning(f"[CircuitBreaker] {self.backend} circuit {state}")
+
+
+class ResilientCaller:
+    """Deadline, optional hedge and circuit breaker for one backend's tool calls."""
+
+    def __init__(
+        self,
+        backend: str,
+        hedging: bool = TOOL_HEDGING,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.backend = backend
+        self.hedging = hedging
+        self.breaker = breaker or CircuitBreaker(backend)
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._last_good: "OrderedDict[Tuple[str, str], Any]" = OrderedDict()
+
+    async def call(
+        self,
+        tool_name: str,
+        args: Optional[Dict[str, Any]],
+        attempt: Callable[[float], Awaitable[Any]],
+        fallback: Callable[[str], Any],
+    ) -> Any:
+        """
+        Result of `attempt(timeout)` (one backend request, which must give up
+        after `timeout` seconds), or a fallback when the backend fails.
+        """
+
+        async def checked(timeout: float):
+            result = await attempt(timeout)
+            if is_backend_failure(result):
+                raise ToolErrorResult(result)
+            return result
+
+        key = (tool_name, canonicalize_args(args))
+        timeout = tool_deadline(tool_name)
+        if timeout <= 0:
+            # Not the backend's fault: the breaker is left alone
+            return self._fallback(key, fallback, "turn_budget_exhausted")
+        if not self.breaker.allow():
+            metrics.increment(
+                "tool_breaker_rejected_total", backend=self.backend, tool=tool_name
+            )
+            return self._fallback(key, fallback, "circuit_open")
+        started = time.perf_counter()
+        try:
+            result = await self._attempts(tool_name, checked, timeout)
+        except asyncio.CancelledError:
+            self.breaker.record_cancelled()
+            raise
+        except Exception as e:
+            reason = failure_reason(e)
+            self.breaker.record_failure()
+            metrics.increment(
+                "tool_call_failures_total",
+                backend=self.backend,
+                tool=tool_name,
+                reason=reason,
+            )
+            logging.warning(
+                f"[ResilientCaller] {self.backend} {tool_name} failed ({reason}, {timeout:.1f}s deadline): {e!r}"
+            )
+            if isinstance(e, ToolErrorResult):
+                # Without a last good result, the backend's own error is best
+                error_result = e.result
+                return self._fallback(key, lambda _: error_result, reason)
+            return self._fallback(key, fallback, reason)
+        self.breaker.record_success()
+        self._latencies.setdefault(tool_name, deque(maxlen=TOOL_LATENCY_WINDOW)).append(
+            (time.perf_counter() - started) * 1000
+        )
+        if is_error_result(result):
+            # A rejected query: the backend answered, but this is no fallback
+            return result
+        # Copied in and out, like ToolResultCache: callbacks mutate results
+        self._last_good[key] = copy.deepcopy(result)
+        self._last_good.move_to_end(key)
+        if len(self._last_good) > TOOL_FALLBACK_ENTRIES:
+            self._last_good.popitem(last=False)
+        return result
+
+    def hedge_delay(self, tool_name: str) -> Optional[float]:
+        """Seconds after which a call is hedged (None: not hedged)."""
+        samples = self._latencies.get(tool_name)
+        if not self.hedging or not samples or len(samples) < TOOL_HEDGE_MIN_SAMPLES:
+            return None
+        return max(percentile(samples, 95), TOOL_HEDGE_MIN_DELAY_MS) / 1000
+
+    async def _attempts(self, tool_name: str, attempt, timeout: float) -> Any:
+        deadline = time.monotonic() + timeout + DEADLINE_GRACE_SECONDS
+        delay = self.hedge_delay(tool_name)
+        if delay is None or delay >= timeout:
+            return await asyncio.wait_for(
+                attempt(timeout), timeout + DEADLINE_GRACE_SECONDS
+            )
+        primary = asyncio.ensure_future(attempt(timeout))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done:
+                remaining = deadline - DEADLINE_GRACE_SECONDS - time.monotonic()
+                hedge = asyncio.ensure_future(attempt(remaining))
+                tasks.add(hedge)
+                metrics.increment(
+                    "tool_hedge_total",
+                    backend=self.backend,
+                    tool=tool_name,
+                    outcome="sent",
+                )
+            pending, error = set(tasks), None
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=max(deadline - time.monotonic(), 0),
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    raise TimeoutError(f"no answer within {timeout:.1f}s")
+                for task in done:
+                    if task.exception() is None:
+                        if len(tasks) > 1:
+                            won = "primary_won" if task is primary else "hedge_won"
+                            metrics.increment(
+                                "tool_hedge_total",
+                                backend=self.backend,
+                                tool=tool_name,
+                                outcome=won,
+                            )
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _fallback(self, key, fallback: Callable[[str], Any], reason: str) -> Any:
+        if key in self._last_good:
+            metrics.increment(
+                "tool_fallback_total", backend=self.backend, tool=key[0], kind="cached"
+            )
+            return copy.deepcopy(self._last_good[key])
+        metrics.increment(
+            "tool_fallback_total", backend=self.backend, tool=key[0], kind="graceful"
+        )
+        return fallback(reason)
+
+
+def unavailable_message(backend: str, reason: str) -> str:
+    """Error text the answer agents get instead of a tool result."""
+    return (
+        f"The {backend} service is temporarily unavailable ({reason}). "
+        "Answer without this result and ask the user to try again later."
+    )
@@ -0,0 +1,365 @@
+"""
+Token-budgeted compaction of tool results before they enter the LLM context.
+
+An `after_tool_callback` that rewrites what the answer agents read back from
+their tools: Elasticsearch `search` hits (MCP / native text blocks) and
+Toolbox rows (a JSON list of records). Records are projected to the fields
+the agent needs, empty and duplicate values are dropped, and the records are
+re-encoded as one table (a header of column names, one `|`-separated line per
+record; values shared by every record are printed once). If the table is
+still over the agent's token budget, the lowest-ranked records (last hits /
+rows) are dropped first. Token counts before and after are recorded per call.
+"""
+
+import json
+import logging
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from .metrics import metrics
+from .tokens import count_tokens, truncate_to_tokens
+from .tool_cache import parse_ttls
+
+TOOL_RESULT_COMPACTION = os.getenv("TOOL_RESULT_COMPACTION", "true").lower() == "true"
+TOOL_RESULT_TOKEN_BUDGET = int(os.getenv("TOOL_RESULT_TOKEN_BUDGET", "1500"))
+# Per-agent overrides, e.g. `parking_agent=2000,common_agent=1000`
+TOOL_RESULT_TOKEN_BUDGETS = {
+    name: int(tokens)
+    for name, tokens in parse_ttls(os.getenv("TOOL_RESULT_TOKEN_BUDGETS")).items()
+}
+
+# `field: value` / `field (highlighted): fragment ... fragment` lines of a hit
+HIT_LINE = re.compile(r"^([\w.@-]+)( \(highlighted\))?: (.*)$")
+HIGHLIGHT_TAGS = re.compile(r"</?em>")
+TOTALS_PREFIX = "Total results:"
+
+# Fields to keep, or a callable returning them for the call's args
+Fields = Union[Sequence[str], Callable[[Dict[str, Any]], Sequence[str]]]
+
+
+def token_budget_for(agent_name: str) -> int:
+    return TOOL_RESULT_TOKEN_BUDGETS.get(agent_name, TOOL_RESULT_TOKEN_BUDGET)
+
+
+def as_sent(response: Any) -> str:
+    """The tool response as the model receives it (see ADK lite_llm)."""
+    if not isinstance(response, dict):
+        response = {"result": response}
+    try:
+        return json.dumps(response, ensure_ascii=False)
+    except (TypeError, OverflowError):
+        return str(response)
+
+
+def _is_error(response: Any) -> bool:
+    if getattr(response, "isError", False):
+        return True
+    return isinstance(response, dict) and (
+        response.get("isError") or response.get("status") == "error"
+    )
+
+
+def _texts(response: Any) -> Optional[List[str]]:
+    """Text blocks of an MCP CallToolResult (object or dumped dict)."""
+    content = getattr(response, "content", None)
+    if content is None and isinstance(response, dict):
+        content = response.get("content")
+    if not isinstance(content, list):
+        return None
+    texts = []
+    for block in content:
+        text = getattr(block, "text", None)
+        if text is None and isinstance(block, dict):
+            text = block.get("text")
+        if text is not None:
+            texts.append(text)
+    return texts
+
+
+def _parse_value(raw: str) -> Any:
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return raw
+
+
+def parse_hit(text: str) -> Optional[Dict[str, Any]]:
+    """One hit block of the Elastic MCP `search` output back into a record."""
+    record, field = {}, None
+    for line in text.splitlines():
+        match = HIT_LINE.match(line)
+        if match:
+            field, highlighted, value = match.groups()
+            if highlighted:
+                record[field] = HIGHLIGHT_TAGS.sub("", value)
+            else:
+                record[field] = _parse_value(value)
+        elif field is not None and isinstance(record[field], str):
+            # Highlight fragments may span lines
+            record[field] += " " + HIGHLIGHT_TAGS.sub("", line)
+        else:
+            return None
+    return record or None
+
+
+def extract_records(response: Any) -> Tuple[Optional[str], Optional[List[dict]]]:
+    """(summary line, records) of a tool response; records is None if not tabular."""
+    texts = _texts(response)
+    if texts is not None:
+        summary = None
+        if texts and texts[0].startswith(TOTALS_PREFIX):
+            summary, texts = texts[0], texts[1:]
+        records = [parse_hit(text) for text in texts]
+        if all(records):
+            return summary, records
+        if len(texts) == 1:
+            response = texts[0]
+        else:
+            return summary, None
+    if isinstance(response, dict) and set(response) == {"result"}:
+        response = response["result"]
+    if isinstance(response, str):
+        response = _parse_value(response)
+    if isinstance(response, dict):
+        # Toolbox-style wrappers: the first list of records in the payload
+        for value in response.values():
+            if isinstance(value, list) and value and isinstance(value[0], dict):
+                response = value
+                break
+    if isinstance(response, list) and all(isinstance(r, dict) for r in response):
+        return None, response
+    return None, None
+
+
+def _projection_tree(fields: Sequence[str]) -> dict:
+    # "spaces.rent", "spaces.capacity" -> {"spaces": {"rent": {}, "capacity": {}}}
+    tree = {}
+    for path in fields:
+        if path.endswith(".*"):
+            path = path[:-2]
+        if "*" in path:
+            return {}  # prefix wildcards: keep everything
+        node = tree
+        parts = path.split(".")
+        for i, part in enumerate(parts):
+            if part in node and not node[part]:
+                break  # an ancestor is already kept whole
+            node = node.setdefault(part, {})
+            if i == len(parts) - 1:
+                node.clear()
+    return tree
+
+
+def project(value: Any, tree: dict) -> Any:
+    if not tree:
+        return value
+    if isinstance(value, list):
+        return [project(item, tree) for item in value]
+    if isinstance(value, dict):
+        projected = {}
+        for key, item in value.items():
+            if key in tree:
+                projected[key] = project(item, tree[key])
+            elif "." in key:
+                # Already flattened (e.g. highlighted `city.name`)
+                head, _, rest = key.partition(".")
+                if head in tree and (not tree[head] or rest in tree[head]):
+                    projected[key] = item
+        return projected
+    return value
+
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+
+def _key(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+
+
+def clean(value: Any) -> Any:
+    """Drop empty values and duplicate list items / sibling values, recursively."""
+    if isinstance(value, dict):
+        cleaned, seen = {}, set()
+        for key, item in value.items():
+            item = clean(item)
+            if _is_empty(item):
+                continue
+            # e.g. `addressView` repeating `address`: keep the first field only
+            item_key = _key(item)
+            if isinstance(item, str) and item_key in seen:
+                continue
+            seen.add(item_key)
+            cleaned[key] = item
+        return cleaned
+    if isinstance(value, list):
+        cleaned, seen = [], set()
+        for item in value:
+            item = clean(item)
+            item_key = _key(item)
+            if _is_empty(item) or item_key in seen:
+                continue
+            seen.add(item_key)
+            cleaned.append(item)
+        return cleaned
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def _flatten(record: dict, prefix: str = "") -> Dict[str, Any]:
+    flat = {}
+    for key, value in record.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{path}."))
+        elif (
+            isinstance(value, list)
+            and value
+            and all(isinstance(v, dict) and len(v) == 1 for v in value)
+            and len({next(iter(v)) for v in value}) == 1
+        ):
+            # [{"name": "渋谷"}, {"name": "恵比寿"}] -> nearbyStations.name: 渋谷;恵比寿
+            flat[f"{path}.{next(iter(value[0]))}"] = [
+                next(iter(v.values())) for v in value
+            ]
+        else:
+            flat[path] = value
+    return flat
+
+
+def _cell(value: Any) -> str:
+    if isinstance(value, list) and all(not isinstance(v, (dict, list)) for v in value):
+        text = ";".join(str(v) for v in value)
+    elif isinstance(value, (dict, list)):
+        text = json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+    elif isinstance(value, bool):
+        text = "true" if value else "false"
+    else:
+        text = str(value)
+    return re.sub(r"\s+", " ", text.replace("|", "/"))
+
+
+def encode_table(
+    records: List[dict], order: Sequence[str] = ()
+) -> Tuple[List[str], List[str]]:
+    """(header lines, one line per record) of the compact tabular encoding."""
+    rows = [_flatten(record) for record in records]
+    columns = []
+    for row in rows:
+        columns += [c for c in row if c not in columns]
+    if order:
+        # Columns of the requested fields in request order, the rest after them
+        rank = {}
+        for i, field in enumerate(order):
+            rank.setdefault(field, i)
+        columns.sort(key=lambda c: rank.get(c.split(".")[0], len(rank)))
+    common = {}
+    if len(rows) > 1:
+        for column in columns:
+            values = {_key(row.get(column)) for row in rows}
+            if len(values) == 1 and column in rows[0]:
+                common[column] = rows[0][column]
+    columns = [c for c in columns if c not in common]
+    header = []
+    if common:
+        header.append(
+            "all rows: " + "; ".join(f"{c}={_cell(v)}" for c, v in common.items())
+        )
+    header.append("columns: " + " | ".join(columns))
+    lines = [
+        " | ".join(_cell(row[c]) if c in row else "" for c in columns) for row in rows
+    ]
+    return header, lines
+
+
+class ToolResultCompactor:
+    """`after_tool_callback` compacting tool results to a token budget."""
+
+    def __init__(
+        self,
+        token_budget: int = TOOL_RESULT_TOKEN_BUDGET,
+        fields: Optional[Dict[str, Fields]] = None,
+        enabled: bool = TOOL_RESULT_COMPACTION,
+    ):
+        self.token_budget = token_budget
+        # tool name -> fields to keep
+        self._fields = dict(fields or {})
+        self.enabled = enabled
+
+    @classmethod
+    def for_agent(
+        cls, agent_name: str, fields: Optional[Dict[str, Fields]] = None
+    ) -> "ToolResultCompactor":
+        return cls(token_budget=token_budget_for(agent_name), fields=fields)
+
+    def fields_for(
+        self, tool_name: str, args: Optional[Dict[str, Any]] = None
+    ) -> Optional[Sequence[str]]:
+        fields = self._fields.get(tool_name)
+        return fields(args or {}) if callable(fields) else fields
+
+    def compact(
+        self, tool_name: str, response: Any, args: Optional[Dict[str, Any]] = None
+    ) -> Optional[str]:
+        """Compact text for `response`, or None to leave it unchanged."""
+        summary, records = extract_records(response)
+        if records is None:
+            text = as_sent(response)
+            if count_tokens(text) <= self.token_budget:
+                return None
+            return truncate_to_tokens(text, self.token_budget) + " ...(truncated)"
+
+        fields = self.fields_for(tool_name, args) or ()
+        if fields:
+            tree = _projection_tree(fields)
+            records = [project(record, tree) for record in records]
+        records = [r for r in (clean(record) for record in records) if r]
+        if not records:
+            return "\n".join(filter(None, [summary, "No records."]))
+
+        header, lines = encode_table(records, [f.split(".")[0] for f in fields])
+        header = ([summary] if summary else []) + header
+        used = count_tokens("\n".join(header))
+        kept = []
+        for line in lines:
+            # Ranked best first: stop at the first record over the budget
+            tokens = count_tokens(line) + 1
+            if kept and used + tokens > self.token_budget:
+                break
+            kept.append(line)
+            used += tokens
+        text = "\n".join(header + kept)
+        if len(kept) < len(lines):
+            text += f"\n({len(lines) - len(kept)} lower-ranked records omitted)"
+        if count_tokens(text) > self.token_budget:
+            text = truncate_to_tokens(text, self.token_budget) + " ...(truncated)"
+        return text
+
+    async def after_tool_callback(self, tool, args, tool_context, tool_response):
+        if not self.enabled or _is_error(tool_response):
+            return None
+        agent_name = getattr(tool_context, "agent_name", None) or "unknown"
+        try:
+            compacted = self.compact(tool.name, tool_response, args)
+        except Exception as e:
+            logging.warning(
+                f"[ToolResultCompactor] Leaving {tool.name} result unchanged: {e}"
+            )
+            return None
+        before = count_tokens(as_sent(tool_response))
+        result, after = None, before
+        if compacted is not None:
+            candidate = {"result": compacted}
+            tokens = count_tokens(as_sent(candidate))
+            if tokens < before:
+                result, after = candidate, tokens
+        labels = {"agent": agent_name, "tool": tool.name}
+        metrics.observe("tool_result_tokens", before, stage="before", **labels)
+        metrics.observe("tool_result_tokens", after, stage="after", **labels)
+        metrics.increment("tool_result_tokens_saved_total", before - after, **labels)
+        logging.info(
+            f"[ToolResultCompactor] {agent_name}/{tool.name}: {before} -> {after} tokens"
+        )
+        return result
@@ -0,0 +1,274 @@
+"""
+Compiled, shared view of the parking index mapping.
+
+`SchemaRegistry` parses a mapping once into indexed lookups: path -> type,
+nested ancestors per path and a dotted-suffix index used for keyword lookups
+(e.g. `name` -> `city.name`, `prefecture.name`, ...). The compiled index is
+cached on disk keyed by the mapping's content hash, so restarts skip the walk.
+
+The process-wide registry (`get_schema()`) is shared by the ParkingAgent
+instruction, the query compiler and the queryBody validator. It can refresh
+from a live index `_mapping` (SCHEMA_REFRESH_SECONDS) without a restart.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import Dict, Iterable, List, Optional
+
+import aiohttp
+
+DATA_TYPE_PATH = os.path.join(os.path.dirname(__file__), "data_type.json")
+SCHEMA_CACHE_DIR = os.getenv(
+    "SCHEMA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "back_office_agent_schema")
+)
+# Bumped whenever _compile's output changes, so older cached indexes are ignored
+SCHEMA_CACHE_VERSION = 2
+# 0 disables refreshing from the live index mapping
+SCHEMA_REFRESH_SECONDS = float(os.getenv("SCHEMA_REFRESH_SECONDS", "0"))
+SCHEMA_INDEX = "parking"
+
+# Main field keywords, in the order they are offered to the LLM:
+# location, fee, security, space
+DEFAULT_FIELD_GROUPS = [
+    [
+        "address",
+        "addressView",
+        "location",
+        "city.name",
+        "prefecture.name",
+        "region.name",
+        "nearbyStations.name",
+    ],
+    [
+        "payment.fee",
+        "spaces.rent",
+        "spaces.rentMin",
+        "spaces.rentTaxClass",
+        "referralFeeTotal",
+        "storageDocument.issuingFee",
+    ],
+    ["securityFacilities.status", "spaces.facility"],
+    ["spaces", "capacity", "hasDivisionDrawing"],
+]
+
+
+def _compile(properties: dict) -> dict:
+    """Walk mapping properties once into plain (JSON-serializable) lookups."""
+    field_types = {}
+    leaf_paths = []
+    nested_paths = []
+    # Depth-first in document order: a field's sub-fields come before its siblings
+    stack = [(name, definition) for name, definition in reversed(properties.items())]
+    while stack:
+        path, definition = stack.pop()
+        if definition.get("type") == "nested":
+            nested_paths.append(path)
+        if "properties" in definition:
+            field_types[path] = definition.get("type", "object")
+            stack.extend(
+                (f"{path}.{name}", child)
+                for name, child in reversed(definition["properties"].items())
+            )
+        else:
+            field_types[path] = definition.get("type")
+            leaf_paths.append(path)
+        for sub, sub_def in definition.get("fields", {}).items():
+            field_types[f"{path}.{sub}"] = sub_def.get("type")
+    return {
+        "field_types": field_types,
+        "leaf_paths": leaf_paths,
+        "nested_paths": nested_paths,
+    }
+
+
+def _properties(mapping: dict) -> dict:
+    """Accept data_type.json, `{"mappings": ...}` or a `GET index/_mapping` body."""
+    if "properties" in mapping:
+        return mapping["properties"]
+    if "mappings" in mapping:
+        return _properties(mapping["mappings"])
+    if len(mapping) == 1:
+        return _properties(next(iter(mapping.values())))
+    raise ValueError("No 'properties' found in mapping")
+
+
+class SchemaRegistry:
+    """Indexed field lookups for one Elasticsearch mapping."""
+
+    def __init__(self, compiled: dict, digest: str = ""):
+        self.digest = digest
+        self._load(compiled)
+
+    def _load(self, compiled: dict):
+        # Rebinding the attributes keeps readers consistent during a refresh
+        self.field_types: Dict[str, str] = compiled["field_types"]
+        self.leaf_paths: List[str] = compiled["leaf_paths"]
+        self.nested_paths: List[str] = compiled["nested_paths"]
+        nested = sorted(self.nested_paths, key=len)
+        ancestors = {}
+        suffixes: Dict[str, List[str]] = {}
+        for path in self.field_types:
+            ancestors[path] = [n for n in nested if path.startswith(n + ".")]
+        for path in self.leaf_paths:
+            parts = path.split(".")
+            for i in range(len(parts)):
+                suffixes.setdefault(".".join(parts[i:]), []).append(path)
+        self._ancestors = ancestors
+        self._suffixes = suffixes
+        self.default_fields = self.fields_for(
+            kw for group in DEFAULT_FIELD_GROUPS for kw in group
+        )
+
+    @classmethod
+    def from_mapping(cls, mapping: dict, digest: str = "") -> "SchemaRegistry":
+        return cls(_compile(_properties(mapping)), digest)
+
+    @classmethod
+    def from_file(
+        cls, path: str = DATA_TYPE_PATH, cache_dir: Optional[str] = SCHEMA_CACHE_DIR
+    ) -> "SchemaRegistry":
+        """Load a mapping file, reusing the compiled index cached for its hash."""
+        with open(path, "rb") as f:
+            raw = f.read()
+        digest = hashlib.sha256(raw).hexdigest()
+        cache_path = (
+            os.path.join(
+                cache_dir, f"schema-v{SCHEMA_CACHE_VERSION}-{digest[:32]}.json"
+            )
+            if cache_dir
+            else None
+        )
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, encoding="utf-8") as f:
+                    return cls(json.load(f), digest)
+            except (OSError, ValueError, KeyError) as e:
+                logging.warning(
+                    f"[SchemaRegistry] Ignoring broken cache {cache_path}: {e}"
+                )
+        compiled = _compile(_properties(json.loads(raw)))
+        if cache_path:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(compiled, f, ensure_ascii=False)
+                os.replace(tmp_path, cache_path)
+            except OSError as e:
+                logging.warning(
+                    f"[SchemaRegistry] Could not write cache {cache_path}: {e}"
+                )
+        return cls(compiled, digest)
+
+    def type_of(self, path: str) -> Optional[str]:
+        return self.field_types.get(path)
+
+    def nested_ancestors(self, path: str) -> List[str]:
+        """Nested paths enclosing `path`, outermost first."""
+        return self._ancestors.get(path, [])
+
+    def nested_parent(self, path: str) -> Optional[str]:
+        ancestors = self.nested_ancestors(path)
+        return ancestors[-1] if ancestors else None
+
+    def find_by_suffix(self, suffix: str) -> List[str]:
+        """Leaf paths ending with the dotted `suffix`, in mapping order."""
+        return self._suffixes.get(suffix, [])
+
+    def fields_for(self, keywords: Iterable[str]) -> List[str]:
+        """Leaf paths matching each keyword in turn, without duplicates."""
+        seen = set()
+        fields = []
+        for kw in keywords:
+            for path in self.find_by_suffix(kw):
+                if path not in seen:
+                    seen.add(path)
+                    fields.append(path)
+        return fields
+
+    def update(self, mapping: dict) -> bool:
+        """Swap in a new mapping; returns False if it is unchanged."""
+        raw = json.dumps(mapping, sort_keys=True).encode("utf-8")
+        digest = hashlib.sha256(raw).hexdigest()
+        if digest == self.digest:
+            return False
+        self._load(_compile(_properties(mapping)))
+        self.digest = digest
+        logging.info(
+            f"[SchemaRegistry] Loaded mapping {digest[:12]} ({len(self.field_types)} fields)"
+        )
+        return True
+
+
+class LiveSchemaRefresher:
+    """Periodically reloads a registry from `GET {ES_URL}/{index}/_mapping`."""
+
+    def __init__(
+        self,
+        registry: SchemaRegistry,
+        index: str = SCHEMA_INDEX,
+        interval: float = SCHEMA_REFRESH_SECONDS,
+    ):
+        self.registry = registry
+        self.index = index
+        self.interval = interval
+        self._last_attempt = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0 and bool(os.getenv("ES_URL"))
+
+    async def refresh(self) -> bool:
+        es_url = os.getenv("ES_URL", "").rstrip("/")
+        auth = None
+        if os.getenv("ES_USERNAME"):
+            auth = aiohttp.BasicAuth(
+                os.getenv("ES_USERNAME"), os.getenv("ES_PASSWORD", "")
+            )
+        timeout = aiohttp.ClientTimeout(total=10)
+        async with aiohttp.ClientSession(auth=auth, timeout=timeout) as session:
+            async with session.get(f"{es_url}/{self.index}/_mapping") as resp:
+                resp.raise_for_status()
+                mapping = await resp.json()
+        return self.registry.update(mapping)
+
+    def maybe_refresh(self):
+        """Start a background refresh when the interval has elapsed (non-blocking)."""
+        if not self.enabled or (self._task and not self._task.done()):
+            return
+        now = time.monotonic()
+        if now - self._last_attempt < self.interval:
+            return
+        self._last_attempt = now
+        self._task = asyncio.create_task(self._refresh_logged())
+
+    async def _refresh_logged(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            logging.warning(f"[SchemaRegistry] Live mapping refresh failed: {e}")
+
+
+_registry: Optional[SchemaRegistry] = None
+_refresher: Optional[LiveSchemaRefresher] = None
+
+
+def get_schema() -> SchemaRegistry:
+    """Process-wide registry for data_type.json."""
+    global _registry
+    if _registry is None:
+        _registry = SchemaRegistry.from_file()
+    return _registry
+
+
+def get_schema_refresher() -> LiveSchemaRefresher:
+    global _refresher
+    if _refresher is None:
+        _refresher = LiveSchemaRefresher(get_schema())
+    return _refresher
@@ -0,0 +1,346 @@
+"""
+Semantic response cache for repeated questions.
+
+With SEMANTIC_CACHE=true, `BackOfficeRootAgent` stores every polished answer
+with the embedding of its normalized question in an in-memory NumPy matrix.
+A later question whose embedding has a cosine similarity of at least
+SEMANTIC_CACHE_THRESHOLD with a stored one gets the stored answer right
+after the in-process fast classification, skipping ClassifierAgent, the
+answer agent and TonePolishAgent. An entry is only served when:
+
+- its route (`classifier_result`) matches the fast classifier's, when that
+  one is confident;
+- for parking answers, the session passed AuthAgent (`api_auth_success`);
+- the station / city / prefecture / rent slots of the query compiler and the
+  numbers of both questions are the same, so "渋谷駅の駐車場" never gets the
+  answer of "新宿駅の駐車場" however close their embeddings are.
+
+Identical normalized questions are answered without an embedding call.
+Embeddings come from SEMANTIC_CACHE_EMBEDDING_MODEL through LiteLLM
+(`local`: hashed character n-grams, no API call). Entries expire after
+SEMANTIC_CACHE_TTL_SECONDS and the least recently used ones are evicted past
+SEMANTIC_CACHE_MAX_ENTRIES / SEMANTIC_CACHE_MAX_BYTES. Answers of turns in
+which a tool call failed are not stored.
+
+Metrics: `semantic_cache_requests_total{outcome=hit|exact|miss,route}`, the
+`semantic_cache_hit_rate` gauge and the best similarity per lookup in
+`semantic_cache_similarity{outcome}` (to tune the threshold), plus
+`semantic_cache_evictions_total{reason}` and entry / byte gauges.
+"""
+
+import logging
+import os
+import re
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .fast_classifier import char_ngrams, normalize_text
+from .metrics import metrics
+from .query_compiler import ParkingQueryCompiler
+from .utils import RequestType
+
+SEMANTIC_CACHE = os.getenv("SEMANTIC_CACHE", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_EMBEDDING_MODEL = os.getenv(
+    "SEMANTIC_CACHE_EMBEDDING_MODEL", "openai/text-embedding-3-small"
+)
+SEMANTIC_CACHE_TTL_SECONDS = float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2048"))
+SEMANTIC_CACHE_MAX_BYTES = int(
+    os.getenv("SEMANTIC_CACHE_MAX_BYTES", str(32 * 1024 * 1024))
+)
+LOCAL_EMBEDDING_DIM = 512
+# Bookkeeping per entry on top of its vector and strings
+ENTRY_OVERHEAD_BYTES = 256
+
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.。、,？！]+$")
+_NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+def normalize_query(text: str) -> str:
+    return _TRAILING_PUNCTUATION.sub("", normalize_text(text))
+
+
+def query_facets(query: str, compiler: ParkingQueryCompiler) -> Tuple:
+    """Entities two questions must share to share an answer."""
+    slots, _ = compiler.extract_slots(query)
+    return tuple(sorted(slots.items())), tuple(_NUMBER_PATTERN.findall(query))
+
+
+class HashingEmbedder:
+    """Hashed character n-gram vectors: no API call, for offline runs and benches."""
+
+    def __init__(self, dim: int = LOCAL_EMBEDDING_DIM):
+        self.dim = dim
+
+    async def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for gram in char_ngrams(text, (1, 3)):
+            digest = zlib.crc32(gram.encode("utf-8"))
+            vector[digest % self.dim] += 1.0 if digest & 0x80000000 else -1.0
+        return vector
+
+
+class LiteLlmEmbedder:
+    """Embeddings of `model` (e.g. `openai/text-embedding-3-small`) through LiteLLM."""
+
+    def __init__(self, model: str):
+        self.model = model
+
+    async def embed(self, text: str) -> np.ndarray:
+        # Imported here: litellm is slow to import and already loaded by the agents
+        from litellm import aembedding
+
+        response = await aembedding(model=self.model, input=[text])
+        item = response.data[0]
+        embedding = item["embedding"] if isinstance(item, dict) else item.embedding
+        return np.asarray(embedding, dtype=np.float32)
+
+
+class CachedResponse(NamedTuple):
+    query: str
+    route: str
+    response: str
+    similarity: float
+
+
+class Probe(NamedTuple):
+    """Normalized question of a lookup and its embedding (None if not computed)."""
+
+    query: str
+    facets: Tuple
+    vector: Optional[np.ndarray]
+
+
+class _Entry:
+    __slots__ = ("query", "facets", "route", "response", "expires_at", "size")
+
+    def __init__(self, query, facets, route, response, expires_at, size):
+        self.query = query
+        self.facets = facets
+        self.route = route
+        self.response = response
+        self.expires_at = expires_at
+        self.size = size
+
+
+class SemanticCache:
+    """Polished answers by question embedding, with TTL, LRU and a memory cap."""
+
+    def __init__(
+        self,
+        embedder,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl: float = SEMANTIC_CACHE_TTL_SECONDS,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+        max_bytes: int = SEMANTIC_CACHE_MAX_BYTES,
+        clock=time.monotonic,
+    ):
+        self.embedder = embedder
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._compiler = ParkingQueryCompiler()
+        # Row i of the matrix is the unit vector of slot i; free rows are zero
+        self._vectors: Optional[np.ndarray] = None
+        self._entries: "OrderedDict[int, _Entry]" = OrderedDict()
+        self._free: List[int] = []
+        self._by_query: Dict[str, int] = {}
+        self._bytes = 0
+        self._hits = 0
+        self._lookups = 0
+
+    @classmethod
+    def from_env(cls) -> "SemanticCache":
+        if SEMANTIC_CACHE_EMBEDDING_MODEL == "local":
+            return cls(HashingEmbedder())
+        return cls(LiteLlmEmbedder(SEMANTIC_CACHE_EMBEDDING_MODEL))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    async def lookup(
+        self, text: str, route: Optional[str] = None, authenticated: bool = False
+    ) -> Tuple[Optional[CachedResponse], Probe]:
+        """
+        The cached answer for `text` (None on a miss), and the probe to `store`
+        the answer under once it is computed. `route` is the expected
+        `classifier_result`, None when the fast classifier is unsure.
+        """
+        query = normalize_query(text)
+        if not query:
+            return None, Probe(query, (), None)
+        facets = query_facets(query, self._compiler)
+        slot = self._by_query.get(query)
+        if slot is not None and self._servable(slot, route, authenticated, facets):
+            return self._hit(slot, 1.0, "exact"), Probe(query, facets, None)
+        try:
+            vector = _unit(await self.embedder.embed(query))
+        except Exception as e:
+            logging.warning(f"[SemanticCache] Embedding failed: {e}")
+            metrics.increment("semantic_cache_embedding_errors_total")
+            return None, Probe(query, facets, None)
+        best_slot, similarity = self._nearest(vector, route, authenticated, facets)
+        if best_slot is not None and similarity >= self.threshold:
+            return self._hit(best_slot, similarity, "hit"), Probe(query, facets, vector)
+        self._record("miss", route or "unknown", similarity)
+        return None, Probe(query, facets, vector)
+
+    def store(self, probe: Probe, route: str, response: str):
+        """Cache `response` (a polished answer on `route`) for the probed question."""
+        if probe.vector is None or not probe.query or not response:
+            return
+        if probe.query in self._by_query:
+            self._remove(self._by_query[probe.query])
+        self._evict_expired()
+        size = (
+            probe.vector.nbytes
+            + len(probe.query.encode("utf-8"))
+            + len(response.encode("utf-8"))
+            + ENTRY_OVERHEAD_BYTES
+        )
+        if size > self.max_bytes:
+            return
+        while self._entries and (
+            len(self._entries) >= self.max_entries
+            or self._bytes + size > self.max_bytes
+        ):
+            reason = "lru" if len(self._entries) >= self.max_entries else "memory"
+            self._remove(next(iter(self._entries)))
+            metrics.increment("semantic_cache_evictions_total", reason=reason)
+        slot = self._allocate(probe.vector)
+        self._entries[slot] = _Entry(
+            probe.query,
+            probe.facets,
+            route,
+            response,
+            self._clock() + self.ttl,
+            size,
+        )
+        self._by_query[probe.query] = slot
+        self._bytes += size
+        self._update_gauges()
+
+    def clear(self):
+        for slot in list(self._entries):
+            self._remove(slot)
+        self._update_gauges()
+
+    def _servable(self, slot: int, route, authenticated: bool, facets) -> bool:
+        entry = self._entries[slot]
+        if entry.expires_at <= self._clock():
+            self._remove(slot)
+            metrics.increment("semantic_cache_evictions_total", reason="ttl")
+            self._update_gauges()
+            return False
+        if entry.facets != facets or (route is not None and entry.route != route):
+            return False
+        return entry.route != RequestType.PARKING.value or authenticated
+
+    def _nearest(
+        self, vector, route, authenticated, facets
+    ) -> Tuple[Optional[int], float]:
+        """Most similar servable slot and its similarity (-1.0 when none)."""
+        if not self._entries or self._vectors.shape[1] != vector.shape[0]:
+            return None, -1.0
+        scores = self._vectors @ vector
+        for slot in np.argsort(scores)[::-1]:
+            slot = int(slot)
+            if slot in self._entries and self._servable(
+                slot, route, authenticated, facets
+            ):
+                return slot, float(scores[slot])
+        return None, -1.0
+
+    def _hit(self, slot: int, similarity: float, outcome: str) -> CachedResponse:
+        entry = self._entries[slot]
+        self._entries.move_to_end(slot)
+        self._hits += 1
+        self._record(outcome, entry.route, similarity)
+        return CachedResponse(entry.query, entry.route, entry.response, similarity)
+
+    def _record(self, outcome: str, route: str, similarity: float):
+        self._lookups += 1
+        metrics.increment("semantic_cache_requests_total", outcome=outcome, route=route)
+        metrics.set_gauge("semantic_cache_hit_rate", self._hits / self._lookups)
+        if similarity >= 0:
+            metrics.observe(
+                "semantic_cache_similarity",
+                similarity,
+                outcome="miss" if outcome == "miss" else "hit",
+            )
+
+    def _allocate(self, vector: np.ndarray) -> int:
+        if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+            # First entry, or the embedding model changed: start over
+            self._entries.clear()
+            self._by_query.clear()
+            self._free, self._bytes = [], 0
+            self._vectors = np.zeros((0, vector.shape[0]), dtype=np.float32)
+        if not self._free:
+            rows = self._vectors.shape[0]
+            grown = min(max(rows * 2, 16), max(self.max_entries, 1))
+            if grown <= rows:
+                grown = rows + 1
+            matrix = np.zeros((grown, vector.shape[0]), dtype=np.float32)
+            matrix[:rows] = self._vectors
+            self._vectors = matrix
+            self._free = list(range(grown - 1, rows - 1, -1))
+        slot = self._free.pop()
+        self._vectors[slot] = vector
+        return slot
+
+    def _remove(self, slot: int):
+        entry = self._entries.pop(slot)
+        if self._by_query.get(entry.query) == slot:
+            del self._by_query[entry.query]
+        self._vectors[slot] = 0
+        self._free.append(slot)
+        self._bytes -= entry.size
+
+    def _evict_expired(self):
+        now = self._clock()
+        for slot in [s for s, e in self._entries.items() if e.expires_at <= now]:
+            self._remove(slot)
+            metrics.increment("semantic_cache_evictions_total", reason="ttl")
+
+    def _update_gauges(self):
+        metrics.set_gauge("semantic_cache_entries", len(self._entries))
+        metrics.set_gauge("semantic_cache_bytes", self._bytes)
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else vector
+
+
+def _is_error(response) -> bool:
+    # MCP CallToolResult (object or dumped) or a Toolbox / validator error dict
+    if getattr(response, "isError", False):
+        return True
+    return isinstance(response, dict) and bool(
+        response.get("isError") or response.get("status") == "error"
+    )
+
+
+def has_tool_errors(events: Iterable) -> bool:
+    """Whether a tool call of `events` failed (its answer should not be cached)."""
+    for event in events:
+        for function_response in event.get_function_responses() or []:
+            response = function_response.response
+            if _is_error(response) or (
+                isinstance(response, dict) and _is_error(response.get("result"))
+            ):
+                return True
+    return False
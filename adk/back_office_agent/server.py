@@ -0,0 +1,54 @@
+"""
+ADK web server with a warm-up hook.
+
+Same app as `adk web`, but the root agent is warmed up when the server
+starts (sub-agents built, MCP server processes spawned, HTTP pools opened,
+Toolbox manifest loaded) instead of inside the first request. Point the
+readiness probe at GET /warmup: it waits for the warm-up and returns the
+per-step timings.
+
+Sessions are kept in the store selected by SESSION_STORE_URL (see
+session_store.py), so several workers / replicas can serve the same sessions.
+
+    cd adk && uvicorn back_office_agent.server:app --host 0.0.0.0 --port 8000
+"""
+
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI
+from google.adk.cli import fast_api
+from google.adk.cli.fast_api import get_fast_api_app
+
+from .agent import root_agent, warm_up
+from .session_store import session_service_from_env
+
+AGENTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # In the background: the server accepts connections while warming up
+    task = asyncio.create_task(warm_up())
+    yield
+    if not task.done():
+        task.cancel()
+    logging.info("[server] Shutting down")
+    await root_agent.close()
+    if hasattr(session_service, "close"):
+        # Commits the batched session writes
+        await session_service.close()
+
+
+session_service = session_service_from_env()
+# get_fast_api_app has no session service parameter (only `session_db_url`):
+# hand it ours where it would create its InMemorySessionService
+fast_api.InMemorySessionService = lambda: session_service
+app = get_fast_api_app(agents_dir=AGENTS_DIR, web=True, lifespan=lifespan)
+
+
+@app.get("/warmup")
+async def warmup():
+    return await warm_up()
@@ -0,0 +1,692 @@
+"""
+Shared, persistent session service.
+
+The workflow keeps its progress (`auth_in_progress`, `api_auth_success`,
+`classifier_result`, `response_text`, ...) in the ADK session, which the
+default InMemorySessionService keeps inside one process. `CachedSessionService`
+stores sessions in a `SessionStore` shared by every worker instead, so any
+worker can serve any turn and a restart keeps in-flight auth flows.
+`SqliteSessionStore` is the implementation for one host (WAL mode, safe for
+several worker processes); other stores implement the same five methods.
+
+- Writes are batched: tool calls, tool results and their state deltas are
+  committed with the next final-response event (e.g. an answer or the user's
+  message), SESSION_FLUSH_SECONDS after the first of them or once
+  SESSION_FLUSH_MAX_EVENTS are pending, whichever comes first, and before the
+  session is read again. A failed commit is retried with backoff, and
+  `close()` drains what is still pending.
+- Stored events carry their timestamp and load in event order, even when two
+  workers committed events of the same session in the other order.
+- Reads go through an in-process cache. Each read checks the session's
+  version in the store (one indexed lookup) and only loads the state and the
+  events it has not seen when another worker wrote in between.
+- State deltas are merged key by key in the store, so concurrent writers do
+  not overwrite each other's keys. State over SESSION_STATE_MAX_BYTES loses
+  its largest keys first, except the SESSION_STATE_PROTECTED_KEYS.
+
+Select it with SESSION_STORE_URL (see `session_service_from_env`).
+"""
+
+import asyncio
+import copy
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, InMemorySessionService, Session
+from google.adk.sessions.base_session_service import (
+    GetSessionConfig,
+    ListSessionsResponse,
+)
+from google.adk.sessions.state import State
+
+from .metrics import metrics
+
+# "" / "memory": InMemorySessionService (one process)
+# "sqlite:///path/to/sessions.db": CachedSessionService over SqliteSessionStore
+# other SQLAlchemy URLs: ADK's DatabaseSessionService
+SESSION_STORE_URL = os.getenv("SESSION_STORE_URL", "")
+SESSION_FLUSH_SECONDS = float(os.getenv("SESSION_FLUSH_SECONDS", "0.05"))
+SESSION_FLUSH_MAX_EVENTS = int(os.getenv("SESSION_FLUSH_MAX_EVENTS", "32"))
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "1024"))
+SESSION_STATE_MAX_BYTES = int(os.getenv("SESSION_STATE_MAX_BYTES", str(64 << 10)))
+# Workflow keys that are never dropped to bound the state
+SESSION_STATE_PROTECTED_KEYS = frozenset(
+    key.strip()
+    for key in os.getenv(
+        "SESSION_STATE_PROTECTED_KEYS",
+        "auth_in_progress,api_auth_success,classifier_result,pending_request",
+    ).split(",")
+    if key.strip()
+)
+SESSION_FLUSH_RETRY_MAX_SECONDS = float(
+    os.getenv("SESSION_FLUSH_RETRY_MAX_SECONDS", "5")
+)
+# Commit attempts of `close()` before the pending events are given up
+SESSION_CLOSE_FLUSH_ATTEMPTS = 5
+SQLITE_BUSY_TIMEOUT_SECONDS = 30.0
+
+SessionKey = Tuple[str, str, str]
+# (session version, app state version, user state version)
+VersionToken = Tuple[int, int, int]
+StateBound = Callable[[Dict[str, Any]], Tuple[Dict[str, Any], List[str]]]
+
+
+class StoredSession(NamedTuple):
+    state: Dict[str, Any]  # with the `app:` / `user:` keys merged in
+    token: VersionToken
+    last_update_time: float
+    last_seq: int
+    # (seq, event JSON) after the requested seq, in event order
+    events: List[Tuple[int, str]]
+
+
+class Batch:
+    """Events and state deltas of one session waiting to be committed."""
+
+    def __init__(self):
+        self.events: List[Tuple[float, str]] = []  # (timestamp, event JSON)
+        self.state_delta: Dict[str, Any] = {}
+        self.app_delta: Dict[str, Any] = {}
+        self.user_delta: Dict[str, Any] = {}
+        self.last_update_time = 0.0
+
+    def add(self, event: Event) -> None:
+        self.events.append((event.timestamp, event.model_dump_json(exclude_none=True)))
+        for key, value in (event.actions.state_delta or {}).items():
+            if key.startswith(State.TEMP_PREFIX):
+                continue
+            if key.startswith(State.APP_PREFIX):
+                self.app_delta[key.removeprefix(State.APP_PREFIX)] = value
+            elif key.startswith(State.USER_PREFIX):
+                self.user_delta[key.removeprefix(State.USER_PREFIX)] = value
+            else:
+                self.state_delta[key] = value
+        self.last_update_time = event.timestamp
+
+    def merge(self, later: "Batch") -> None:
+        self.events += later.events
+        self.state_delta.update(later.state_delta)
+        self.app_delta.update(later.app_delta)
+        self.user_delta.update(later.user_delta)
+        self.last_update_time = later.last_update_time or self.last_update_time
+
+
+def state_size(state: Dict[str, Any]) -> int:
+    return len(json.dumps(state, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+def bound_state(
+    state: Dict[str, Any],
+    max_bytes: int = SESSION_STATE_MAX_BYTES,
+    protected_keys=SESSION_STATE_PROTECTED_KEYS,
+) -> Tuple[Dict[str, Any], List[str]]:
+    """(`state` within `max_bytes`, dropped keys), dropping the largest values first."""
+    if max_bytes <= 0 or state_size(state) <= max_bytes:
+        return state, []
+    state = dict(state)
+    sizes = sorted(
+        ((state_size({k: v}), k) for k, v in state.items() if k not in protected_keys),
+        reverse=True,
+    )
+    dropped = []
+    for _, key in sizes:
+        if state_size(state) <= max_bytes:
+            break
+        del state[key]
+        dropped.append(key)
+    return state, dropped
+
+
+class SessionStore:
+    """Shared storage behind CachedSessionService (blocking calls, run in threads)."""
+
+    def create(
+        self, key: SessionKey, state: Dict[str, Any], update_time: float
+    ) -> StoredSession:
+        raise NotImplementedError
+
+    def version(self, key: SessionKey) -> Optional[VersionToken]:
+        """Current version token of the session, or None if it does not exist."""
+        raise NotImplementedError
+
+    def load(self, key: SessionKey, after_seq: int = 0) -> Optional[StoredSession]:
+        """The session with its events after `after_seq`, or None."""
+        raise NotImplementedError
+
+    def commit(
+        self, key: SessionKey, batch: Batch, bound: StateBound
+    ) -> Optional[Tuple[VersionToken, VersionToken, int, List[str]]]:
+        """
+        Append the batch's events and merge its deltas in one transaction.
+
+        Returns (token before, token after, last event seq, keys dropped by
+        `bound`), or None if the session no longer exists.
+        """
+        raise NotImplementedError
+
+    def list(self, app_name: str, user_id: str) -> List[Tuple[str, float]]:
+        """(session id, last update time) of the user's sessions."""
+        raise NotImplementedError
+
+    def delete(self, key: SessionKey) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    last_seq INTEGER NOT NULL,
+    update_time REAL NOT NULL,
+    PRIMARY KEY (app_name, user_id, id)
+);
+-- `seq` is the commit order, `timestamp` the event order
+CREATE TABLE IF NOT EXISTS events (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    timestamp REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (app_name, user_id, session_id, seq)
+);
+-- `app:` state (user_id '') and `user:` state
+CREATE TABLE IF NOT EXISTS scoped_states (
+    app_name TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    state TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    PRIMARY KEY (app_name, user_id)
+);
+"""
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+class SqliteSessionStore(SessionStore):
+    """SessionStore in one SQLite file (WAL), shared by the processes of a host."""
+
+    def __init__(self, path: str, busy_timeout: float = SQLITE_BUSY_TIMEOUT_SECONDS):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path, timeout=busy_timeout, isolation_level=None, check_same_thread=False
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SQLITE_SCHEMA)
+
+    def _scoped(self, app_name: str, user_id: str) -> Tuple[Dict[str, Any], int]:
+        row = self._conn.execute(
+            "SELECT state, version FROM scoped_states WHERE app_name=? AND user_id=?",
+            (app_name, user_id),
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else ({}, 0)
+
+    def _merge_scoped(self, app_name: str, user_id: str, delta: Dict[str, Any]) -> int:
+        state, version = self._scoped(app_name, user_id)
+        if not delta:
+            return version
+        state.update(delta)
+        self._conn.execute(
+            "INSERT OR REPLACE INTO scoped_states VALUES (?, ?, ?, ?)",
+            (app_name, user_id, _dumps(state), version + 1),
+        )
+        return version + 1
+
+    def _with_scoped(
+        self, key: SessionKey, state: Dict[str, Any], version: int
+    ) -> Tuple[Dict[str, Any], VersionToken]:
+        app_state, app_version = self._scoped(key[0], "")
+        user_state, user_version = self._scoped(key[0], key[1])
+        state = dict(state)
+        state.update({State.APP_PREFIX + k: v for k, v in app_state.items()})
+        state.update({State.USER_PREFIX + k: v for k, v in user_state.items()})
+        return state, (version, app_version, user_version)
+
+    def create(self, key, state, update_time):
+        scoped = {"app": {}, "user": {}}
+        session_state = {}
+        for k, v in (state or {}).items():
+            if k.startswith(State.APP_PREFIX):
+                scoped["app"][k.removeprefix(State.APP_PREFIX)] = v
+            elif k.startswith(State.USER_PREFIX):
+                scoped["user"][k.removeprefix(State.USER_PREFIX)] = v
+            elif not k.startswith(State.TEMP_PREFIX):
+                session_state[k] = v
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO sessions VALUES (?, ?, ?, ?, 1, 0, ?)",
+                    (*key, _dumps(session_state), update_time),
+                )
+                self._merge_scoped(key[0], "", scoped["app"])
+                self._merge_scoped(key[0], key[1], scoped["user"])
+                merged, token = self._with_scoped(key, session_state, 1)
+                self._conn.execute("COMMIT")
+            except sqlite3.IntegrityError:
+                self._conn.execute("ROLLBACK")
+                raise ValueError(f"Session {key[2]} already exists")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return StoredSession(merged, token, update_time, 0, [])
+
+    def version(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                """
+                SELECT s.version,
+                    COALESCE((SELECT version FROM scoped_states
+                        WHERE app_name=s.app_name AND user_id=''), 0),
+                    COALESCE((SELECT version FROM scoped_states
+                        WHERE app_name=s.app_name AND user_id=s.user_id), 0)
+                FROM sessions s WHERE s.app_name=? AND s.user_id=? AND s.id=?
+                """,
+                key,
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def load(self, key, after_seq=0):
+        with self._lock:
+            # One read transaction: the state and the events match
+            self._conn.execute("BEGIN")
+            try:
+                row = self._conn.execute(
+                    "SELECT state, version, last_seq, update_time FROM sessions"
+                    " WHERE app_name=? AND user_id=? AND id=?",
+                    key,
+                ).fetchone()
+                if row is None:
+                    return None
+                state, token = self._with_scoped(key, json.loads(row[0]), row[1])
+                events = self._conn.execute(
+                    "SELECT seq, event FROM events WHERE app_name=? AND user_id=?"
+                    " AND session_id=? AND seq>? ORDER BY timestamp, seq",
+                    (*key, after_seq),
+                ).fetchall()
+            finally:
+                self._conn.execute("COMMIT")
+        return StoredSession(state, token, row[3], row[2], events)
+
+    def commit(self, key, batch, bound):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT state, version, last_seq FROM sessions"
+                    " WHERE app_name=? AND user_id=? AND id=?",
+                    key,
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("ROLLBACK")
+                    return None
+                state, version, last_seq = json.loads(row[0]), row[1], row[2]
+                _, before = self._with_scoped(key, {}, version)
+                state.update(batch.state_delta)
+                state, dropped = bound(state)
+                self._conn.executemany(
+                    "INSERT INTO events (app_name, user_id, session_id, seq, event,"
+                    " timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (*key, last_seq + i, event, timestamp)
+                        for i, (timestamp, event) in enumerate(batch.events, start=1)
+                    ],
+                )
+                last_seq += len(batch.events)
+                self._conn.execute(
+                    "UPDATE sessions SET state=?, version=?, last_seq=?, update_time=?"
+                    " WHERE app_name=? AND user_id=? AND id=?",
+                    (
+                        _dumps(state),
+                        version + 1,
+                        last_seq,
+                        batch.last_update_time or time.time(),
+                        *key,
+                    ),
+                )
+                app_version = self._merge_scoped(key[0], "", batch.app_delta)
+                user_version = self._merge_scoped(key[0], key[1], batch.user_delta)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return before, (version + 1, app_version, user_version), last_seq, dropped
+
+    def list(self, app_name, user_id):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT id, update_time FROM sessions WHERE app_name=? AND user_id=?",
+                (app_name, user_id),
+            ).fetchall()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "DELETE FROM events WHERE app_name=? AND user_id=? AND session_id=?",
+                    key,
+                )
+                self._conn.execute(
+                    "DELETE FROM sessions WHERE app_name=? AND user_id=? AND id=?", key
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedEntry:
+    def __init__(self, session: Session, token: VersionToken, last_seq: int):
+        self.session = session
+        self.token = token
+        self.last_seq = last_seq
+
+
+class CachedSessionService(BaseSessionService):
+    """ADK session service over a shared SessionStore, with write batching."""
+
+    def __init__(
+        self,
+        store: SessionStore,
+        flush_seconds: float = SESSION_FLUSH_SECONDS,
+        flush_max_events: int = SESSION_FLUSH_MAX_EVENTS,
+        cache_size: int = SESSION_CACHE_SIZE,
+        max_state_bytes: int = SESSION_STATE_MAX_BYTES,
+        protected_keys=SESSION_STATE_PROTECTED_KEYS,
+    ):
+        self.store = store
+        self.flush_seconds = flush_seconds
+        self.flush_max_events = flush_max_events
+        self.cache_size = cache_size
+        self.max_state_bytes = max_state_bytes
+        self.protected_keys = frozenset(protected_keys)
+        self._cache: "OrderedDict[SessionKey, CachedEntry]" = OrderedDict()
+        self._pending: Dict[SessionKey, Batch] = {}
+        self._timers: Dict[SessionKey, asyncio.TimerHandle] = {}
+        # Consecutive failed commits per session, for the retry backoff
+        self._failures: Dict[SessionKey, int] = {}
+        self._flush_tasks = set()
+        # A session's commits run one at a time, in the order they were
+        # started; commits of different sessions do not wait for each other
+        self._flush_locks: Dict[SessionKey, asyncio.Lock] = {}
+        self._committing: Dict[SessionKey, int] = {}
+
+    def _bound(self, state: Dict[str, Any]):
+        return bound_state(state, self.max_state_bytes, self.protected_keys)
+
+    def _cache_put(self, key: SessionKey, entry: CachedEntry) -> None:
+        self._cache[key] = entry
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session_id = (session_id or "").strip() or str(uuid.uuid4())
+        key = (app_name, user_id, session_id)
+        stored = await asyncio.to_thread(self.store.create, key, state, time.time())
+        session = Session(
+            app_name=app_name,
+            user_id=user_id,
+            id=session_id,
+            state=stored.state,
+            last_update_time=stored.last_update_time,
+        )
+        self._cache_put(key, CachedEntry(session, stored.token, 0))
+        return copy.deepcopy(session)
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        key = (app_name, user_id, session_id)
+        # Read-your-writes: this worker's pending events first
+        await self.flush(key)
+        token = await asyncio.to_thread(self.store.version, key)
+        entry = self._cache.get(key)
+        if token is None:
+            self._cache.pop(key, None)
+            return None
+        if entry is not None and entry.token == token:
+            metrics.increment("session_cache_requests_total", outcome="hit")
+            self._cache.move_to_end(key)
+        else:
+            # Written by another worker (or not cached): load what is missing
+            after_seq = entry.last_seq if entry is not None else 0
+            stored = await asyncio.to_thread(self.store.load, key, after_seq)
+            if stored is None:
+                self._cache.pop(key, None)
+                return None
+            events = [Event.model_validate_json(data) for _, data in stored.events]
+            if entry is None:
+                metrics.increment("session_cache_requests_total", outcome="miss")
+                entry = CachedEntry(
+                    Session(app_name=app_name, user_id=user_id, id=session_id),
+                    stored.token,
+                    0,
+                )
+            else:
+                metrics.increment("session_cache_requests_total", outcome="stale")
+            entry.session.state = stored.state
+            entry.session.events += events
+            if events:
+                # Another worker may have committed earlier events after ours
+                entry.session.events.sort(key=lambda e: e.timestamp)
+            entry.session.last_update_time = stored.last_update_time
+            entry.token, entry.last_seq = stored.token, stored.last_seq
+            self._cache_put(key, entry)
+
+        session = copy.deepcopy(entry.session)
+        if config:
+            if config.num_recent_events:
+                session.events = session.events[-config.num_recent_events :]
+            if config.after_timestamp:
+                session.events = [
+                    e for e in session.events if e.timestamp >= config.after_timestamp
+                ]
+        return session
+
+    async def list_sessions(
+        self, *, app_name: str, user_id: str
+    ) -> ListSessionsResponse:
+        rows = await asyncio.to_thread(self.store.list, app_name, user_id)
+        return ListSessionsResponse(
+            sessions=[
+                Session(
+                    app_name=app_name,
+                    user_id=user_id,
+                    id=session_id,
+                    last_update_time=update_time,
+                )
+                for session_id, update_time in rows
+            ]
+        )
+
+    async def delete_session(
+        self, *, app_name: str, user_id: str, session_id: str
+    ) -> None:
+        key = (app_name, user_id, session_id)
+        self._pending.pop(key, None)
+        self._failures.pop(key, None)
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        self._cache.pop(key, None)
+        await asyncio.to_thread(self.store.delete, key)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        await super().append_event(session=session, event=event)
+        session.last_update_time = event.timestamp
+        key = (session.app_name, session.user_id, session.id)
+        batch = self._pending.setdefault(key, Batch())
+        batch.add(event)
+        entry = self._cache.get(key)
+        if entry is not None:
+            # Same view as the store will have once the batch is committed
+            await BaseSessionService.append_event(self, entry.session, event)
+            entry.session.last_update_time = event.timestamp
+        if event.is_final_response() or len(batch.events) >= self.flush_max_events:
+            # Other workers see the turn as soon as its answer is out
+            await self.flush(key)
+        else:
+            self._schedule_flush(key, self.flush_seconds)
+        return event
+
+    def _schedule_flush(self, key: SessionKey, delay: float) -> None:
+        if key not in self._timers:
+            self._timers[key] = asyncio.get_running_loop().call_later(
+                delay, self._flush_soon, key
+            )
+
+    def _flush_soon(self, key: SessionKey) -> None:
+        task = asyncio.ensure_future(self.flush(key))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush(self, key: Optional[SessionKey] = None) -> None:
+        """Commit the pending events of one session (all sessions if None)."""
+        keys = [key] if key is not None else list(self._pending)
+        for key in keys:
+            timer = self._timers.pop(key, None)
+            if timer is not None:
+                timer.cancel()
+            batch = self._pending.pop(key, None)
+            if batch is None:
+                if self._committing.get(key):
+                    # A timer's commit of this session is still running
+                    async with self._flush_locks[key]:
+                        pass
+                continue
+            self._committing[key] = self._committing.get(key, 0) + 1
+            lock = self._flush_locks.setdefault(key, asyncio.Lock())
+            async with lock:
+                started = time.perf_counter()
+                try:
+                    result = await asyncio.to_thread(
+                        self.store.commit, key, batch, self._bound
+                    )
+                except Exception as e:
+                    failures = self._failures.get(key, 0) + 1
+                    self._failures[key] = failures
+                    delay = min(
+                        self.flush_seconds * 2**failures,
+                        SESSION_FLUSH_RETRY_MAX_SECONDS,
+                    )
+                    logging.error(
+                        f"[CachedSessionService] Commit of {len(batch.events)} events failed, retrying in {delay:.2f}s: {e}"
+                    )
+                    metrics.increment("session_flush_total", outcome="error")
+                    if key in self._pending:
+                        batch.merge(self._pending[key])
+                    self._pending[key] = batch
+                    self._schedule_flush(key, delay)
+                    continue
+                finally:
+                    self._committing[key] -= 1
+                    if not self._committing[key]:
+                        del self._committing[key]
+                        del self._flush_locks[key]
+                self._failures.pop(key, None)
+                metrics.observe(
+                    "session_flush_ms", (time.perf_counter() - started) * 1000
+                )
+                metrics.observe("session_flush_events", len(batch.events))
+            entry = self._cache.get(key)
+            if result is None:
+                logging.warning(
+                    f"[CachedSessionService] Session {key[2]} was deleted, dropping {len(batch.events)} events"
+                )
+                metrics.increment("session_flush_total", outcome="deleted")
+                self._cache.pop(key, None)
+                continue
+            metrics.increment("session_flush_total", outcome="ok")
+            before, after, last_seq, dropped = result
+            if dropped:
+                logging.warning(
+                    f"[CachedSessionService] Session {key[2]} state over {self.max_state_bytes} bytes, dropped {dropped}"
+                )
+                metrics.increment("session_state_trimmed_total", len(dropped))
+            if entry is None:
+                continue
+            if entry.token == before and entry.last_seq + len(batch.events) == last_seq:
+                # Nobody else wrote: the cached copy already has this batch
+                entry.token, entry.last_seq = after, last_seq
+                for k in dropped:
+                    entry.session.state.pop(k, None)
+            else:
+                self._cache.pop(key, None)
+
+    async def close(self) -> None:
+        """Commit everything pending (retrying failed commits), then close the store."""
+        for attempt in range(SESSION_CLOSE_FLUSH_ATTEMPTS):
+            if self._flush_tasks:
+                await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+            await self.flush()
+            if not self._pending:
+                break
+            await asyncio.sleep(
+                min(self.flush_seconds * 2**attempt, SESSION_FLUSH_RETRY_MAX_SECONDS)
+            )
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+        if self._pending:
+            lost = sum(len(batch.events) for batch in self._pending.values())
+            logging.error(
+                f"[CachedSessionService] Closing with {lost} uncommitted events of {len(self._pending)} sessions"
+            )
+            metrics.increment("session_events_lost_total", lost)
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        await asyncio.to_thread(self.store.close)
+
+
+def session_service_from_env(url: Optional[str] = None) -> BaseSessionService:
+    """Session service for SESSION_STORE_URL (or `url`)."""
+    url = SESSION_STORE_URL if url is None else url
+    if not url or url == "memory":
+        return InMemorySessionService()
+    if url.startswith("sqlite:///"):
+        path = url[len("sqlite:///") :]
+        logging.info(f"[session_store] SQLite session store at {path}")
+        return CachedSessionService(SqliteSessionStore(path))
+    from google.adk.sessions import DatabaseSessionService
+
+    return DatabaseSessionService(db_url=url)
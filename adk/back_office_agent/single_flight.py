@@ -0,0 +1,94 @@
+"""
+Single-flight coalescing of identical concurrent tool calls.
+
+While a tool call is in flight, further calls of the same tool with the same
+canonical arguments (see `tool_cache.canonicalize_args`) from any session
+wait for it instead of going to the backend again, and all receive its result
+(or its exception). A shared result is deep-copied for each caller, like in
+ToolResultCache, so a callback mutating its result never changes another's. The backend call runs in its own task: a caller being
+cancelled only stops that caller from waiting, and the call itself is
+cancelled once nobody waits for it any more.
+
+`tool_coalesce_calls_total{outcome=leader|shared}` counts calls that went to
+the backend / joined one in flight (coalescing ratio = shared / all), and
+`tool_coalesce_waiters` the callers served per backend call.
+TOOL_COALESCING=false sends every call to the backend.
+"""
+
+import asyncio
+import copy
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .metrics import metrics
+from .tool_cache import canonicalize_args
+
+TOOL_COALESCING = os.getenv("TOOL_COALESCING", "true").lower() == "true"
+
+
+class _Flight:
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+        self.callers = 0
+
+
+class SingleFlight:
+    """In-flight tool calls of one backend, keyed on tool name + canonical args."""
+
+    def __init__(self, backend: str, enabled: bool = TOOL_COALESCING):
+        self.backend = backend
+        self.enabled = enabled
+        self._flights: Dict[Tuple[str, str], _Flight] = {}
+
+    def in_flight(self) -> int:
+        return len(self._flights)
+
+    async def call(
+        self,
+        tool_name: str,
+        args: Optional[Dict[str, Any]],
+        call: Callable[[], Awaitable[Any]],
+    ) -> Tuple[Any, bool]:
+        """Result of `call()` (or of the identical call in flight), and whether it was shared."""
+        if not self.enabled:
+            return await call(), False
+        key = (tool_name, canonicalize_args(args))
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if flight is None:
+            flight = _Flight(asyncio.ensure_future(call()))
+            self._flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._finish(key, flight))
+        metrics.increment(
+            "tool_coalesce_calls_total",
+            tool=tool_name,
+            backend=self.backend,
+            outcome="shared" if shared else "leader",
+        )
+        flight.waiters += 1
+        flight.callers += 1
+        try:
+            result = await asyncio.shield(flight.task)
+            # Every caller has joined once the task is done
+            if flight.callers > 1:
+                result = copy.deepcopy(result)
+            return result, shared
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Every caller gave up: nobody needs the backend call any more,
+                # and a new caller must not join the cancelled one
+                flight.task.cancel()
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    def _finish(self, key, flight: _Flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.cancelled():
+            # Retrieved here so a call nobody waits for does not log a warning
+            flight.task.exception()
+        metrics.observe(
+            "tool_coalesce_waiters", flight.callers, backend=self.backend, tool=key[0]
+        )
@@ -0,0 +1,126 @@
+"""
+Speculative execution of a downstream agent.
+
+A `SpeculativeBranch` runs an agent in the background on a *fork* of the
+invocation context while `ClassifierAgent` is still deciding. The fork has a
+deep copy of the session, so the branch sees its own tool calls and state
+writes (e.g. `response_text`) but nothing reaches the real session until the
+branch is committed and its buffered events are yielded through the runner.
+A cancelled branch is simply dropped together with its fork.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import List, Optional
+
+from google.adk.agents.base_agent import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event
+from google.adk.sessions.state import State
+
+from .metrics import metrics
+from .utils import event_token_count
+
+SPECULATIVE_EXECUTION = os.getenv("SPECULATIVE_EXECUTION", "false").lower() == "true"
+
+
+def fork_invocation_context(ctx: InvocationContext) -> InvocationContext:
+    """Copy of `ctx` whose session can be mutated without touching the original."""
+    return ctx.model_copy(update={"session": ctx.session.model_copy(deep=True)})
+
+
+class SpeculativeBranch:
+    """Background run of `agent` whose events are buffered until committed."""
+
+    def __init__(self, agent: BaseAgent, ctx: InvocationContext):
+        self.agent = agent
+        self._ctx = fork_invocation_context(ctx)
+        self._events: List[Event] = []
+        self._task: Optional[asyncio.Task] = None
+        self._started_at = 0.0
+        self._finished_at: Optional[float] = None
+        self._settled = False
+
+    def start(self) -> "SpeculativeBranch":
+        logging.info(f"[SpeculativeBranch] Starting {self.agent.name} speculatively")
+        metrics.increment("speculative_branch_total", agent=self.agent.name)
+        self._started_at = time.perf_counter()
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def _run(self):
+        try:
+            async for event in self.agent.run_async(self._ctx):
+                self._events.append(event)
+                self._apply_to_fork(event)
+        finally:
+            self._finished_at = time.perf_counter()
+
+    def _apply_to_fork(self, event: Event):
+        # Mirrors what the session service does on append_event, but on the fork
+        if event.partial:
+            return
+        if event.actions and event.actions.state_delta:
+            for key, value in event.actions.state_delta.items():
+                if not key.startswith(State.TEMP_PREFIX):
+                    self._ctx.session.state[key] = value
+        self._ctx.session.events.append(event)
+
+    @property
+    def tokens_used(self) -> int:
+        return sum(event_token_count(e) for e in self._events)
+
+    async def commit(self) -> Optional[List[Event]]:
+        """Wait for the branch and hand over its buffered events (None if it failed)."""
+        decided_at = time.perf_counter()
+        self._settled = True
+        try:
+            await self._task
+        except Exception as e:
+            logging.warning(f"[SpeculativeBranch] {self.agent.name} failed: {e}")
+            metrics.increment(
+                "speculative_branch_outcome_total",
+                agent=self.agent.name,
+                outcome="failed",
+            )
+            return None
+        # Time the branch already ran while the classifier was still deciding
+        saved_ms = (min(decided_at, self._finished_at) - self._started_at) * 1000
+        metrics.increment(
+            "speculative_branch_outcome_total", agent=self.agent.name, outcome="win"
+        )
+        metrics.observe("speculative_saved_latency_ms", saved_ms, agent=self.agent.name)
+        logging.info(
+            f"[SpeculativeBranch] {self.agent.name} won, saved {saved_ms:.1f}ms, {len(self._events)} events"
+        )
+        return list(self._events)
+
+    async def cancel(self) -> None:
+        """Cancel the branch and discard everything it produced."""
+        if self._task is None or self._settled:
+            return
+        self._settled = True
+        if not self._task.done():
+            self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logging.warning(f"[SpeculativeBranch] {self.agent.name} failed: {e}")
+        # Tokens of an LLM call interrupted mid-flight are not reported back
+        wasted_tokens = self.tokens_used
+        metrics.increment(
+            "speculative_branch_outcome_total",
+            agent=self.agent.name,
+            outcome="cancelled",
+        )
+        metrics.increment(
+            "speculative_wasted_tokens_total", wasted_tokens, agent=self.agent.name
+        )
+        logging.info(
+            f"[SpeculativeBranch] {self.agent.name} cancelled, discarded {len(self._events)} events ({wasted_tokens} tokens)"
+        )
+        self._events.clear()
@@ -0,0 +1,578 @@
+"""
+In-process station / geo index of the parking index.
+
+With STATION_INDEX=true, the parking documents are exported from ES_URL
+(`search_after` pages of the fields ParkingAgent asks for, plus
+`nearbyStations`, `location` and `updatedAt`) into memory:
+
+- station names, normalized (NFKC, case, hiragana -> katakana, ヶ -> ケ, no
+  `駅` suffix or parenthesized qualifiers) and their readings from
+  STATION_READINGS_PATH (`{"保谷": ["ほうや", "hoya"]}`), so furigana and
+  romaji spellings find the same parking lots;
+- `location` points in a shapely STRtree for radius lookups.
+
+ParkingAgent's `before_tool_callback` answers `search` calls made only of
+station `match_phrase` (the query compiler's output) and `location`
+`geo_distance` clauses from memory, in the Elastic MCP server's result
+format, instead of an Elasticsearch round trip. Hits are ranked by walking
+time / distance to the station, or by distance to the point. Any other query,
+or an index not refreshed for STATION_INDEX_MAX_STALENESS_SECONDS, goes to
+Elasticsearch as before.
+
+Documents changed since the last `updatedAt` are re-exported every
+STATION_INDEX_REFRESH_SECONDS; a full export (which also drops deleted
+documents) runs every STATION_INDEX_FULL_REFRESH_SECONDS.
+"""
+
+import asyncio
+import json
+import logging
+import math
+import os
+import re
+import time
+import unicodedata
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import aiohttp
+import numpy as np
+from shapely import STRtree, box, points
+
+from .es_search import ElasticsearchClient, ElasticsearchError, format_search_result
+from .metrics import metrics
+from .query_compiler import (
+    PARKING_INDEX,
+    SEARCH_TOOL_NAME,
+    SOURCE_EXTRA_FIELDS,
+    STATION_FIELD,
+)
+from .schema import get_schema
+from .tracing import set_tool_result, span
+
+STATION_INDEX = os.getenv("STATION_INDEX", "false").lower() == "true"
+STATION_INDEX_REFRESH_SECONDS = float(os.getenv("STATION_INDEX_REFRESH_SECONDS", "300"))
+STATION_INDEX_FULL_REFRESH_SECONDS = float(
+    os.getenv("STATION_INDEX_FULL_REFRESH_SECONDS", "86400")
+)
+STATION_INDEX_MAX_STALENESS_SECONDS = float(
+    os.getenv("STATION_INDEX_MAX_STALENESS_SECONDS", "900")
+)
+STATION_READINGS_PATH = os.getenv("STATION_READINGS_PATH")
+STATION_INDEX_PAGE_SIZE = 1000
+# Exported on top of the fields ParkingAgent asks for (ranking, refresh)
+INDEX_FIELDS = ["nearbyStations", "location", "updatedAt"]
+UPDATED_AT_FIELD = "updatedAt"
+LOCATION_FIELD = "location"
+EARTH_RADIUS_M = 6371008.8
+# Elasticsearch's default `size`
+DEFAULT_SIZE = 10
+
+_QUALIFIER_PATTERN = re.compile(r"[(（][^)）]*[)）]")
+_SPACE_PATTERN = re.compile(r"\s+")
+_DISTANCE_PATTERN = re.compile(r"^\s*([\d.]+)\s*(m|km|mi|miles|yd|ft)?\s*$")
+_DISTANCE_UNITS_M = {"m": 1.0, "km": 1000.0, "mi": 1609.344, "miles": 1609.344}
+_DISTANCE_UNITS_M.update({"yd": 0.9144, "ft": 0.3048})
+
+
+def normalize_station(name: str) -> str:
+    """Key of a station name: width, case and kana insensitive, no `駅`."""
+    text = unicodedata.normalize("NFKC", name or "").lower()
+    text = _SPACE_PATTERN.sub("", _QUALIFIER_PATTERN.sub("", text))
+    # Hiragana -> katakana, so furigana in either script match
+    text = "".join(
+        chr(ord(c) + 0x60) if "ぁ" <= c <= "ゖ" else c for c in text
+    ).replace("ヶ", "ケ")
+    if len(text) > 1 and text.endswith("駅"):
+        text = text[:-1]
+    return text
+
+
+def load_readings(path: Optional[str] = STATION_READINGS_PATH) -> Dict[str, List[str]]:
+    """Station name -> readings (furigana, romaji) from a JSON file."""
+    if not path:
+        return {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            return {name: list(readings) for name, readings in json.load(f).items()}
+    except (OSError, ValueError, AttributeError, TypeError) as e:
+        logging.warning(f"[StationIndex] Ignoring station readings {path}: {e}")
+        return {}
+
+
+def parse_geo_point(value) -> Optional[Tuple[float, float]]:
+    """(lat, lon) of an Elasticsearch geo_point value, None when malformed."""
+    try:
+        if isinstance(value, dict):
+            lat, lon = float(value["lat"]), float(value["lon"])
+        elif isinstance(value, str):
+            lat, lon = (float(v) for v in value.split(","))
+        elif isinstance(value, (list, tuple)):
+            lon, lat = float(value[0]), float(value[1])
+        else:
+            return None
+    except (KeyError, ValueError, TypeError, IndexError):
+        return None
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+def parse_distance(value) -> Optional[float]:
+    """Meters of a `geo_distance` distance (`500m`, `1.5km`, `800`)."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _DISTANCE_PATTERN.match(str(value))
+    if not match:
+        return None
+    return float(match.group(1)) * _DISTANCE_UNITS_M[match.group(2) or "m"]
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters (vectorized over NumPy arrays)."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
+
+
+def filter_source(source: Dict[str, Any], paths: Iterable[str]) -> Dict[str, Any]:
+    """`source` restricted to dotted `paths`, like `_source` includes."""
+    paths = list(paths)
+    filtered = {}
+    for key, value in source.items():
+        if key in paths:
+            filtered[key] = value
+            continue
+        sub_paths = [p[len(key) + 1 :] for p in paths if p.startswith(key + ".")]
+        if not sub_paths:
+            continue
+        if isinstance(value, dict):
+            value = filter_source(value, sub_paths)
+        elif isinstance(value, list):
+            value = [
+                item
+                for item in (
+                    filter_source(v, sub_paths) for v in value if isinstance(v, dict)
+                )
+                if item
+            ]
+        else:
+            continue
+        if value:
+            filtered[key] = value
+    return filtered
+
+
+def _covers(exported: Iterable[str], path: str) -> bool:
+    return any(path == e or path.startswith(e + ".") for e in exported)
+
+
+_RANGE_OPS = {
+    "gt": lambda v, b: v > b,
+    "gte": lambda v, b: v >= b,
+    "lt": lambda v, b: v < b,
+    "lte": lambda v, b: v <= b,
+}
+
+
+def _values(source, path: str) -> List[Any]:
+    """Leaf values at a dotted path, through objects and arrays."""
+    values = [source]
+    for key in path.split("."):
+        found = []
+        for value in values:
+            for item in value if isinstance(value, list) else [value]:
+                if isinstance(item, dict) and key in item:
+                    found.append(item[key])
+        values = found
+    return [
+        v for value in values for v in (value if isinstance(value, list) else [value])
+    ]
+
+
+def _in_range(source, path: str, bounds: Dict[str, float]) -> bool:
+    return any(
+        isinstance(v, (int, float))
+        and all(_RANGE_OPS[op](v, b) for op, b in bounds.items())
+        for v in _values(source, path)
+    )
+
+
+def _sort_key(value) -> float:
+    return float(value) if isinstance(value, (int, float)) else math.inf
+
+
+class StationIndex:
+    """Parking documents by station name and location, exported from Elasticsearch."""
+
+    def __init__(
+        self,
+        client: Optional[ElasticsearchClient] = None,
+        readings: Optional[Dict[str, List[str]]] = None,
+        refresh_seconds: float = STATION_INDEX_REFRESH_SECONDS,
+        full_refresh_seconds: float = STATION_INDEX_FULL_REFRESH_SECONDS,
+        max_staleness: float = STATION_INDEX_MAX_STALENESS_SECONDS,
+        enabled: bool = STATION_INDEX,
+    ):
+        self.client = client
+        self.readings = readings if readings is not None else load_readings()
+        self.refresh_seconds = refresh_seconds
+        self.full_refresh_seconds = full_refresh_seconds
+        self.max_staleness = max_staleness
+        self.enabled = enabled
+        self.fields: List[str] = []
+        # id -> exported `_source`
+        self._docs: Dict[Any, Dict[str, Any]] = {}
+        # station key -> id -> (walking time, distance) of the closest entry
+        self._stations: Dict[str, Dict[Any, Tuple[float, float]]] = {}
+        self._aliases: Dict[str, Set[str]] = {}
+        self._lookups: Dict[str, List[Tuple[Any, float, float]]] = {}
+        self._tree: Optional[STRtree] = None
+        self._tree_ids: List[Any] = []
+        self._tree_coords = np.empty((0, 2))
+        self._watermark: Optional[int] = None
+        self._refreshed_at = 0.0
+        self._full_at = 0.0
+        self._last_attempt = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def size(self) -> int:
+        return len(self._docs)
+
+    def fresh(self) -> bool:
+        return (
+            self._full_at > 0
+            and time.monotonic() - self._refreshed_at <= self.max_staleness
+        )
+
+    # Lookups
+
+    def lookup_station(self, name: str) -> List[Tuple[Any, float, float]]:
+        """(id, walking time, distance) of parking lots near `name`, closest first."""
+        query = normalize_station(name)
+        if query not in self._lookups:
+            ranked = {}
+            for key in self._station_keys(query):
+                for doc_id, rank in self._stations[key].items():
+                    if doc_id not in ranked or rank < ranked[doc_id]:
+                        ranked[doc_id] = rank
+            # Kept until the next refresh: popular stations are asked for all day
+            self._lookups[query] = sorted(
+                ((doc_id, *rank) for doc_id, rank in ranked.items()),
+                key=lambda hit: (hit[1], hit[2], str(hit[0])),
+            )
+        return self._lookups[query]
+
+    def within(
+        self, lat: float, lon: float, radius_m: float
+    ) -> List[Tuple[Any, float]]:
+        """(id, meters) of parking lots within `radius_m` of a point, closest first."""
+        if self._tree is None or radius_m < 0:
+            return []
+        dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+        dlon = dlat / max(math.cos(math.radians(lat)), 1e-6)
+        candidates = self._tree.query(
+            box(lon - dlon, lat - dlat, lon + dlon, lat + dlat)
+        )
+        if len(candidates) == 0:
+            return []
+        coords = self._tree_coords[candidates]
+        meters = haversine_m(lat, lon, coords[:, 1], coords[:, 0])
+        order = np.argsort(meters, kind="stable")
+        return [
+            (self._tree_ids[candidates[i]], float(meters[i]))
+            for i in order
+            if meters[i] <= radius_m
+        ]
+
+    def summary(self, doc_id, fields: Iterable[str]) -> Dict[str, Any]:
+        return filter_source(self._docs[doc_id], fields)
+
+    def _station_keys(self, query: str) -> Set[str]:
+        if not query:
+            return set()
+        # match_phrase on the analyzed name also finds it inside longer names
+        keys = {key for key in self._stations if query in key}
+        return keys | self._aliases.get(query, set())
+
+    # Search calls
+
+    def search(self, query_body: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Search response for `query_body`, or None when it needs Elasticsearch."""
+        if not isinstance(query_body, dict) or set(query_body) - {
+            "query",
+            "_source",
+            "size",
+            "from",
+            "track_total_hits",
+        }:
+            return None
+        fields = query_body.get("_source")
+        if isinstance(fields, str):
+            fields = [fields]
+        if not isinstance(fields, list) or not fields:
+            return None
+        if any("*" in f or not _covers(self.fields, f) for f in fields):
+            return None
+        try:
+            start = max(int(query_body.get("from") or 0), 0)
+            size = max(int(query_body.get("size", DEFAULT_SIZE)), 0)
+        except (TypeError, ValueError):
+            return None
+        clauses = self._clauses(query_body.get("query"))
+        if not clauses:
+            return None
+        ranking = [c for c in clauses if c[0] != "range"]
+        if not ranking:
+            return None
+        # The first station / geo clause decides the order, the others filter
+        ranked = self._ranked(*ranking[0])
+        for kind, value in ranking[1:]:
+            allowed = {doc_id for doc_id, *_ in self._ranked(kind, value)}
+            ranked = [hit for hit in ranked if hit[0] in allowed]
+        for _, (path, bounds) in (c for c in clauses if c[0] == "range"):
+            ranked = [
+                hit for hit in ranked if _in_range(self._docs[hit[0]], path, bounds)
+            ]
+        return {
+            "hits": {
+                "total": {"value": len(ranked)},
+                "hits": [
+                    {"_source": self.summary(doc_id, fields)}
+                    for doc_id, *_ in ranked[start : start + size]
+                ],
+            }
+        }
+
+    def _ranked(self, kind: str, value) -> List[tuple]:
+        if kind == "station":
+            return self.lookup_station(value)
+        return self.within(*value)
+
+    def _clauses(self, query, nested: Optional[str] = None):
+        """Station / geo / range clauses of a query made only of those, else None."""
+        if not isinstance(query, dict) or len(query) != 1:
+            return None
+        ((kind, body),) = query.items()
+        if not isinstance(body, dict):
+            return None
+        if kind == "bool" and nested is None:
+            if set(body) - {"must", "filter"}:
+                return None
+            clauses = []
+            for occur in ("must", "filter"):
+                items = body.get(occur) or []
+                for item in items if isinstance(items, list) else [items]:
+                    parsed = self._clauses(item)
+                    if parsed is None:
+                        return None
+                    clauses += parsed
+            return clauses or None
+        if kind == "nested" and nested is None:
+            if set(body) - {"path", "query"} or not isinstance(body.get("path"), str):
+                return None
+            # One clause per nested query: "any element matches" is then exact
+            return self._clauses(body.get("query"), nested=body["path"])
+        if kind == "match_phrase":
+            value = body.get(STATION_FIELD)
+            if isinstance(value, dict):
+                value = value.get("query")
+            if len(body) != 1 or not isinstance(value, str) or not value.strip():
+                return None
+            if nested not in (None, STATION_FIELD.rsplit(".", 1)[0]):
+                return None
+            return [("station", value)]
+        if kind == "geo_distance" and nested is None:
+            if set(body) - {"distance", LOCATION_FIELD, "distance_type"}:
+                return None
+            point = parse_geo_point(body.get(LOCATION_FIELD))
+            radius = parse_distance(body.get("distance"))
+            if point is None or radius is None:
+                return None
+            return [("geo", (point[0], point[1], radius))]
+        if kind == "range" and len(body) == 1:
+            ((path, bounds),) = body.items()
+            if nested is not None and not path.startswith(nested + "."):
+                return None
+            if not _covers(self.fields, path) or not isinstance(bounds, dict):
+                return None
+            if (
+                not bounds
+                or set(bounds) - set(_RANGE_OPS)
+                or not all(
+                    isinstance(v, (int, float)) and not isinstance(v, bool)
+                    for v in bounds.values()
+                )
+            ):
+                return None
+            return [("range", (path, bounds))]
+        return None
+
+    async def before_tool_callback(self, tool, args, tool_context):
+        """Answer a parking `search` from memory when the index can (after validation)."""
+        if not self.enabled or tool.name != SEARCH_TOOL_NAME:
+            return None
+        if (args or {}).get("index") != PARKING_INDEX:
+            return None
+        self.maybe_refresh()
+        if not self.fresh():
+            metrics.increment("station_index_requests_total", outcome="stale")
+            return None
+        started = time.perf_counter()
+        response = self.search(args.get("queryBody"))
+        if response is None:
+            metrics.increment("station_index_requests_total", outcome="unsupported")
+            return None
+        with span(
+            f"tool [{tool.name}]", tool__name=tool.name, tool__backend="station_index"
+        ) as current:
+            result = format_search_result(response, args["queryBody"].get("from") or 0)
+            set_tool_result(current, result)
+        metrics.observe(
+            "station_index_lookup_ms", (time.perf_counter() - started) * 1000
+        )
+        metrics.increment("station_index_requests_total", outcome="hit")
+        return result
+
+    # Refresh
+
+    def export_fields(self) -> List[str]:
+        fields = SOURCE_EXTRA_FIELDS + list(get_schema().default_fields)
+        exported = []
+        for field in fields + INDEX_FIELDS:
+            if not _covers(exported, field):
+                exported = [e for e in exported if not _covers([field], e)]
+                exported.append(field)
+        return exported
+
+    async def refresh(self, full: bool = False) -> int:
+        """Export the documents changed since the last `updatedAt` (all when `full`)."""
+        if self.client is None:
+            self.client = ElasticsearchClient()
+        full = full or self._watermark is None or not self._full_at
+        fields = self.export_fields() if full else self.fields
+        query = {"match_all": {}}
+        if not full:
+            query = {
+                "range": {
+                    UPDATED_AT_FIELD: {"gte": self._watermark, "format": "epoch_millis"}
+                }
+            }
+        body = {
+            "query": query,
+            "_source": fields,
+            "size": STATION_INDEX_PAGE_SIZE,
+            "sort": [{UPDATED_AT_FIELD: "asc"}, {"id": "asc"}],
+        }
+        docs, watermark = {}, None if full else self._watermark
+        while True:
+            page = await self.client.search(
+                PARKING_INDEX, body, "hits.hits._source,hits.hits.sort"
+            )
+            hits = (page.get("hits") or {}).get("hits") or []
+            for hit in hits:
+                source = hit.get("_source") or {}
+                if source.get("id") is None:
+                    continue
+                docs[source["id"]] = source
+                sort = hit.get("sort") or []
+                if source.get(UPDATED_AT_FIELD) is not None and sort:
+                    watermark = max(watermark or 0, int(sort[0]))
+            if len(hits) < STATION_INDEX_PAGE_SIZE or not hits[-1].get("sort"):
+                break
+            body["search_after"] = hits[-1]["sort"]
+        await self._apply(docs, fields, full)
+        self._watermark = watermark
+        now = time.monotonic()
+        self._refreshed_at = now
+        if full:
+            self._full_at = now
+        metrics.set_gauge("station_index_documents", len(self._docs))
+        metrics.set_gauge("station_index_stations", len(self._stations))
+        logging.info(
+            f"[StationIndex] {'Full' if full else 'Incremental'} refresh: {len(docs)} documents, {len(self._docs)} indexed"
+        )
+        return len(docs)
+
+    async def _apply(self, docs: Dict[Any, Dict[str, Any]], fields, full: bool):
+        merged = docs if full else {**self._docs, **docs}
+        built = await asyncio.to_thread(self._build, merged)
+        # Swapped together, between two lookups of the event loop
+        self._docs = merged
+        self._stations, self._aliases, self._tree, self._tree_ids, self._tree_coords = (
+            built
+        )
+        self._lookups = {}
+        self.fields = list(fields)
+
+    def _build(self, docs: Dict[Any, Dict[str, Any]]):
+        stations: Dict[str, Dict[Any, Tuple[float, float]]] = {}
+        for doc_id, source in docs.items():
+            entries = source.get("nearbyStations") or []
+            for entry in entries if isinstance(entries, list) else [entries]:
+                if not isinstance(entry, dict) or not entry.get("name"):
+                    continue
+                rank = (
+                    _sort_key(entry.get("walkingTime")),
+                    _sort_key(entry.get("distance")),
+                )
+                by_doc = stations.setdefault(normalize_station(entry["name"]), {})
+                if doc_id not in by_doc or rank < by_doc[doc_id]:
+                    by_doc[doc_id] = rank
+        aliases: Dict[str, Set[str]] = {}
+        for name, readings in self.readings.items():
+            key = normalize_station(name)
+            if key in stations:
+                for reading in readings:
+                    aliases.setdefault(normalize_station(reading), set()).add(key)
+        ids, coords = [], []
+        for doc_id, source in docs.items():
+            point = parse_geo_point(source.get(LOCATION_FIELD))
+            if point is not None:
+                ids.append(doc_id)
+                coords.append((point[1], point[0]))
+        coords = np.array(coords, dtype=float).reshape(-1, 2)
+        tree = STRtree(points(coords[:, 0], coords[:, 1])) if ids else None
+        return stations, aliases, tree, ids, coords
+
+    def maybe_refresh(self):
+        """Start a background refresh when an interval has elapsed (non-blocking)."""
+        if not self.enabled or (self._task and not self._task.done()):
+            return
+        now = time.monotonic()
+        if now - self._last_attempt < min(self.refresh_seconds, 30):
+            return
+        full = not self._full_at or now - self._full_at >= self.full_refresh_seconds
+        if not full and now - self._refreshed_at < self.refresh_seconds:
+            return
+        self._last_attempt = now
+        self._task = asyncio.create_task(self._refresh_logged(full))
+
+    async def _refresh_logged(self, full: bool):
+        kind = "full" if full else "incremental"
+        try:
+            await self.refresh(full=full)
+            metrics.increment("station_index_refresh_total", kind=kind, outcome="ok")
+        except (ElasticsearchError, aiohttp.ClientError, TimeoutError, ValueError) as e:
+            metrics.increment("station_index_refresh_total", kind=kind, outcome="error")
+            logging.warning(f"[StationIndex] {kind.capitalize()} refresh failed: {e}")
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self.client is not None:
+            await self.client.close()
+
+
+_station_index: Optional[StationIndex] = None
+
+
+def get_station_index() -> StationIndex:
+    """Process-wide index shared by every ParkingAgent."""
+    global _station_index
+    if _station_index is None:
+        _station_index = StationIndex()
+    return _station_index
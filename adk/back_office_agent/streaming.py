@@ -0,0 +1,199 @@
+"""
+Incremental tone polishing for streamed answers.
+
+`stream_polished` consumes the answer agent's events while it is still
+generating, cuts its partial text into sentences / paragraphs and polishes
+each piece with `TonePolishAgent.polish_chunk` as soon as it is complete.
+Polished text is emitted in order as partial events, so the first polished
+words reach the user after roughly the first chunk of each generation instead
+of after two full generations.
+"""
+
+import asyncio
+import logging
+import re
+from typing import AsyncGenerator, List
+
+from google.adk.events import Event, EventActions
+from google.genai.types import (
+    Content,
+    GenerateContentResponseUsageMetadata,
+    Part,
+)
+
+from .tone_style import TONE_POLISH_TITLE
+
+# Chunks shorter than this are merged with the following text
+MIN_CHUNK_CHARS = 40
+
+_BOUNDARY = re.compile(r"\n\s*\n|(?<=[。！？!?])|(?<=[.!?])\s+")
+
+_DONE = object()
+
+
+class SentenceChunker:
+    """Accumulates streamed text and releases complete sentences/paragraphs."""
+
+    def __init__(self, min_chars: int = MIN_CHUNK_CHARS):
+        self._buffer = ""
+        self._min_chars = min_chars
+
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text
+        chunks = []
+        start = 0
+        for match in _BOUNDARY.finditer(self._buffer):
+            end = match.end()
+            # A boundary at the very end may still be followed by more text
+            if end >= len(self._buffer) or end - start < self._min_chars:
+                continue
+            chunks.append(self._buffer[start:end])
+            start = end
+        self._buffer = self._buffer[start:]
+        return chunks
+
+    def flush(self) -> List[str]:
+        rest, self._buffer = self._buffer, ""
+        return [rest] if rest.strip() else []
+
+
+def _event_text(event: Event) -> str:
+    if not (event.content and event.content.parts):
+        return ""
+    return "".join(p.text or "" for p in event.content.parts if not p.thought)
+
+
+async def stream_polished(
+    upstream: AsyncGenerator[Event, None], tone_polish_agent, ctx
+) -> AsyncGenerator[Event, None]:
+    """
+    Run the answer stream and the tone polishing concurrently.
+
+    Upstream partial events are consumed (not forwarded); its other events are
+    forwarded so tool calls and `response_text` reach the session. The final
+    polished text is emitted as a non-partial event carrying `polished_text`
+    and the token usage of the chunk polishing calls.
+    """
+    out: asyncio.Queue = asyncio.Queue()
+    chunk_queues: asyncio.Queue = asyncio.Queue()
+    tasks: List[asyncio.Task] = []
+    deferred: List[Event] = []
+    usage = GenerateContentResponseUsageMetadata(
+        prompt_token_count=0, candidates_token_count=0, total_token_count=0
+    )
+
+    def add_usage(chunk_usage: GenerateContentResponseUsageMetadata):
+        usage.prompt_token_count += chunk_usage.prompt_token_count or 0
+        usage.candidates_token_count += chunk_usage.candidates_token_count or 0
+        usage.total_token_count += chunk_usage.total_token_count or 0
+
+    async def polish(text: str, queue: asyncio.Queue):
+        try:
+            async for delta in tone_polish_agent.polish_chunk(text, add_usage):
+                await queue.put(delta)
+        finally:
+            await queue.put(_DONE)
+
+    def start_polish(text: str):
+        queue: asyncio.Queue = asyncio.Queue()
+        tasks.append(asyncio.create_task(polish(text, queue)))
+        chunk_queues.put_nowait(queue)
+
+    async def produce():
+        chunker = SentenceChunker()
+        streamed = False
+        try:
+            async for event in upstream:
+                text = _event_text(event)
+                if event.partial:
+                    streamed = True
+                    for chunk in chunker.feed(text):
+                        start_polish(chunk)
+                    continue
+                if text and not streamed:
+                    # Upstream did not stream this response; polish it in pieces anyway
+                    for chunk in chunker.feed(text):
+                        start_polish(chunk)
+                streamed = False
+                if event.is_final_response():
+                    # Shown after the polished stream instead of interrupting it
+                    deferred.append(event)
+                    continue
+                # Wait until the runner has appended the event: the next LLM
+                # step of the upstream agent reads it back from the session.
+                ack = asyncio.get_running_loop().create_future()
+                await out.put(("event", event, ack))
+                await ack
+            for chunk in chunker.flush():
+                start_polish(chunk)
+        finally:
+            chunk_queues.put_nowait(_DONE)
+
+    async def emit_in_order():
+        last = "\n"
+        while (queue := await chunk_queues.get()) is not _DONE:
+            separate = not last[-1].isspace()
+            while (delta := await queue.get()) is not _DONE:
+                if not delta:
+                    continue
+                if separate:
+                    # Polished fragments lose the whitespace they were cut at
+                    delta, separate = "\n" + delta, False
+                await out.put(("delta", delta, None))
+                last = delta
+        await out.put(("done", None, None))
+
+    producer = asyncio.create_task(produce())
+    emitter = asyncio.create_task(emit_in_order())
+    polished = TONE_POLISH_TITLE + "\n"
+    try:
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=tone_polish_agent.name,
+            content=Content(role="model", parts=[Part(text=polished)]),
+            partial=True,
+        )
+        while True:
+            get_item = asyncio.create_task(out.get())
+            waiting = {get_item} if producer.done() else {get_item, producer}
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            if get_item not in done:
+                get_item.cancel()
+                # Surfaces upstream failures instead of waiting forever
+                producer.result()
+                continue
+            kind, payload, ack = get_item.result()
+            if kind == "event":
+                yield payload
+                ack.set_result(None)
+            elif kind == "delta":
+                polished += payload
+                yield Event(
+                    invocation_id=ctx.invocation_id,
+                    author=tone_polish_agent.name,
+                    content=Content(role="model", parts=[Part(text=payload)]),
+                    partial=True,
+                )
+            else:
+                break
+        await producer
+        for task in tasks:
+            # Re-raise polishing failures (all tasks are finished by now)
+            task.result()
+        for event in deferred:
+            yield event
+        logging.info(
+            f"[stream_polished] Polished {len(tasks)} chunks, {len(polished)} chars"
+        )
+        yield Event(
+            invocation_id=ctx.invocation_id,
+            author=tone_polish_agent.name,
+            content=Content(role="model", parts=[Part(text=polished)]),
+            actions=EventActions(state_delta={"polished_text": polished}),
+            # Counted into the turn's tokens like the other model calls
+            usage_metadata=usage if usage.total_token_count else None,
+        )
+    finally:
+        for task in [producer, emitter, *tasks]:
+            if not task.done():
+                task.cancel()
@@ -0,0 +1,108 @@
+"""CustomLiteLlm streams through `acompletion`, with and without tools."""
+
+import asyncio
+
+from google.adk.models.lite_llm import LiteLLMClient
+from google.adk.models.llm_request import LlmRequest
+from google.genai import types
+from litellm import ModelResponse
+from litellm.types.utils import (
+    ChatCompletionDeltaToolCall,
+    Delta,
+    Function,
+    StreamingChoices,
+    Usage,
+)
+
+from ..custom_adk_patches import CustomLiteLlm
+
+USAGE = Usage(prompt_tokens=30, completion_tokens=5, total_tokens=35)
+
+
+class StreamingClient(LiteLLMClient):
+    """Replays `parts`; the blocking `completion()` must not be used."""
+
+    def __init__(self, parts):
+        self.parts = parts
+
+    async def acompletion(self, **kwargs):
+        assert kwargs["stream"]
+
+        async def parts():
+            for part in self.parts:
+                yield part
+
+        return parts()
+
+    def completion(self, **kwargs):
+        raise AssertionError("streamed through the synchronous completion()")
+
+
+def _part(delta=None, finish_reason=None, usage=None):
+    response = ModelResponse(
+        stream=True,
+        choices=[StreamingChoices(delta=delta or Delta(), finish_reason=finish_reason)],
+    )
+    if usage is not None:
+        response.usage = usage
+    return response
+
+
+def _tool_delta(index, call_id=None, name=None, arguments=None):
+    return Delta(
+        tool_calls=[
+            ChatCompletionDeltaToolCall(
+                index=index,
+                id=call_id,
+                type="function",
+                function=Function(name=name, arguments=arguments),
+            )
+        ]
+    )
+
+
+def _stream(parts, tools=None):
+    llm = CustomLiteLlm(model="openai/gpt-4o", llm_client=StreamingClient(parts))
+    request = LlmRequest(
+        contents=[types.Content(role="user", parts=[types.Part(text="渋谷の駐車場")])],
+        config=types.GenerateContentConfig(tools=tools),
+    )
+
+    async def collect():
+        return [r async for r in llm.generate_content_async(request, stream=True)]
+
+    return asyncio.run(collect())
+
+
+def test_text_is_streamed_then_aggregated():
+    responses = _stream(
+        [
+            _part(Delta(content="渋谷駅の")),
+            _part(Delta(content="駐車場です"), finish_reason="stop"),
+            _part(usage=USAGE),
+        ]
+    )
+    assert [r.partial for r in responses] == [True, True, False]
+    assert responses[-1].content.parts[0].text == "渋谷駅の駐車場です"
+    assert responses[-1].usage_metadata.total_token_count == 35
+
+
+def test_function_call_deltas_are_aggregated():
+    tools = [
+        types.Tool(function_declarations=[types.FunctionDeclaration(name="search")])
+    ]
+    responses = _stream(
+        [
+            _part(_tool_delta(0, "call-1", "search", "")),
+            _part(_tool_delta(0, arguments='{"index": "parking",')),
+            _part(_tool_delta(0, arguments=' "queryBody": {"size": 5}}')),
+            _part(finish_reason="tool_calls"),
+            _part(usage=USAGE),
+        ],
+        tools=tools,
+    )
+    (response,) = responses
+    call = response.content.parts[0].function_call
+    assert (call.id, call.name) == ("call-1", "search")
+    assert call.args == {"index": "parking", "queryBody": {"size": 5}}
+    assert response.usage_metadata.prompt_token_count == 30
@@ -0,0 +1,129 @@
+"""
+Parity of the native `search` tool with the Elastic MCP server.
+
+Both backends search the stub Elasticsearch of bench/es_backends.py with the
+query compiler's queryBodies and must return the same text blocks. The MCP
+side runs ES_MCP_COMMAND (default: the pinned npx package); the parity test
+is skipped when that server cannot be started here (no Node / npm registry)
+within ES_MCP_START_TIMEOUT_SECONDS. The native rendering is checked against
+the stub's hits either way.
+"""
+
+import asyncio
+import json
+import os
+import shlex
+import shutil
+
+import pytest
+from aiohttp import web
+
+from ..agent import DEFAULT_ES_MCP_COMMAND
+from ..bench.es_backends import (
+    STUB_HITS,
+    open_backends,
+    sample_bodies,
+    search_texts,
+    start_stub,
+)
+from ..es_search import ElasticsearchClient, ElasticsearchError
+
+MCP_START_TIMEOUT_SECONDS = float(os.getenv("ES_MCP_START_TIMEOUT_SECONDS", "15"))
+
+
+def _compact(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+async def _native_texts(bodies):
+    runner, es_url = await start_stub(latency_ms=0)
+    try:
+        tools, closers = await open_backends(es_url, ["native"], None)
+        try:
+            return await search_texts(tools["native"], bodies)
+        finally:
+            for close in closers:
+                await close()
+    finally:
+        await runner.cleanup()
+
+
+def test_native_renders_like_the_mcp_server():
+    body = {"query": {"match_all": {}}, "from": 2, "size": 3, "_source": ["id", "name"]}
+    ((header, *blocks),) = asyncio.run(_native_texts([body]))
+    assert header == f"Total results: {len(STUB_HITS)}, showing 3 from position 2"
+    # Highlights come back for fields left out of `_source` too
+    assert blocks == [
+        f"address (highlighted): <em>{doc['address']}</em>\n"
+        f"id: {_compact(doc['id'])}\nname: {_compact(doc['name'])}"
+        for doc in STUB_HITS[2:5]
+    ]
+
+
+def test_native_renders_highlights_first():
+    ((header, first, *_),) = asyncio.run(_native_texts([{"size": 1}]))
+    doc = STUB_HITS[0]
+    assert header == f"Total results: {len(STUB_HITS)}, showing 1 from position 0"
+    assert first.splitlines() == [
+        f"address (highlighted): <em>{doc['address']}</em>",
+        *(f"{k}: {_compact(v)}" for k, v in doc.items() if k != "address"),
+    ]
+
+
+async def _parity(command):
+    runner, es_url = await start_stub(latency_ms=0)
+    closers = []
+    try:
+        try:
+            mcp, closers = await asyncio.wait_for(
+                open_backends(es_url, ["mcp"], command), MCP_START_TIMEOUT_SECONDS
+            )
+        except Exception as e:
+            pytest.skip(f"Elastic MCP server could not be started: {e!r}")
+        native, native_closers = await open_backends(es_url, ["native"], None)
+        closers += native_closers
+        bodies = sample_bodies()
+        return (
+            bodies,
+            await search_texts(native["native"], bodies),
+            await search_texts(mcp["mcp"], bodies),
+        )
+    finally:
+        for close in closers:
+            await close()
+        await runner.cleanup()
+
+
+def test_native_matches_mcp():
+    command = shlex.split(os.getenv("ES_MCP_COMMAND", DEFAULT_ES_MCP_COMMAND))
+    if shutil.which(command[0]) is None:
+        pytest.skip(f"{command[0]} is not installed")
+    bodies, native, mcp = asyncio.run(_parity(command))
+    for body, native_texts, mcp_texts in zip(bodies, native, mcp):
+        assert native_texts == mcp_texts, body
+
+
+async def _search_behind(handler):
+    app = web.Application()
+    app.router.add_route("*", "/{index}/_search", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", 0).start()
+    client = ElasticsearchClient(f"http://127.0.0.1:{runner.addresses[0][1]}")
+    try:
+        return await client.search("parking", {"size": 1})
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+
+def test_non_json_error_page_is_an_elasticsearch_error():
+    async def bad_gateway(request):
+        return web.Response(
+            status=502, text="<html>502 Bad Gateway</html>", content_type="text/html"
+        )
+
+    with pytest.raises(ElasticsearchError) as raised:
+        asyncio.run(_search_behind(bad_gateway))
+    assert raised.value.status == 502
+    assert raised.value.retryable
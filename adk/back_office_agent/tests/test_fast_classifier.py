@@ -0,0 +1,92 @@
+"""
+The default lexicon, bias and threshold of the fast-path classifier.
+
+Confident answers skip the LLM ClassifierAgent, so a query may only be
+confident when its route is unambiguous; everything else must fall back.
+"""
+
+import pytest
+
+from ..fast_classifier import (
+    FAST_CLASSIFIER_THRESHOLD,
+    FastRequestClassifier,
+    normalize_text,
+)
+from ..utils import RequestType
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    return FastRequestClassifier()
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "渋谷駅近くの月極駐車場を探しています",
+        "新宿のパーキングの空きはありますか",
+        "Ｐａｒｋｉｎｇ near Shibuya station",
+        "Where to park my car in Osaka?",
+        "주차장 찾고 있어요",
+    ],
+)
+def test_parking_queries_skip_the_llm(classifier, text):
+    request_type, confidence = classifier.classify(text)
+    assert request_type == RequestType.PARKING
+    assert confidence >= FAST_CLASSIFIER_THRESHOLD
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "京都で泊まれるホテルを教えて",
+        "Is there a hotel near Tokyo station?",
+        "明日の天気は？",
+    ],
+)
+def test_common_queries_skip_the_llm(classifier, text):
+    request_type, confidence = classifier.classify(text)
+    assert request_type == RequestType.OTHER
+    assert confidence >= FAST_CLASSIFIER_THRESHOLD
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        # One weak parking keyword
+        "賃料はいくらですか",
+        "駐輪場",
+        # No keyword at all: only the bias
+        "こんにちは",
+        "渋谷駅から徒歩5分",
+        "",
+        # Parking and hotel keywords cancel out
+        "ホテルの駐車場はありますか",
+    ],
+)
+def test_unsure_queries_fall_back_to_the_llm(classifier, text):
+    _, confidence = classifier.classify(text)
+    assert 0.5 <= confidence < FAST_CLASSIFIER_THRESHOLD
+
+
+def test_overlapping_keywords_count_once(classifier):
+    # 駐車場 wins over the 駐車 inside it, and a repeat adds nothing
+    assert classifier.score("駐車場") == classifier.score("駐車場 駐車場") == 2.5
+
+
+def test_text_is_normalized():
+    assert normalize_text("  ＰＡＲＫＩＮＧ　 Lot ") == "parking lot"
+
+
+def test_fit_learns_ngrams_and_round_trips(tmp_path):
+    samples = [("渋谷の駐車場", "parking"), ("新宿の駐車場", "parking")] * 3 + [
+        ("渋谷のカフェ", "other"),
+        ("新宿のカフェ", "other"),
+    ] * 3
+    fitted = FastRequestClassifier.fit(samples)
+    assert fitted.classify("池袋の駐車場")[0] == RequestType.PARKING
+    assert fitted.classify("池袋のカフェ")[0] == RequestType.OTHER
+    path = str(tmp_path / "weights.json")
+    fitted.save(path)
+    loaded = FastRequestClassifier.load(path)
+    assert loaded.score("池袋のカフェ") == pytest.approx(fitted.score("池袋のカフェ"))
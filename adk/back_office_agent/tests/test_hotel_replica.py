@@ -0,0 +1,107 @@
+"""
+The hotel replica answers like `LOWER(col) LIKE LOWER('%x%')` in tools.yaml.
+
+Runs on a fixture table, no Toolbox / BigQuery needed. Expected results come
+from a plain Python version of the BigQuery statement.
+"""
+
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+from ..hotel_replica import HotelReplica
+
+HOTELS = [
+    {"id": 1, "name": "東京ステーションホテル", "location": "東京都千代田区"},
+    {"id": 2, "name": "東横イン 大阪", "location": "大阪府大阪市"},
+    {"id": 3, "name": "Hilton Tokyo", "location": "東京都新宿区"},
+    {"id": 4, "name": None, "location": "京都府京都市"},
+    {"id": 5, "name": "Hotel Ok", "location": None},
+    {"id": 6, "name": "100% Stay", "location": ""},
+]
+
+
+def _bigquery_like(column, value):
+    # LOWER(NULL) LIKE ... is NULL, so rows without the column never match
+    return [
+        row
+        for row in HOTELS
+        if row[column] is not None and value.lower() in row[column].lower()
+    ]
+
+
+def _replica(path=None):
+    async def fetch_all():
+        return json.dumps(HOTELS, ensure_ascii=False)
+
+    replica = HotelReplica(path=path)
+    asyncio.run(replica.refresh(fetch_all))
+    return replica
+
+
+@pytest.mark.parametrize(
+    "tool_name, column, value",
+    [
+        ("search-hotels-by-name", "name", "東"),
+        ("search-hotels-by-name", "name", "東横"),
+        ("search-hotels-by-name", "name", "東京ステ"),
+        ("search-hotels-by-name", "name", "HOTEL"),
+        ("search-hotels-by-name", "name", "ok"),
+        ("search-hotels-by-name", "name", "o"),
+        ("search-hotels-by-name", "name", ""),
+        ("search-hotels-by-location", "location", "東京"),
+        ("search-hotels-by-location", "location", "京"),
+        ("search-hotels-by-location", "location", "大阪市"),
+        ("search-hotels-by-location", "location", ""),
+    ],
+)
+def test_lookup_matches_bigquery(tool_name, column, value):
+    replica = _replica()
+    result = replica.lookup(tool_name, {column: value})
+    assert json.loads(result) == _bigquery_like(column, value)
+
+
+def test_null_columns_never_match():
+    replica = _replica()
+    names = json.loads(replica.lookup("search-hotels-by-name", {"name": "%"}))
+    assert [row["id"] for row in names] == [1, 2, 3, 5, 6]
+    locations = json.loads(
+        replica.lookup("search-hotels-by-location", {"location": ""})
+    )
+    assert 5 not in [row["id"] for row in locations]
+
+
+def test_all_hotels_in_table_order():
+    replica = _replica()
+    assert json.loads(replica.lookup("search-all-hotels-dummy", {})) == HOTELS
+
+
+def test_invalid_arguments_go_to_toolbox():
+    replica = _replica()
+    assert replica.lookup("search-hotels-by-name", {}) is None
+    assert replica.lookup("other-tool", {"name": "東京"}) is None
+
+
+def test_snapshot_file_is_reloaded(tmp_path):
+    path = str(tmp_path / "hotels.db")
+    _replica(path)
+    reloaded = HotelReplica(path=path)
+    assert reloaded.rows == len(HOTELS)
+    result = reloaded.lookup("search-hotels-by-name", {"name": "東横"})
+    assert [row["id"] for row in json.loads(result)] == [2]
+
+
+def test_snapshot_file_of_old_format_is_ignored(tmp_path):
+    path = str(tmp_path / "hotels.db")
+    db = sqlite3.connect(path)
+    db.executescript(
+        "CREATE TABLE meta (snapshot_at REAL NOT NULL, rows INTEGER NOT NULL);"
+        "CREATE TABLE hotels (id INTEGER PRIMARY KEY, data TEXT NOT NULL);"
+        "INSERT INTO meta VALUES (1e12, 0);"
+    )
+    db.close()
+    replica = HotelReplica(path=path)
+    assert not replica.fresh()
+    assert replica.lookup("search-hotels-by-name", {"name": "東京"}) is None
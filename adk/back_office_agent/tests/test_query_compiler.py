@@ -0,0 +1,116 @@
+"""Slots and queryBodies of ParkingQueryCompiler, on a small fixture mapping."""
+
+import pytest
+
+from ..query_compiler import ParkingQueryCompiler
+from ..schema import SchemaRegistry
+
+MAPPING = {
+    "properties": {
+        "id": {"type": "keyword"},
+        "name": {"type": "text"},
+        "address": {"type": "text"},
+        "city": {"properties": {"name": {"type": "keyword"}}},
+        "prefecture": {"properties": {"name": {"type": "keyword"}}},
+        "nearbyStations": {
+            "type": "nested",
+            "properties": {"name": {"type": "text"}},
+        },
+        "spaces": {"type": "nested", "properties": {"rent": {"type": "integer"}}},
+    }
+}
+
+
+@pytest.fixture
+def compiler():
+    return ParkingQueryCompiler(
+        SchemaRegistry.from_mapping(MAPPING), source_fields=["address"], size=5
+    )
+
+
+def _station(name):
+    return {
+        "nested": {
+            "path": "nearbyStations",
+            "query": {"match_phrase": {"nearbyStations.name": name}},
+        }
+    }
+
+
+@pytest.mark.parametrize(
+    "text, slots, query",
+    [
+        ("渋谷駅の駐車場", {"station": "渋谷"}, _station("渋谷")),
+        (
+            "新宿駅 3万円以下の駐車場",
+            {"station": "新宿", "max_rent": (30000, "lte")},
+            {
+                "bool": {
+                    "must": [
+                        _station("新宿"),
+                        {
+                            "nested": {
+                                "path": "spaces",
+                                "query": {"range": {"spaces.rent": {"lte": 30000}}},
+                            }
+                        },
+                    ]
+                }
+            },
+        ),
+        (
+            "世田谷区の月極駐車場",
+            {"city": "世田谷区"},
+            {"term": {"city.name": "世田谷区"}},
+        ),
+        ("四日市市の駐車場", {"city": "四日市市"}, {"term": {"city.name": "四日市市"}}),
+        (
+            "大阪府の駐車場を探して",
+            {"prefecture": "大阪府"},
+            {"term": {"prefecture.name": "大阪府"}},
+        ),
+        # Wards of designated cities: city.name is the city, the ward is in the address
+        (
+            "大阪市北区の駐車場",
+            {"city": "大阪市", "ward": "北区"},
+            {
+                "bool": {
+                    "must": [
+                        {"term": {"city.name": "大阪市"}},
+                        {"match_phrase": {"address": "北区"}},
+                    ]
+                }
+            },
+        ),
+        (
+            "北九州市小倉北区の駐車場 2万円未満",
+            {"city": "北九州市", "ward": "小倉北区", "max_rent": (20000, "lt")},
+            None,
+        ),
+    ],
+)
+def test_japanese_requests_are_compiled(compiler, text, slots, query):
+    compiled = compiler.compile(text)
+    assert compiled.slots == slots
+    assert compiled.confidence == 1.0
+    if query is not None:
+        assert compiled.query_body == {
+            "query": query,
+            "_source": ["id", "name", "address"],
+            "size": 5,
+        }
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        # Station names are stored in Japanese: the LLM translates them
+        "parking near Shibuya station",
+        "Shibuya station under 30000 yen",
+        # Conditions the compiler has no slot for
+        "渋谷駅の屋根付きで大型車も停められる駐車場",
+        "駐車場を探して",
+    ],
+)
+def test_other_requests_fall_back_to_the_llm(compiler, text):
+    assert compiler.compile(text) is None
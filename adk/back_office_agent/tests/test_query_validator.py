@@ -0,0 +1,249 @@
+"""Rewrites and rejections of QueryBodyValidator, on a small fixture mapping."""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from ..query_validator import QueryBodyValidator, QueryValidationError
+from ..schema import SchemaRegistry
+
+MAPPING = {
+    "properties": {
+        "id": {"type": "keyword"},
+        "name": {"type": "text", "fields": {"keyword": {"type": "keyword"}}},
+        "address": {"type": "text"},
+        "isPublic": {"type": "boolean"},
+        "city": {"properties": {"name": {"type": "keyword"}}},
+        "nearbyStations": {
+            "type": "nested",
+            "properties": {
+                "name": {"type": "text"},
+                "distance": {"type": "integer"},
+            },
+        },
+        "spaces": {
+            "type": "nested",
+            "properties": {
+                "rent": {"type": "integer"},
+                "tags": {"type": "text"},
+            },
+        },
+    }
+}
+
+
+@pytest.fixture
+def validator():
+    return QueryBodyValidator(
+        SchemaRegistry.from_mapping(MAPPING),
+        source_fields=["address"],
+        default_size=10,
+        max_size=20,
+    )
+
+
+def _query(validator, query):
+    return validator.rewrite({"query": query, "_source": ["id"]})["query"]
+
+
+def _nested(path, query):
+    return {"nested": {"path": path, "query": query}}
+
+
+@pytest.mark.parametrize(
+    "query, expected",
+    [
+        # Already valid: unchanged
+        ({"term": {"city.name": "渋谷区"}}, {"term": {"city.name": "渋谷区"}}),
+        # Unique suffix expanded, nested path wrapped
+        (
+            {"range": {"rent": {"lte": 30000}}},
+            _nested("spaces", {"range": {"spaces.rent": {"lte": 30000}}}),
+        ),
+        (
+            {"match_phrase": {"nearbyStations.name": "渋谷"}},
+            _nested(
+                "nearbyStations", {"match_phrase": {"nearbyStations.name": "渋谷"}}
+            ),
+        ),
+        # Already inside the right nested query: not wrapped again
+        (
+            _nested("spaces", {"range": {"spaces.rent": {"gte": 1}}}),
+            _nested("spaces", {"range": {"spaces.rent": {"gte": 1}}}),
+        ),
+        # term / terms on text: the keyword sub-field
+        ({"term": {"name": "P1"}}, {"term": {"name.keyword": "P1"}}),
+        ({"terms": {"name": ["P1", "P2"]}}, {"terms": {"name.keyword": ["P1", "P2"]}}),
+        # ... or match_phrase without one
+        ({"term": {"address": "渋谷"}}, {"match_phrase": {"address": "渋谷"}}),
+        (
+            {"term": {"address": {"value": "渋谷"}}},
+            {"match_phrase": {"address": "渋谷"}},
+        ),
+        (
+            {"terms": {"address": ["渋谷", "新宿"]}},
+            {
+                "bool": {
+                    "should": [
+                        {"match_phrase": {"address": "渋谷"}},
+                        {"match_phrase": {"address": "新宿"}},
+                    ],
+                    "minimum_should_match": 1,
+                }
+            },
+        ),
+        (
+            {"terms": {"spaces.tags": ["屋根付き"]}},
+            _nested(
+                "spaces",
+                {
+                    "bool": {
+                        "should": [{"match_phrase": {"spaces.tags": "屋根付き"}}],
+                        "minimum_should_match": 1,
+                    }
+                },
+            ),
+        ),
+        # Empty terms on a text field: matches nothing, nothing to expand
+        ({"terms": {"address": []}}, {"terms": {"address": []}}),
+        (
+            {"terms": {"spaces.tags": []}},
+            _nested("spaces", {"terms": {"spaces.tags": []}}),
+        ),
+        # match on keyword / boolean fields: term
+        ({"match": {"city.name": "渋谷区"}}, {"term": {"city.name": "渋谷区"}}),
+        ({"match": {"isPublic": {"query": True}}}, {"term": {"isPublic": True}}),
+        # Several clauses in one object: a conjunction
+        (
+            {"term": {"id": "P1"}, "exists": {"field": "address"}},
+            {
+                "bool": {
+                    "must": [{"term": {"id": "P1"}}, {"exists": {"field": "address"}}]
+                }
+            },
+        ),
+        # bool clauses rewritten, other bool keys kept
+        (
+            {"bool": {"filter": [{"match": {"id": "P1"}}], "boost": 2}},
+            {"bool": {"filter": [{"term": {"id": "P1"}}], "boost": 2}},
+        ),
+        (
+            {"exists": {"field": "rent"}},
+            _nested("spaces", {"exists": {"field": "spaces.rent"}}),
+        ),
+    ],
+)
+def test_query_rewrites(validator, query, expected):
+    assert _query(validator, query) == expected
+
+
+@pytest.mark.parametrize(
+    "query_body, message",
+    [
+        ("{not json", "not valid JSON"),
+        ([{"match_all": {}}], "must be a JSON object"),
+        ({"query": {"term": {"colour": "red"}}}, "Unknown field 'colour'"),
+        ({"query": {"range": {"address": {"gte": "a"}}}}, "'range' is not supported"),
+        (
+            {"query": {"term": {"spaces": 1}}},
+            "nested field; query one of its sub-fields",
+        ),
+        ({"query": {"term": {"city": "x"}}}, "object field"),
+        (
+            {"query": {"nested": {"path": "city", "query": {}}}},
+            "'city' is not a nested field",
+        ),
+        (
+            {
+                "query": _nested(
+                    "spaces", {"match_phrase": {"nearbyStations.name": "渋谷"}}
+                )
+            },
+            "cannot be queried inside nested path 'spaces'",
+        ),
+        ({"query": {"term": {"id": "P1", "name": "x"}}}, "exactly one field"),
+        ({"query": ["oops"]}, "Invalid query clause"),
+        ({"size": -1}, "'size' must be a non-negative integer"),
+        ({"size": "10"}, "'size' must be a non-negative integer"),
+        ({"size": True}, "'size' must be a non-negative integer"),
+    ],
+)
+def test_rejections(validator, query_body, message):
+    with pytest.raises(QueryValidationError, match=message):
+        validator.rewrite(query_body)
+
+
+def test_ambiguous_suffix_is_rejected_with_candidates():
+    schema = SchemaRegistry.from_mapping(
+        {
+            "properties": {
+                "a": {"properties": {"rent": {"type": "integer"}}},
+                "b": {"properties": {"rent": {"type": "integer"}}},
+            }
+        }
+    )
+    with pytest.raises(QueryValidationError, match="Did you mean: a.rent, b.rent"):
+        QueryBodyValidator(schema).rewrite({"query": {"range": {"rent": {"lt": 1}}}})
+
+
+@pytest.mark.parametrize(
+    "body, expected",
+    [
+        # A bare query clause as the whole body
+        (
+            {"term": {"id": "P1"}},
+            {
+                "query": {"term": {"id": "P1"}},
+                "_source": ["id", "name", "address"],
+                "size": 10,
+            },
+        ),
+        ({"_source": True}, {"_source": ["id", "name", "address"], "size": 10}),
+        ({"_source": "address"}, {"_source": ["address"], "size": 10}),
+        (
+            {"_source": {"includes": ["city.name"]}},
+            {"_source": ["city.name"], "size": 10},
+        ),
+        ({"_source": ["colour", "spaces.*"]}, {"_source": ["spaces.*"], "size": 10}),
+        ({"_source": ["colour"]}, {"_source": ["id", "name", "address"], "size": 10}),
+        ({"_source": False, "size": 0}, {"_source": False, "size": 0}),
+        ({"_source": ["id"], "size": 500}, {"_source": ["id"], "size": 20}),
+    ],
+)
+def test_source_and_size(validator, body, expected):
+    assert validator.rewrite(body) == expected
+
+
+def _search(validator, args):
+    tool = SimpleNamespace(name="search")
+    return asyncio.run(validator.before_tool_callback(tool, args, None))
+
+
+def test_callback_rewrites_args_in_place(validator):
+    args = {"queryBody": json.dumps({"query": {"term": {"name": "P1"}}})}
+    assert _search(validator, args) is None
+    assert args["index"] == "parking"
+    assert args["queryBody"]["query"] == {"term": {"name.keyword": "P1"}}
+
+
+@pytest.mark.parametrize(
+    "args, message",
+    [
+        ({"index": "hotels", "queryBody": {"size": 1}}, "Only the 'parking' index"),
+        ({"index": "parking"}, "missing the required 'queryBody'"),
+        ({"index": "parking", "queryBody": "{}"}, "missing the required 'queryBody'"),
+        ({"index": "parking", "queryBody": {"size": -5}}, "non-negative integer"),
+        ({"index": "parking", "queryBody": "{oops"}, "not valid JSON"),
+    ],
+)
+def test_callback_rejections(validator, args, message):
+    result = _search(validator, args)
+    assert result["status"] == "error"
+    assert message in result["error_message"]
+
+
+def test_callback_ignores_other_tools(validator):
+    tool = SimpleNamespace(name="list_indices")
+    assert asyncio.run(validator.before_tool_callback(tool, {}, None)) is None
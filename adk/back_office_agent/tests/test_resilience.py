@@ -0,0 +1,126 @@
+"""
+Which tool failures count against a backend's circuit breaker.
+
+Timeouts, transport errors and 5xx / 429 answers do; queries the backend
+rejects (a malformed queryBody, a 4xx) go back to the model and do not.
+"""
+
+import asyncio
+
+import pytest
+from mcp.types import CallToolResult, TextContent
+
+from ..es_search import ElasticsearchError, ElasticsearchSearchTool
+from ..resilience import TOOL_BREAKER_FAILURES, ResilientCaller
+
+ARGS = {"index": "parking", "queryBody": {"query": {"match": {"name": "渋谷"}}}}
+
+
+class FailingClient:
+    def __init__(self, error):
+        self.error = error
+        self.calls = 0
+
+    async def search(self, index, body, filter_path=None):
+        self.calls += 1
+        raise self.error
+
+
+def _result(text, is_error=True):
+    return CallToolResult(
+        content=[TextContent(type="text", text=text)], isError=is_error
+    )
+
+
+async def _call_many(caller, result, times):
+    async def attempt(timeout):
+        return result
+
+    return [
+        await caller.call("search", {"n": i}, attempt, lambda reason: reason)
+        for i in range(times)
+    ]
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Error: parsing_exception: [match] query malformed, no start_object after query name",
+        "Error: x_content_parse_exception: [1:10] [bool] unknown field [must_match]",
+        "Error: index_not_found_exception: no such index [parkings]",
+    ],
+)
+def test_rejected_mcp_queries_leave_the_breaker_closed(text):
+    caller = ResilientCaller("test")
+    results = asyncio.run(_call_many(caller, _result(text), TOOL_BREAKER_FAILURES * 2))
+    assert caller.breaker.state == "closed"
+    # The model gets the backend's own error to fix its query
+    assert all(result.content[0].text == text for result in results)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "Error: connect ECONNREFUSED 127.0.0.1:9200",
+        "Error: Request timed out",
+        "Error: circuit_breaking_exception: [parent] Data too large",
+    ],
+)
+def test_backend_failures_open_the_breaker(text):
+    caller = ResilientCaller("test")
+    results = asyncio.run(_call_many(caller, _result(text), TOOL_BREAKER_FAILURES + 1))
+    assert caller.breaker.state == "open"
+    assert results[-1] == "circuit_open"
+
+
+def test_native_client_errors_leave_the_breaker_closed():
+    client = FailingClient(ElasticsearchError("400 parsing_exception", 400))
+    tool = ElasticsearchSearchTool(client=client, schema=object())
+    tool._highlight = lambda: {}
+
+    async def search_many():
+        return [
+            await tool._search_and_cache(ARGS) for _ in range(TOOL_BREAKER_FAILURES * 2)
+        ]
+
+    results = asyncio.run(search_many())
+    assert client.calls == TOOL_BREAKER_FAILURES * 2
+    assert tool._resilience.breaker.state == "closed"
+    assert results[-1].isError
+    assert "parsing_exception" in results[-1].content[0].text
+
+
+@pytest.mark.parametrize("status", [429, 503, None])
+def test_native_server_errors_open_the_breaker(status):
+    client = FailingClient(ElasticsearchError(f"{status} unavailable", status))
+    tool = ElasticsearchSearchTool(client=client, schema=object())
+    tool._highlight = lambda: {}
+
+    async def search_many():
+        for _ in range(TOOL_BREAKER_FAILURES + 1):
+            await tool._search_and_cache(ARGS)
+
+    asyncio.run(search_many())
+    assert tool._resilience.breaker.state == "open"
+    assert client.calls == TOOL_BREAKER_FAILURES
+
+
+def test_last_good_fallback_is_a_copy():
+    caller = ResilientCaller("test")
+    good = _result("Total results: 1", is_error=False)
+
+    async def attempt(timeout):
+        return good
+
+    async def fail(timeout):
+        raise TimeoutError()
+
+    async def run():
+        await caller.call("search", ARGS, attempt, lambda reason: reason)
+        # A callback of the first caller rewrites its result afterwards
+        good.content[0].text = "rewritten"
+        first = await caller.call("search", ARGS, fail, lambda reason: reason)
+        first.content[0].text = "rewritten again"
+        return await caller.call("search", ARGS, fail, lambda reason: reason)
+
+    assert asyncio.run(run()).content[0].text == "Total results: 1"
@@ -0,0 +1,29 @@
+"""Coalesced tool calls share one backend call but not its result object."""
+
+import asyncio
+
+from ..single_flight import SingleFlight
+
+
+def test_shared_callers_get_their_own_copy():
+    calls = 0
+
+    async def backend():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"hits": [{"name": "渋谷パーキング"}]}
+
+    async def run():
+        flight = SingleFlight("test")
+        return await asyncio.gather(
+            *(flight.call("search", {"q": "渋谷"}, backend) for _ in range(3))
+        )
+
+    (leader, led), *shared = asyncio.run(run())
+    assert calls == 1
+    assert not led and all(was_shared for _, was_shared in shared)
+    leader["hits"].append({"name": "added by a callback"})
+    for result, _ in shared:
+        assert result == {"hits": [{"name": "渋谷パーキング"}]}
+        assert result is not leader
@@ -0,0 +1,76 @@
+"""
+Token counting for the context budgets.
+
+Counts with tiktoken in the encoding of the agents' model (gpt-4o-mini:
+`o200k_base`). tiktoken downloads encodings on first use; litellm ships
+copies of them, which are used when TIKTOKEN_CACHE_DIR is not set. If no
+encoding can be loaded, counts fall back to an estimate from the UTF-8 size.
+"""
+
+import importlib.util
+import logging
+import os
+import threading
+from typing import Optional
+
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "o200k_base")
+
+_lock = threading.Lock()
+_encoding = None
+_loaded = False
+
+
+def _litellm_tokenizers_dir() -> Optional[str]:
+    # Located without importing litellm (slow, see agent.py)
+    spec = importlib.util.find_spec("litellm")
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    path = os.path.join(
+        spec.submodule_search_locations[0], "litellm_core_utils", "tokenizers"
+    )
+    return path if os.path.isdir(path) else None
+
+
+def get_encoding():
+    """The tiktoken encoding, or None when it is unavailable."""
+    global _encoding, _loaded
+    if _loaded:
+        return _encoding
+    with _lock:
+        if not _loaded:
+            if not os.getenv("TIKTOKEN_CACHE_DIR"):
+                bundled = _litellm_tokenizers_dir()
+                if bundled:
+                    os.environ["TIKTOKEN_CACHE_DIR"] = bundled
+            try:
+                import tiktoken
+
+                _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+            except Exception as e:
+                logging.warning(
+                    f"[tokens] tiktoken encoding {TOKEN_ENCODING} unavailable, estimating token counts: {e}"
+                )
+            _loaded = True
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        # Roughly one token per kana / kanji, four ASCII characters per token
+        return max(1, len(text.encode("utf-8")) // 3)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of `text` within `max_tokens`."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = get_encoding()
+    if encoding is None:
+        return text.encode("utf-8")[: max(0, max_tokens) * 3].decode(
+            "utf-8", errors="ignore"
+        )
+    return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
@@ -1,5 +1,10 @@
 from google.adk.agents.llm_agent import LlmAgent
-from google.adk.models.lite_llm import LiteLlm
+from google.adk.models.llm_request import LlmRequest
+from google.genai.types import Content, GenerateContentConfig, Part
+from .custom_adk_patches import CustomLiteLlm
+from .history_window import HistoryWindow
+from .tracing import span
+from .tone_style import CHUNK_INSTRUCTION, TONE_GUIDELINES, TONE_POLISH_TITLE
 import logging
 
 
@@ -9,18 +14,44 @@ class TonePolishAgent(LlmAgent):
 
         super().__init__(
             name="tone_polish_agent",
-            model=LiteLlm(model="openai/gpt-4o-mini"),
-            instruction="""
+            model=CustomLiteLlm(model="openai/gpt-4o-mini"),
+            instruction=f"""
 Guidelines:
-- For every response, always start with a title line: `[Tone Polish Agent]` (include this exactly, at the very top of your reply).
-- Please rewrite the user's message to sound more natural, friendly, and approachable.
-- Use clear and concise language, and break up long sentences for easier reading.
-- Add appropriate line breaks and spacing so the response is easy to scan and not tiring to read.
-- If the message sounds too formal or unfriendly, make it warmer and more inviting.
-- Preserve the user's original level of politeness (formal/informal speech).
-- Remove unnecessary repetition or overly long sentences, making the message concise and clear.
-- Always reply in the user's language.
-- Use emojis and a friendly tone where appropriate to make the message more engaging! 😊🚗🅿️✨
-""",
+- For every response, always start with a title line: `{TONE_POLISH_TITLE}` (include this exactly, at the very top of your reply).{TONE_GUIDELINES}""",
             output_key="polished_text",
+            # Only the answer to rewrite (`to_polish`), not the conversation
+            before_model_callback=HistoryWindow.for_agent(
+                "tone_polish_agent"
+            ).before_model_callback,
         )
+
+    async def polish_chunk(self, text, on_usage=None):
+        """
+        Polish one fragment of a streamed answer, yielding text deltas.
+        `on_usage` is called with the usage metadata reported by the model.
+        """
+        with span(
+            "tone_polish.chunk",
+            agent__name=self.name,
+            llm__model=self.canonical_model.model,
+        ):
+            llm_request = LlmRequest(
+                model=self.canonical_model.model,
+                contents=[Content(role="user", parts=[Part(text=text)])],
+                config=GenerateContentConfig(system_instruction=CHUNK_INSTRUCTION),
+            )
+            streamed = False
+            async for response in self.canonical_model.generate_content_async(
+                llm_request, stream=True
+            ):
+                if response.usage_metadata and on_usage is not None:
+                    on_usage(response.usage_metadata)
+                if not (response.content and response.content.parts):
+                    continue
+                delta = "".join(p.text or "" for p in response.content.parts)
+                if response.partial:
+                    streamed = True
+                    yield delta
+                elif not streamed:
+                    # Model without partial responses: the final one carries everything
+                    yield delta
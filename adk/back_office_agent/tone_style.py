@@ -0,0 +1,65 @@
+"""
+Tone and style settings shared by the answer agents and TonePolishAgent.
+
+Kept free of model imports so agent.py / streaming.py can read them without
+loading litellm at import time.
+"""
+
+import os
+import re
+
+# "separate": TonePolishAgent rewrites every answer (default)
+# "inline": answer agents apply the tone guidelines themselves and
+#           TonePolishAgent only runs when the answer fails `passes_style_check`
+TONE_POLISH_MODE = os.getenv("TONE_POLISH_MODE", "separate").lower()
+INLINE_TONE_POLISH = TONE_POLISH_MODE == "inline"
+
+# Style check limits for inline answers
+MAX_LINE_CHARS = 160
+MAX_UNBROKEN_CHARS = 240
+
+TONE_POLISH_TITLE = "[Tone Polish Agent]"
+
+TONE_GUIDELINES = """
+- Please rewrite the user's message to sound more natural, friendly, and approachable.
+- Use clear and concise language, and break up long sentences for easier reading.
+- Add appropriate line breaks and spacing so the response is easy to scan and not tiring to read.
+- If the message sounds too formal or unfriendly, make it warmer and more inviting.
+- Preserve the user's original level of politeness (formal/informal speech).
+- Remove unnecessary repetition or overly long sentences, making the message concise and clear.
+- Always reply in the user's language.
+- Use emojis and a friendly tone where appropriate to make the message more engaging! 😊🚗🅿️✨
+"""
+
+# Merged into ParkingAgent / CommonAgent instructions in inline mode
+ANSWER_STYLE_GUIDELINES = """
+Response style:
+- Write in a natural, friendly, and approachable tone.
+- Use clear and concise language, and break up long sentences for easier reading.
+- Add appropriate line breaks and spacing so the response is easy to scan and not tiring to read.
+- Preserve the user's level of politeness (formal/informal speech).
+- Avoid unnecessary repetition or overly long sentences.
+- Always reply in the user's language.
+- Use emojis and a friendly tone where appropriate to make the message more engaging! 😊🚗🅿️✨
+"""
+
+# Used when polishing a streamed answer piece by piece
+CHUNK_INSTRUCTION = f"""
+Guidelines:
+- The user's message is one fragment (a sentence or paragraph) of a longer answer. Rewrite only this fragment.
+- Do not add a title line, greeting or closing remark, and do not answer or comment on the fragment.{TONE_GUIDELINES}"""
+
+
+def passes_style_check(text):
+    """Cheap check that an inline-styled answer does not need a polish pass."""
+    if not text or not text.strip():
+        return False
+    lines = text.strip().splitlines()
+    if len(text) > MAX_UNBROKEN_CHARS and len(lines) < 2:
+        return False
+    if any(len(line) > MAX_LINE_CHARS for line in lines):
+        return False
+    # Raw tool output (JSON) still needs rewriting
+    if re.search(r'^\s*[\[{]\s*["{\[]|"\w+"\s*:', text, re.MULTILINE):
+        return False
+    return True
@@ -0,0 +1,205 @@
+"""
+TTL/LRU result cache for MCP tool calls.
+
+Results are keyed on the tool name plus a canonical form of the arguments:
+keys are sorted and `match_phrase` / `match` values are Unicode (NFKC) and
+whitespace normalised, so semantically identical `queryBody` payloads written
+slightly differently by the LLM share one entry. Memory is bounded both by
+entry count and by the approximate serialized size of the cached results.
+Results are deep-copied in and out, so a caller mutating its result (ADK
+callbacks do) never changes what the other callers get.
+"""
+
+import copy
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .metrics import metrics
+
+# Seconds a result stays valid per MCP tool; tools not listed are not cached
+DEFAULT_TOOL_TTLS = {
+    "search": 300,
+    "list_indices": 3600,
+    "get_mappings": 3600,
+    "get_shards": 3600,
+}
+MCP_TOOL_CACHE_MAX_ENTRIES = int(os.getenv("MCP_TOOL_CACHE_MAX_ENTRIES", "512"))
+MCP_TOOL_CACHE_MAX_BYTES = int(os.getenv("MCP_TOOL_CACHE_MAX_BYTES", str(32 << 20)))
+
+# Query clauses whose string values are analysed text (normalisation is safe)
+TEXT_QUERY_CLAUSES = {"match_phrase", "match", "match_phrase_prefix"}
+
+
+def normalize_phrase(value: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", value)).strip()
+
+
+def _canonical(value: Any, in_text_clause: bool = False) -> Any:
+    if isinstance(value, dict):
+        return {
+            k: _canonical(v, in_text_clause or k in TEXT_QUERY_CLAUSES)
+            for k, v in sorted(value.items())
+        }
+    if isinstance(value, list):
+        return [_canonical(v, in_text_clause) for v in value]
+    if isinstance(value, str):
+        if in_text_clause:
+            return normalize_phrase(value)
+        # queryBody sometimes arrives JSON-encoded
+        stripped = value.strip()
+        if stripped.startswith("{"):
+            try:
+                return _canonical(json.loads(stripped))
+            except ValueError:
+                pass
+    return value
+
+
+def canonicalize_args(args: Optional[Dict[str, Any]]) -> str:
+    return json.dumps(
+        _canonical(args or {}),
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+
+
+def _approximate_size(value: Any) -> int:
+    try:
+        if hasattr(value, "model_dump_json"):
+            return len(value.model_dump_json())
+        return len(json.dumps(value, ensure_ascii=False, default=str))
+    except Exception:
+        return 1024
+
+
+def parse_ttls(spec: Optional[str]) -> Dict[str, float]:
+    """Parse `tool=seconds,tool=seconds` (e.g. MCP_TOOL_CACHE_TTLS)."""
+    ttls = {}
+    for item in (spec or "").split(","):
+        if "=" in item:
+            name, seconds = item.split("=", 1)
+            ttls[name.strip()] = float(seconds)
+    return ttls
+
+
+class ToolResultCache:
+    """Bounded LRU of tool results with per-tool TTLs."""
+
+    def __init__(
+        self,
+        ttls: Optional[Dict[str, float]] = None,
+        max_entries: int = MCP_TOOL_CACHE_MAX_ENTRIES,
+        max_bytes: int = MCP_TOOL_CACHE_MAX_BYTES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttls = dict(DEFAULT_TOOL_TTLS if ttls is None else ttls)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (expires_at, size, value)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, int, Any]]" = (
+            OrderedDict()
+        )
+        self._bytes = 0
+
+    @classmethod
+    def from_env(cls) -> "ToolResultCache":
+        ttls = dict(DEFAULT_TOOL_TTLS)
+        ttls.update(parse_ttls(os.getenv("MCP_TOOL_CACHE_TTLS")))
+        return cls(ttls=ttls)
+
+    def is_cacheable(self, tool_name: str) -> bool:
+        return self.ttls.get(tool_name, 0) > 0
+
+    def get(self, tool_name: str, args: Optional[Dict[str, Any]]) -> Tuple[bool, Any]:
+        if not self.is_cacheable(tool_name):
+            return False, None
+        key = (tool_name, canonicalize_args(args))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self._clock():
+                self._remove(key)
+                metrics.increment(
+                    "tool_cache_evictions_total", tool=tool_name, reason="ttl"
+                )
+                entry = None
+            if entry is None:
+                metrics.increment(
+                    "tool_cache_requests_total", tool=tool_name, outcome="miss"
+                )
+                return False, None
+            self._entries.move_to_end(key)
+        metrics.increment("tool_cache_requests_total", tool=tool_name, outcome="hit")
+        return True, copy.deepcopy(entry[2])
+
+    def put(self, tool_name: str, args: Optional[Dict[str, Any]], value: Any) -> None:
+        if not self.is_cacheable(tool_name):
+            return
+        size = _approximate_size(value)
+        if size > self.max_bytes:
+            return
+        key = (tool_name, canonicalize_args(args))
+        value = copy.deepcopy(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (self._clock() + self.ttls[tool_name], size, value)
+            self._bytes += size
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                evicted, _ = next(iter(self._entries.items()))
+                self._remove(evicted)
+                metrics.increment(
+                    "tool_cache_evictions_total", tool=evicted[0], reason="lru"
+                )
+
+    def invalidate(
+        self,
+        tool_name: Optional[str] = None,
+        predicate: Optional[Callable[[str, str], bool]] = None,
+    ) -> int:
+        """
+        Drop cached results, e.g. after the underlying index was updated.
+
+        Args:
+            tool_name: Only drop results of this tool (all tools if None)
+            predicate: Optional filter called with (tool_name, canonical_args)
+
+        Returns:
+            Number of dropped entries
+        """
+        with self._lock:
+            keys = [
+                key
+                for key in self._entries
+                if (tool_name is None or key[0] == tool_name)
+                and (predicate is None or predicate(*key))
+            ]
+            for key in keys:
+                self._remove(key)
+        if keys:
+            metrics.increment(
+                "tool_cache_evictions_total",
+                len(keys),
+                tool=tool_name or "*",
+                reason="invalidated",
+            )
+            logging.info(f"[ToolResultCache] Invalidated {len(keys)} entries")
+        return len(keys)
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def __len__(self):
+        return len(self._entries)
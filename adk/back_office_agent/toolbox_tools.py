@@ -0,0 +1,312 @@
+"""
+Lazily loaded, cached Toolbox toolset for ADK agents.
+
+`ToolboxToolset` replaces the blocking `ToolboxSyncClient.load_toolset` call
+at import time. The toolset manifest is fetched on the first `get_tools`
+through a pooled aiohttp session, which the tool invocations reuse. The
+manifest is cached on disk, so a restart serves the last known tools right
+away and revalidates them against the server in the background. While the
+server is unreachable, loading is retried in the background with exponential
+backoff, and tools appear without a restart once Toolbox recovers.
+
+With HOTEL_REPLICA=true the hotel tools are answered from a local snapshot
+of the table while it is fresh (see hotel_replica.py).
+"""
+
+import asyncio
+import functools
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from types import MappingProxyType
+from typing import List, Optional
+
+import aiohttp
+from google.adk.agents.readonly_context import ReadonlyContext
+from google.adk.tools.base_tool import BaseTool
+from google.adk.tools.base_toolset import BaseToolset
+from google.adk.tools.function_tool import FunctionTool
+from toolbox_core.protocol import ManifestSchema
+from toolbox_core.tool import ToolboxTool
+
+from .hotel_replica import HOTEL_REPLICA, SNAPSHOT_TOOL, HotelReplica
+from .metrics import metrics
+from .resilience import ResilientCaller, unavailable_message
+from .single_flight import SingleFlight
+from .tracing import set_tool_result, span
+
+TOOLBOX_MANIFEST_CACHE_DIR = os.getenv(
+    "TOOLBOX_MANIFEST_CACHE_DIR",
+    os.path.join(tempfile.gettempdir(), "back_office_agent_toolbox"),
+)
+# How long the first get_tools waits for the server when nothing is cached
+TOOLBOX_LOAD_TIMEOUT_SECONDS = float(os.getenv("TOOLBOX_LOAD_TIMEOUT_SECONDS", "5"))
+TOOLBOX_REVALIDATE_SECONDS = float(os.getenv("TOOLBOX_REVALIDATE_SECONDS", "300"))
+TOOLBOX_POOL_SIZE = int(os.getenv("TOOLBOX_POOL_SIZE", "16"))
+TOOLBOX_RETRY_MIN_SECONDS = 1.0
+TOOLBOX_RETRY_MAX_SECONDS = 60.0
+
+
+class ToolboxFunctionTool(FunctionTool):
+    """
+    FunctionTool over a ToolboxTool, with a span per call. Calls identical to
+    one in flight share its result (see single_flight.py); deadlines, hedging
+    and the circuit breaker come from the toolset's ResilientCaller. Calls the
+    hotel replica can answer never reach Toolbox.
+    """
+
+    def __init__(
+        self,
+        func,
+        single_flight: Optional[SingleFlight] = None,
+        resilience: Optional[ResilientCaller] = None,
+        replica: Optional[HotelReplica] = None,
+    ):
+        super().__init__(func)
+        self._single_flight = single_flight
+        self._resilience = resilience
+        self._replica = replica
+
+    async def run_async(self, *, args, tool_context):
+        with span(
+            f"tool [{self.name}]", tool__name=self.name, tool__backend="toolbox"
+        ) as current:
+            if self._replica is not None:
+                result = self._replica.lookup(self.name, args)
+                if result is not None:
+                    current.set_attribute("tool.backend", "replica")
+                    set_tool_result(current, result)
+                    return result
+            call = functools.partial(self._call, args, tool_context)
+            if self._single_flight is not None:
+                result, shared = await self._single_flight.call(self.name, args, call)
+            else:
+                result, shared = await call(), False
+            set_tool_result(current, result, coalesced=shared)
+            return result
+
+    async def _call(self, args, tool_context):
+        if self._resilience is None:
+            return await super().run_async(args=args, tool_context=tool_context)
+        return await self._resilience.call(
+            self.name,
+            args,
+            lambda timeout: self._attempt(args, tool_context, timeout),
+            self._unavailable,
+        )
+
+    async def _attempt(self, args, tool_context, timeout: float):
+        async with asyncio.timeout(timeout):
+            return await super().run_async(args=args, tool_context=tool_context)
+
+    def _unavailable(self, reason: str) -> dict:
+        return {
+            "status": "error",
+            "error_message": unavailable_message("hotel search", reason),
+        }
+
+
+class ToolboxToolset(BaseToolset):
+    """ADK toolset backed by one Toolbox server toolset."""
+
+    def __init__(
+        self,
+        url: str,
+        toolset_name: str,
+        cache_dir: Optional[str] = TOOLBOX_MANIFEST_CACHE_DIR,
+        load_timeout: float = TOOLBOX_LOAD_TIMEOUT_SECONDS,
+        revalidate_seconds: float = TOOLBOX_REVALIDATE_SECONDS,
+        replica: Optional[HotelReplica] = None,
+    ):
+        super().__init__()
+        self.url = url.rstrip("/")
+        self.toolset_name = toolset_name
+        self.load_timeout = load_timeout
+        self.revalidate_seconds = revalidate_seconds
+        self._cache_path = None
+        if cache_dir:
+            key = re.sub(r"[^\w.-]+", "_", f"{self.url}_{toolset_name}")
+            self._cache_path = os.path.join(cache_dir, f"{key}.json")
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._tools: Optional[List[BaseTool]] = None
+        self._digest: Optional[str] = None
+        self._validated_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._background: Optional[asyncio.Task] = None
+        self._single_flight = SingleFlight("toolbox")
+        self._resilience = ResilientCaller("toolbox")
+        self._replica = replica
+        if replica is None and HOTEL_REPLICA:
+            self._replica = HotelReplica()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # Created lazily: aiohttp sessions are bound to the running event loop
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=TOOLBOX_POOL_SIZE)
+            )
+            # Tools hold the session they were built with
+            self._tools, self._digest = None, None
+        return self._session
+
+    async def get_tools(
+        self, readonly_context: Optional[ReadonlyContext] = None
+    ) -> List[BaseTool]:
+        self._get_session()
+        if self._tools is None:
+            if self._lock is None:
+                self._lock = asyncio.Lock()
+            async with self._lock:
+                if self._tools is None:
+                    await self._load()
+        elif time.monotonic() - self._validated_at > self.revalidate_seconds:
+            self._run_in_background(self._revalidate())
+        if self._replica is not None:
+            snapshot_tool = next(
+                (tool for tool in self._tools or [] if tool.name == SNAPSHOT_TOOL), None
+            )
+            if snapshot_tool is not None:
+                self._replica.maybe_refresh(snapshot_tool.func)
+        return [
+            tool
+            for tool in self._tools or []
+            if self._is_tool_selected(tool, readonly_context)
+        ]
+
+    async def _load(self):
+        cached = self._read_cache()
+        if cached is not None:
+            # Serve the last known manifest now, confirm it with the server later
+            self._apply(cached, source="disk")
+            self._run_in_background(self._revalidate())
+            return
+        try:
+            raw = await asyncio.wait_for(self._fetch(), self.load_timeout)
+        except Exception as e:
+            logging.error(
+                f"[ToolboxToolset] Could not load '{self.toolset_name}' from {self.url}: {e}"
+            )
+            metrics.increment("toolbox_manifest_load_total", source="error")
+            self._tools = []
+            self._run_in_background(self._retry())
+            return
+        self._apply(raw, source="server")
+        self._write_cache(raw)
+
+    async def _fetch(self) -> bytes:
+        url = f"{self.url}/api/toolset/{self.toolset_name}"
+        async with self._get_session().get(url) as response:
+            response.raise_for_status()
+            return await response.read()
+
+    async def _revalidate(self):
+        try:
+            raw = await self._fetch()
+        except Exception as e:
+            logging.warning(f"[ToolboxToolset] Revalidation failed: {e}")
+            self._validated_at = time.monotonic()
+            return
+        if hashlib.sha256(raw).hexdigest() != self._digest:
+            self._apply(raw, source="server")
+            self._write_cache(raw)
+        self._validated_at = time.monotonic()
+
+    async def _retry(self):
+        delay = TOOLBOX_RETRY_MIN_SECONDS
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                raw = await self._fetch()
+            except Exception as e:
+                delay = min(delay * 2, TOOLBOX_RETRY_MAX_SECONDS)
+                logging.info(
+                    f"[ToolboxToolset] Toolbox still unavailable ({e}), retrying in {delay:.0f}s"
+                )
+                continue
+            self._apply(raw, source="server")
+            self._write_cache(raw)
+            return
+
+    def _apply(self, raw: bytes, source: str):
+        manifest = ManifestSchema(**json.loads(raw))
+        self._tools = self._build_tools(manifest)
+        self._digest = hashlib.sha256(raw).hexdigest()
+        self._validated_at = time.monotonic() if source == "server" else 0.0
+        metrics.increment("toolbox_manifest_load_total", source=source)
+        logging.info(
+            f"[ToolboxToolset] Loaded {len(self._tools)} tools of '{self.toolset_name}' from {source}"
+        )
+
+    def _build_tools(self, manifest: ManifestSchema) -> List[BaseTool]:
+        # Same as ToolboxClient.load_toolset without auth getters / bound params
+        tools = []
+        for name, schema in manifest.tools.items():
+            if schema.authRequired or any(p.authSources for p in schema.parameters):
+                logging.warning(
+                    f"[ToolboxToolset] Skipping '{name}': it requires authentication"
+                )
+                continue
+            tool = ToolboxTool(
+                session=self._get_session(),
+                base_url=self.url,
+                name=name,
+                description=schema.description,
+                params=tuple(schema.parameters),
+                required_authn_params=MappingProxyType({}),
+                required_authz_tokens=(),
+                auth_service_token_getters=MappingProxyType({}),
+                bound_params=MappingProxyType({}),
+                client_headers=MappingProxyType({}),
+            )
+            tools.append(
+                ToolboxFunctionTool(
+                    tool,
+                    single_flight=self._single_flight,
+                    resilience=self._resilience,
+                    replica=self._replica,
+                )
+            )
+        return tools
+
+    def _read_cache(self) -> Optional[bytes]:
+        if not self._cache_path or not os.path.exists(self._cache_path):
+            return None
+        try:
+            with open(self._cache_path, "rb") as f:
+                raw = f.read()
+            ManifestSchema(**json.loads(raw))
+            return raw
+        except Exception as e:
+            logging.warning(f"[ToolboxToolset] Ignoring broken manifest cache: {e}")
+            return None
+
+    def _write_cache(self, raw: bytes):
+        if not self._cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self._cache_path), exist_ok=True)
+            tmp_path = f"{self._cache_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(raw)
+            os.replace(tmp_path, self._cache_path)
+        except OSError as e:
+            logging.warning(f"[ToolboxToolset] Could not write manifest cache: {e}")
+
+    def _run_in_background(self, coro):
+        if self._background is not None and not self._background.done():
+            coro.close()
+            return
+        self._background = asyncio.create_task(coro)
+
+    async def close(self) -> None:
+        if self._background is not None:
+            self._background.cancel()
+        if self._replica is not None:
+            await self._replica.close()
+        if self._session is not None:
+            await self._session.close()
+        self._session, self._tools = None, None
@@ -0,0 +1,232 @@
+"""
+OpenTelemetry spans for the back office workflow.
+
+Spans cover every stage of a root agent turn (`turn`, `classify.fast`,
+`classify.llm`, `auth`, `answer`, `tone_polish`), each tool call
+(`tool [name]`) and each MCP session start (`mcp_session_open`), next to
+ADK's own `agent_run` / `call_llm` / `execute_tool` spans. Stage spans carry
+the model and the prompt / completion tokens of their LLM calls, tool spans
+the tool name, backend, cache hit and result size.
+
+Span durations always feed the `span_duration_ms` metric. TRACE_EXPORTER
+adds a local exporter, so no collector is needed: `console`, or `jsonl`
+(one span per line in TRACE_JSONL_PATH). Report p50 / p95 / p99 per span:
+
+    python -m back_office_agent.tracing /tmp/back_office_agent_spans.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Sequence
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace import ReadableSpan, SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import (
+    BatchSpanProcessor,
+    ConsoleSpanExporter,
+    SpanExporter,
+    SpanExportResult,
+)
+
+from .metrics import metrics, percentile
+from .utils import event_prompt_token_count
+
+# "none" (metrics only), "console" or "jsonl"
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none").lower()
+TRACE_JSONL_PATH = os.getenv(
+    "TRACE_JSONL_PATH",
+    os.path.join(tempfile.gettempdir(), "back_office_agent_spans.jsonl"),
+)
+# ADK puts whole LLM requests / responses into span attributes
+MAX_ATTRIBUTE_CHARS = 512
+
+tracer = trace.get_tracer("back_office_agent")
+
+_configure_lock = threading.Lock()
+_configured = False
+
+
+def _duration_ms(span: ReadableSpan) -> float:
+    return (span.end_time - span.start_time) / 1e6
+
+
+class JsonlSpanExporter(SpanExporter):
+    """Appends finished spans to a JSON Lines file."""
+
+    def __init__(self, path: str = TRACE_JSONL_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        lines = []
+        for span in spans:
+            parent = span.parent
+            attributes = {}
+            for key, value in (span.attributes or {}).items():
+                if isinstance(value, str) and len(value) > MAX_ATTRIBUTE_CHARS:
+                    value = value[:MAX_ATTRIBUTE_CHARS] + "..."
+                attributes[key] = value if not isinstance(value, tuple) else list(value)
+            record = {
+                "name": span.name,
+                "trace_id": format(span.context.trace_id, "032x"),
+                "span_id": format(span.context.span_id, "016x"),
+                "parent_id": format(parent.span_id, "016x") if parent else None,
+                "start_time": span.start_time,
+                "duration_ms": round(_duration_ms(span), 3),
+                "status": span.status.status_code.name,
+                "attributes": attributes,
+            }
+            lines.append(json.dumps(record, ensure_ascii=False, default=str))
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError:
+            return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        pass
+
+
+class SpanMetricsProcessor(SpanProcessor):
+    """Records every span's duration as `span_duration_ms{span=name}`."""
+
+    def on_end(self, span: ReadableSpan) -> None:
+        metrics.observe("span_duration_ms", _duration_ms(span), span=span.name)
+
+
+def configure_tracing(exporter: str = TRACE_EXPORTER) -> None:
+    """
+    Attach the metrics processor and the local exporter, once.
+
+    Reuses the SDK provider `adk web` installs; otherwise (Runner, benches)
+    installs one. Called on first use rather than at import so that `adk web`
+    can still set its own provider after importing the agent.
+    """
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        provider = trace.get_tracer_provider()
+        if not isinstance(provider, TracerProvider):
+            provider = TracerProvider()
+            trace.set_tracer_provider(provider)
+        provider.add_span_processor(SpanMetricsProcessor())
+        if exporter == "console":
+            provider.add_span_processor(BatchSpanProcessor(ConsoleSpanExporter()))
+        elif exporter == "jsonl":
+            provider.add_span_processor(BatchSpanProcessor(JsonlSpanExporter()))
+        _configured = True
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Current span `name` with the non-None `attributes`."""
+    with tracer.start_as_current_span(name) as current:
+        set_attributes(current, **attributes)
+        yield current
+
+
+def set_attributes(current, **attributes) -> None:
+    for key, value in attributes.items():
+        if value is not None:
+            current.set_attribute(key.replace("__", "."), value)
+
+
+def _model_name(agent) -> Optional[str]:
+    model = getattr(agent, "model", None)
+    return getattr(model, "model", model) if model else None
+
+
+async def traced_events(
+    name: str, events: AsyncIterator, agent=None, **attributes
+) -> AsyncIterator:
+    """Yield `events` inside span `name`, adding up the LLM token usage."""
+    with span(
+        name,
+        agent__name=getattr(agent, "name", None),
+        llm__model=_model_name(agent),
+        **attributes,
+    ) as current:
+        calls = prompt_tokens = completion_tokens = 0
+        async for event in events:
+            usage = getattr(event, "usage_metadata", None)
+            if usage is not None:
+                calls += 1
+                prompt_tokens += event_prompt_token_count(event)
+                completion_tokens += usage.candidates_token_count or 0
+            yield event
+        current.set_attribute("llm.calls", calls)
+        current.set_attribute("llm.prompt_tokens", prompt_tokens)
+        current.set_attribute("llm.completion_tokens", completion_tokens)
+
+
+def result_size(result: Any) -> int:
+    try:
+        if hasattr(result, "model_dump_json"):
+            return len(result.model_dump_json())
+        return len(json.dumps(result, ensure_ascii=False, default=str))
+    except Exception:
+        return 0
+
+
+def set_tool_result(
+    current, result: Any, cache_hit: bool = False, coalesced: bool = False
+) -> None:
+    error = bool(getattr(result, "isError", False)) or (
+        isinstance(result, dict) and result.get("status") == "error"
+    )
+    current.set_attribute("tool.cache_hit", cache_hit)
+    current.set_attribute("tool.coalesced", coalesced)
+    current.set_attribute("tool.result_bytes", result_size(result))
+    current.set_attribute("tool.error", error)
+
+
+def report(path: str) -> Dict[str, Any]:
+    """p50 / p95 / p99 duration (and token totals) per span name."""
+    durations = defaultdict(list)
+    tokens = defaultdict(lambda: defaultdict(int))
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            durations[record["name"]].append(record["duration_ms"])
+            for key in ("llm.prompt_tokens", "llm.completion_tokens"):
+                value = record.get("attributes", {}).get(key)
+                if value:
+                    tokens[record["name"]][key] += value
+    summary = {}
+    for name, values in sorted(durations.items()):
+        summary[name] = {
+            "count": len(values),
+            **{f"p{q}_ms": round(percentile(values, q), 2) for q in (50, 95, 99)},
+            **tokens.get(name, {}),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="p50/p95/p99 per span of a TRACE_EXPORTER=jsonl file"
+    )
+    parser.add_argument("path", nargs="?", default=TRACE_JSONL_PATH)
+    parser.add_argument("--output", help="write the JSON report here (default: stdout)")
+    args = parser.parse_args()
+    summary = report(args.path)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+    else:
+        json.dump(summary, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,9 @@
-import json
-import os
 import logging
 import traceback
 from enum import Enum
 
+from .schema import SchemaRegistry, get_schema
+
 
 class RequestType(str, Enum):
     PARKING = "parking"
@@ -12,97 +12,48 @@ class RequestType(str, Enum):
 
 CLASSIFIER_RESULT = "classifier_result"
 TO_TONE_POLISH = "to_tone_polish"
+# Parking request stashed while AuthAgent asks for the password
+PENDING_REQUEST = "pending_request"
 
 
-# Recursively extract all field paths from data_type.json properties
-def extract_field_paths(properties, parent=""):
-    paths = []
-    for k, v in properties.items():
-        path = f"{parent}.{k}" if parent else k
-        # If nested or object, go deeper
-        if v.get("type") == "nested" or "properties" in v:
-            child_props = v.get("properties", {})
-            paths.extend(extract_field_paths(child_props, path))
-        else:
-            paths.append(path)
-    return paths
+# Text of the user's message for the current invocation (None if absent)
+def get_user_text(ctx):
+    if getattr(ctx, "user_content", None) and ctx.user_content.parts:
+        return ctx.user_content.parts[0].text
+    return None
 
 
-# Extract only the paths corresponding to main fields (location, fee, security, space)
-def get_default_parking_fields(data_type_path=None):
+# Tokens reported by the model for an event (0 for non-LLM events)
+def event_token_count(event):
+    usage = getattr(event, "usage_metadata", None)
+    return (usage.total_token_count or 0) if usage else 0
+
+
+# Prompt tokens reported by the model for an event (0 for non-LLM events)
+def event_prompt_token_count(event):
+    usage = getattr(event, "usage_metadata", None)
+    return (usage.prompt_token_count or 0) if usage else 0
+
+
+def _schema(data_type_path=None):
     if data_type_path is None:
-        # Relative path from agent.py
-        data_type_path = os.path.join(os.path.dirname(__file__), "data_type.json")
-    with open(data_type_path, encoding="utf-8") as f:
-        data_type = json.load(f)
-    all_paths = extract_field_paths(data_type["properties"])
-    # Main field keywords
-    location_keywords = [
-        "address",
-        "addressView",
-        "location",
-        "city.name",
-        "prefecture.name",
-        "region.name",
-        "nearbyStations.name",
-    ]
-    fee_keywords = [
-        "payment.fee",
-        "spaces.rent",
-        "spaces.rentMin",
-        "spaces.rentTaxClass",
-        "referralFeeTotal",
-        "storageDocument.issuingFee",
-    ]
-    security_keywords = ["securityFacilities.status", "spaces.facility"]
-    space_keywords = ["spaces", "capacity", "hasDivisionDrawing"]
-
-    # Filter only paths that match the keywords
-    def match_keywords(path, keywords):
-        for kw in keywords:
-            if path.endswith(kw):
-                return True
-        return False
-
-    default_fields = [
-        p
-        for p in all_paths
-        if (
-            match_keywords(p, location_keywords)
-            or match_keywords(p, fee_keywords)
-            or match_keywords(p, security_keywords)
-            or match_keywords(p, space_keywords)
-        )
-    ]
-    # Order: location, fee, security, space
-    ordered = []
-    for group in [location_keywords, fee_keywords, security_keywords, space_keywords]:
-        for kw in group:
-            for p in default_fields:
-                if p.endswith(kw) and p not in ordered:
-                    ordered.append(p)
-    return ordered
-
-
-# Recursively extract all nested field paths from data_type.json properties
-def extract_nested_field_paths(properties, parent=""):
-    nested_paths = []
-    for k, v in properties.items():
-        path = f"{parent}.{k}" if parent else k
-        if v.get("type") == "nested":
-            nested_paths.append(path)
-        if "properties" in v:
-            nested_paths.extend(extract_nested_field_paths(v["properties"], path))
-    return nested_paths
+        return get_schema()
+    return SchemaRegistry.from_file(data_type_path)
+
+
+# Main field paths (location, fee, security, space) from data_type.json
+def get_default_parking_fields(data_type_path=None):
+    return list(_schema(data_type_path).default_fields)
 
 
 # Get all nested field paths from data_type.json
 def get_nested_fields(data_type_path=None):
-    if data_type_path is None:
-        data_type_path = os.path.join(os.path.dirname(__file__), "data_type.json")
-    with open(data_type_path, encoding="utf-8") as f:
-        data_type = json.load(f)
-    return extract_nested_field_paths(data_type["properties"])
+    return list(_schema(data_type_path).nested_paths)
+
+
+# Get the mapping type of every field path (and multi-field such as `addressView.keyword`) from data_type.json
+def get_field_types(data_type_path=None):
+    return dict(_schema(data_type_path).field_types)
 
 
 async def ensure_required_params_callback(tool, args, tool_context):